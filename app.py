@@ -1,136 +1,84 @@
 ﻿from pathlib import Path
+
 import pandas as pd
 import streamlit as st
 
+from core import (
+    MONTHS,
+    PERIOD_TYPES,
+    PERIOD_TYPE_LABEL,
+    RANGE_PERIOD_TYPES,
+    SCENARIO_LABEL,
+    ROLLING_WINDOWS,
+    ALLOWED_YEARS,
+    ArrowSummary,
+    build_period_label,
+    load_dataset,
+    load_prefix_index,
+    real_period_label,
+    region_options as get_region_options,
+    range_summary_slice,
+    summary_table,
+    add_compare_column,
+    replace_scenario,
+)
+from cube import Cube
+from datacache import DATA_CACHE, load_fcst_version
+from fcst_versions import MANIFEST, version_names, version_slice
+from instrumentation import RENDER_STATS, StageRecorder
+from workspace import DEFAULT_WORKSPACE, get_workspace, list_workspaces
+
 st.set_page_config(page_title="Transportes TLOG - Summary (MVP)", layout="wide")
 
-DATA_PATH = Path("data/summary_allperiods.parquet")
-
-MONTHS = [
-    "Enero","Febrero","Marzo","Abril","Mayo","Junio",
-    "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"
-]
-MONTH_TO_NUM = {m: i+1 for i, m in enumerate(MONTHS)}
-
-METRIC_ORDER = [
-    "Venta",
-    "Volumen ocupación",
-    "Valor de la caja (transporte)",
-    "%venta",
-    "Ocupación x remolque",
-    "Kilometros recorridos",
-    "Remolques embarcados",
-    "WAD",
-    "Gasto total + BKHL + FP + PA",
-    "$/caja transportada",
-    "Tractores (fijos)",
-    "Variable dedicado",
-    "Diesel dedicado",
-    "Casetas",
-    "Gasto dedicado",
-    "$ de km tercero",
-    "Diesel tercero",
-    "Gasto tercero",
-    "Remolques",
-    "Quintas",
-    "Remolques y quintas",
-    "Ferry",
-    "Aclaraciones",
-    "Gastos secundarios (SICI)",
-    "Desconsolidador",
-    "Monitoreo",
-    "Transferencias",
-    "Intermodal",
-    "Otros variables",
-    "Gasto BKHL",
-    "Ingreso BKHL",
-    "Neto BKHL",
-    "Devoluciones",
-    "LI",
-    "Devo & LI",
-    "FP",
-    "PA",
-    "Freight program & PA",
-]
-
-SCENARIO_LABEL = {
-    "REAL2025": "Real 2025",
-    "BP": "Business Plan",
-    "FCST": "Forecast actual",
-}
-
-PERIOD_TYPE_LABEL = {
-    "M": "Mensual",
-    "YTD": "YTD",
-    "Q": "Quarter",
-    "H": "Half-year",
-    "FY": "Full year",
-}
-
-ALLOWED_YEARS = [2025, 2026]
-
-@st.cache_data
-def load_data(_mtime: float) -> pd.DataFrame:
-    if not DATA_PATH.exists():
+PAGE_KEY = "summary"
+
+# Cache acotado por bytes (datacache.DATA_CACHE), compartido entre páginas y sesiones:
+# las llaves ("summary",), ("prefix",) son las mismas que usa Bridge -> una sola copia.
+def load_data(path: str, arrow_path: str, mtime: tuple):
+    if not Path(path).exists():
          st.warning("Aún no hay datos generados. Ve a la página **Cargar base** y carga un archivo (o modo demo) para generar el parquet.")
          st.stop()
 
-    df = pd.read_parquet(DATA_PATH)
-
-    if "year" in df.columns:
-        df = df[df["year"].isin(ALLOWED_YEARS)].copy()
-
-    # --- Normaliza nombre de columna de región ---
-    if "region" not in df.columns:
-        if "Region" in df.columns:
-            df = df.rename(columns={"Region": "region"})
-        elif "REGION" in df.columns:
-            df = df.rename(columns={"REGION": "region"})
-
-    # --- Normaliza valores de región ---
-    if "region" in df.columns:
-        df["region"] = df["region"].astype(str).str.strip()
-
-        region_map = {
-            "Zona Norte": "Norte",
-            "Zona Sur": "Sur",
-            "Zona Centro": "Centro",
-            "Total logística": "Total logística",
-            "Total logistica": "Total logística",
-        }
-        df["region"] = df["region"].replace(region_map)
-    else:
-        df["region"] = "Total logística"
+    def read():
+        st.session_state["_summary_cache_miss"] = True  # solo corre si no hubo cache hit
+        # .arrow mapeado en memoria (sin deserializar); parquet + normalize solo si no hay .arrow
+        return load_dataset(Path(path), Path(arrow_path))
 
-    return df
+    return DATA_CACHE.get_or_load(path, mtime, ("summary",), read)
 
-def ensure_cols(summary: pd.DataFrame) -> pd.DataFrame:
-    for c in ["Real 2025", "Business Plan", "Forecast actual"]:
-        if c not in summary.columns:
-            summary[c] = 0.0
+def load_prefix(path: str, mtime: float):
+    if not Path(path).exists():
+        st.warning(f"No encuentro {path} (rangos de meses). Vuelve a correr el pipeline en **Cargar base**.")
+        st.stop()
+    return DATA_CACHE.get_or_load(path, mtime, ("prefix",), lambda: load_prefix_index(Path(path)))
 
-    # Variaciones
-    if {"Business Plan", "Forecast actual"}.issubset(summary.columns):
-        summary["Δ Forecast vs BP"] = summary["Forecast actual"] - summary["Business Plan"]
-    if {"Real 2025", "Forecast actual"}.issubset(summary.columns):
-        summary["Δ Forecast vs Real"] = summary["Forecast actual"] - summary["Real 2025"]
+def load_cube(path: str, mtime: tuple, dataset) -> Cube:
+    # se arma una vez por artefacto (misma llave que Bridge)
+    return DATA_CACHE.get_or_load(path, mtime, ("cube",), lambda: Cube.load(dataset))
 
-    ordered = ["Real 2025", "Business Plan", "Forecast actual", "Δ Forecast vs BP", "Δ Forecast vs Real"]
-    ordered = [c for c in ordered if c in summary.columns]
-    return summary[ordered]
 
 st.title("Transportes TLOG — Summary (MVP)")
 
-mtime = DATA_PATH.stat().st_mtime if DATA_PATH.exists() else 0.0
-df = load_data(mtime)
+# Profiling opt-in del rerun (tiempos por etapa + p50/p95 de todas las sesiones)
+profile_on = st.sidebar.toggle("⏱️ Perfilar render", key="profile_render")
+prof = StageRecorder(sample_interval=None, enabled=profile_on)
 
-# --------- Región options  ----------
-preferred_order = ["Total logística", "Norte", "Centro", "Sur"]
-regions_found = sorted(df["region"].dropna().astype(str).unique().tolist())
+# Dataset (workspace) de la sesión: se comparte entre páginas vía session_state
+datasets = list_workspaces()
+current = st.session_state.get("dataset", DEFAULT_WORKSPACE)
+dataset = st.sidebar.selectbox("🗂️ Dataset", options=datasets, index=datasets.index(current) if current in datasets else 0)
+st.session_state["dataset"] = dataset
+ws = get_workspace(dataset)
+
+prof.start("load")
+st.session_state["_summary_cache_miss"] = False
+mtime = tuple(p.stat().st_mtime if p.exists() else 0.0 for p in (ws.summary, ws.arrow))
+df = load_data(ws.summary.as_posix(), ws.arrow.as_posix(), mtime)
+cube = load_cube(ws.summary.as_posix(), mtime, df)
+prof.note(stage="load (miss)" if st.session_state["_summary_cache_miss"] else "load (cache hit)")
 
-# arma lista final: primero los preferidos que existan, luego los demás
-region_options = [r for r in preferred_order if r in regions_found] + [r for r in regions_found if r not in preferred_order]
-default_region_index = region_options.index("Total logística") if "Total logística" in region_options else 0
+# --------- Región options  ----------
+region_options, default_region_index = get_region_options(df)
 
 # ---------------- UI Controls ----------------
 c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
@@ -138,7 +86,7 @@ c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
 with c1:
     period_type = st.selectbox(
         "Tipo de periodo",
-        options=["M", "YTD", "Q", "H", "FY"],
+        options=PERIOD_TYPES + RANGE_PERIOD_TYPES,
         format_func=lambda x: PERIOD_TYPE_LABEL.get(x, x),
         index=0,
     )
@@ -150,62 +98,70 @@ with c3:
     region = st.selectbox("Región", options=region_options, index=default_region_index)
 
 # Selector adicional según el tipo
-extra_label = None
 extra_value = None
 
 with c4:
     if period_type in ["M", "YTD"]:
-        extra_label = "Mes"
         extra_value = st.selectbox("Mes", options=MONTHS, index=0)
     elif period_type == "Q":
-        extra_label = "Quarter"
         extra_value = st.selectbox("Quarter", options=[1, 2, 3, 4], index=0)
     elif period_type == "H":
-        extra_label = "Half"
         extra_value = st.selectbox("Half-year", options=[1, 2], index=0)
+    elif period_type == "RANGO":
+        extra_value = st.select_slider("Meses", options=MONTHS, value=(MONTHS[0], MONTHS[2]))
+    elif period_type == "MOVIL":
+        m1, m2 = st.columns(2)
+        month_end = m1.selectbox("Mes de cierre", options=MONTHS, index=0)
+        window = m2.selectbox("Meses", options=ROLLING_WINDOWS, index=0)
+        extra_value = (month_end, window)
     else:
         st.write("")  # FY no necesita selector extra
 
-# Construye el period_label que usó build.py
-if period_type in ["M", "YTD"]:
-    month_num = MONTH_TO_NUM[extra_value]
-    period_label = f"{year:04d}-{month_num:02d}"
-elif period_type == "Q":
-    period_label = f"{year:04d}-Q{int(extra_value)}"
-elif period_type == "H":
-    period_label = f"{year:04d}-H{int(extra_value)}"
-else:  # FY
-    period_label = f"{year:04d}"
-
-REAL_BASE_YEAR = 2025
-
-# period_label del Real siempre amarrado a 2025 (misma granularidad)
-if period_type in ["M", "YTD"]:
-    period_label_real = f"2025-{month_num:02d}"
-elif period_type == "Q":
-    period_label_real = f"2025-Q{int(extra_value)}"
-elif period_type == "H":
-    period_label_real = f"2025-H{int(extra_value)}"
-else:  # FY
-    period_label_real = "2025"
-
 
 # ---------------- Data Slice (FILTRADO POR REGIÓN) ----------------
-slice_bp_fcst = df[
-    (df["period_type"] == period_type)
-    & (df["period_label"] == period_label)
-    & (df["region"] == region)
-    & (df["scenario"].isin(["BP", "FCST"]))
-].copy()
-
-slice_real = df[
-    (df["period_type"] == period_type)
-    & (df["period_label"] == period_label_real)
-    & (df["region"] == region)
-    & (df["scenario"] == "REAL2025")
-].copy()
+if period_type in RANGE_PERIOD_TYPES:
+    # Rango arbitrario: resta de dos acumulados del prefix index (Real = mismo rango en 2025)
+    prefix_mtime = ws.prefix.stat().st_mtime if ws.prefix.exists() else 0.0
+    prefix_index = load_prefix(ws.prefix.as_posix(), prefix_mtime)
+    prof.start("filter")
+    slice_df, period_label, period_label_real = range_summary_slice(prefix_index, period_type, year, extra_value, region)
+else:
+    # Construye el period_label que usó build.py
+    period_label, _ = build_period_label(period_type, year, extra_value)
+
+    # period_label del Real siempre amarrado a 2025 (misma granularidad)
+    period_label_real = real_period_label(period_label)
+
+    prof.start("filter")
+    slice_df = cube.summary_slice(period_type, period_label, period_label_real, region)
+prof.stop()
+
+# ---------------- Versiones de Forecast (guardadas en cada corrida) ----------------
+ACTUAL_VERSION = "Actual (último build)"
+compare_slice = None
+manifest = ws.versions_dir / MANIFEST.name
+versions = version_names(manifest)[::-1]
+with st.sidebar.expander("📚 Versiones de Forecast"):
+    if not versions:
+        st.caption("Aún no hay versiones guardadas (se crean al procesar una base).")
+        version_a, version_b = ACTUAL_VERSION, "—"
+    elif period_type in RANGE_PERIOD_TYPES:
+        st.caption("Las versiones se comparan con los periodos fijos (M / YTD / Q / H / FY).")
+        version_a, version_b = ACTUAL_VERSION, "—"
+    else:
+        version_a = st.selectbox("Forecast", options=[ACTUAL_VERSION] + versions, index=0)
+        version_b = st.selectbox("Comparar contra", options=["—"] + versions, index=0)
 
-slice_df = pd.concat([slice_real, slice_bp_fcst], ignore_index=True)
+if version_a != ACTUAL_VERSION or version_b != "—":
+    prof.start("versions")
+    manifest_mtime = manifest.stat().st_mtime
+    if version_a != ACTUAL_VERSION:
+        vdf = load_fcst_version(ws.versions_dir.as_posix(), manifest_mtime, version_a)
+        slice_df = replace_scenario(slice_df, "FCST", version_slice(vdf, period_type, period_label, region))
+    if version_b != "—":
+        vdf = load_fcst_version(ws.versions_dir.as_posix(), manifest_mtime, version_b)
+        compare_slice = version_slice(vdf, period_type, period_label, region)
+    prof.stop()
 
 
 if slice_df.empty:
@@ -215,25 +171,41 @@ if slice_df.empty:
     )
     st.stop()
 
-summary = (
-    slice_df.pivot_table(index="metric", columns="scenario", values="value", aggfunc="sum")
-    .reindex(METRIC_ORDER)
-    .rename(columns=SCENARIO_LABEL)
-    .fillna(0)
-)
-
-summary = ensure_cols(summary)
+prof.start("pivot")
+summary = summary_table(slice_df)
+if compare_slice is not None:
+    summary = add_compare_column(summary, compare_slice, version_b)
 
+prof.start("render")
 st.subheader(f"Summary — {PERIOD_TYPE_LABEL.get(period_type, period_type)} · {period_label} · {region}")
+if version_a != ACTUAL_VERSION:
+    st.caption(f"Forecast actual = versión **{version_a}**")
 
 st.dataframe(
     summary.style.format("{:,.2f}"),
     use_container_width=True,
     height=900,
 )
+prof.stop()
+if profile_on:
+    RENDER_STATS.add(PAGE_KEY, prof)
+
+with st.expander("📈 Tendencia mensual"):
+    trend_metric = st.selectbox("Métrica", options=["—"] + cube.metrics, index=0, key="trend_metric")
+    if trend_metric != "—":  # la gráfica (altair) solo se arma si se pide
+        st.line_chart(cube.trend(region, trend_metric).rename(columns=SCENARIO_LABEL))
 
 with st.expander("Debug"):
+    st.write("Dataset:", f"{ws.name} ({ws.data_dir.as_posix()})")
     st.write("Registros en el slice:", len(slice_df))
     st.write("Región:", region)
     st.write("Escenarios presentes:", sorted(slice_df["scenario"].unique().tolist()))
-    st.write("Regiones presentes en parquet:", sorted(df["region"].dropna().astype(str).unique().tolist()))
+    st.write("Regiones presentes en parquet:", sorted(region_options))
+    if isinstance(df, ArrowSummary):
+        st.write(f"Dataset mapeado ({ws.arrow.as_posix()}, {df.mapped_mb:,.2f} MB):", df.meta)
+    st.write("🧊 Cubo (scenario × periodo × región × métrica):", cube.footprint())
+    st.write("🧠 Cache de datos (proceso):", DATA_CACHE.stats())
+    if profile_on:
+        st.write("⏱️ Este rerun:", {s["stage"]: f"{s['seconds'] * 1000:,.1f} ms" for s in prof.stages})
+        st.write("⏱️ p50 / p95 (todas las sesiones):")
+        st.dataframe(pd.DataFrame(RENDER_STATS.summary(PAGE_KEY)).set_index("stage"), use_container_width=True)
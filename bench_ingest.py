@@ -0,0 +1,111 @@
+"""
+Benchmark end-to-end (ingest + build.py) de la misma base subida como xlsx, csv,
+parquet y Arrow IPC. Corre en un directorio temporal para no pisar input/ ni data/.
+Antes de medir cada formato hace una corrida de calentamiento (no cuenta): así todos
+miden con el SQL del layout ya en data/sql_cache/ (el staging csv y el parquet tienen
+huellas distintas) y no solo el primer formato paga la generación. Se reporta la mediana
+de --repeat corridas por columna.
+
+    python bench_ingest.py --scale 20 --repeat 3
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+SOURCE_XLSX = Path("samples/Base_xepelin_sintetico_vf.xlsx")
+TEMPLATE_XLSX = Path("Base_xepelin.xlsx")
+FORMATS = ["xlsx", "csv", "parquet", "arrow"]
+
+
+def write_inputs(df: pd.DataFrame, out_dir: Path, formats: list[str]) -> dict[str, Path]:
+    paths = {}
+    for fmt in formats:
+        path = out_dir / f"base.{fmt}"
+        if fmt == "xlsx":
+            df.to_excel(path, sheet_name="Base", index=False)
+        elif fmt == "csv":
+            df.to_csv(path, index=False)
+        elif fmt == "parquet":
+            df.to_parquet(path, index=False)
+        elif fmt == "arrow":
+            df.to_feather(path)
+        paths[fmt] = path
+    return paths
+
+
+def run_once(path: Path) -> dict:
+    # import dentro del cwd temporal: los paths de ingest/build son relativos
+    import build
+    import ingest
+    from instrumentation import StageRecorder
+
+    for stale in (ingest.RAW_DUMMY, ingest.RAW_PARQUET):
+        stale.unlink(missing_ok=True)
+    rec = StageRecorder()
+    ingest.normalize_to_raw_dummy(path, rec)
+    info = build.main(rec)
+    ingest_s = sum(s["seconds"] for s in rec.stages if s["stage"].startswith("ingest."))
+    return {
+        "total_s": rec.total_seconds,
+        "ingest_s": ingest_s,
+        "build_s": rec.total_seconds - ingest_s,
+        "peak_rss_mb": max(s.get("peak_rss_mb") or 0 for s in rec.stages),
+        "sql_cache": info["sql_cache"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingest + build por formato de upload.")
+    parser.add_argument("--source", default=str(SOURCE_XLSX))
+    parser.add_argument("--scale", type=int, default=1, help="Replica las filas N veces")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    args = parser.parse_args()
+
+    repo = Path.cwd()
+    df = pd.read_excel(args.source, sheet_name="Base")
+    if args.scale > 1:
+        df = pd.concat([df] * args.scale, ignore_index=True)
+    # columnas object mixtas (texto + números) no entran a parquet tal cual
+    for c in df.columns[df.dtypes == object]:
+        df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as tmp:
+        tmp = Path(tmp)
+        shutil.copy(repo / TEMPLATE_XLSX, tmp / TEMPLATE_XLSX.name)
+        (tmp / "inputs").mkdir()
+        print(f"Generando {len(df):,} filas × {df.shape[1]} columnas en {', '.join(args.formats)}…")
+        paths = write_inputs(df, tmp / "inputs", args.formats)
+
+        os.chdir(tmp)
+        try:
+            results = []
+            for fmt, path in paths.items():
+                run_once(path)  # calentamiento: SQL del layout en cache, imports, disco
+                runs = [run_once(path) for _ in range(args.repeat)]
+                results.append({
+                    "formato": fmt,
+                    "archivo_mb": round(path.stat().st_size / (1024 * 1024), 2),
+                    "total_s (mediana)": round(statistics.median(r["total_s"] for r in runs), 3),
+                    "ingest_s": round(statistics.median(r["ingest_s"] for r in runs), 3),
+                    "build_s": round(statistics.median(r["build_s"] for r in runs), 3),
+                    "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                    "sql_cache": "/".join(sorted({r["sql_cache"] for r in runs})),
+                })
+        finally:
+            os.chdir(repo)
+
+    out = pd.DataFrame(results).set_index("formato")
+    base = out.loc["xlsx", "total_s (mediana)"] if "xlsx" in out.index else None
+    if base:
+        out["speedup vs xlsx"] = (base / out["total_s (mediana)"]).round(1)
+    print(out.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Suite de regresión de performance interactiva de Summary (app.py) y Bridge: arma un build
+sintético grande (la base de ejemplo replicada en N regiones) en un directorio temporal,
+abre cada página con AppTest (streamlit headless) y recorre todas las combinaciones de
+selectores (tipo de periodo × año × región × mes / quarter / half / rango de meses / mes
+de cierre y ventana del móvil). Cada interacción es un rerun medido con StageRecorder
+(tiempo + RSS pico). Compara p95 de latencia y RSS pico por página contra
+bench_baselines.json y sale con código 1 si alguna empeora más de la tolerancia, o si la
+config (regiones, tipos de periodo) no es la del baseline.
+
+    python bench_pages.py                      # compara contra bench_baselines.json
+    python bench_pages.py --update-baselines   # guarda los números actuales como baseline
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+REPO = Path(__file__).resolve().parent
+SOURCE_XLSX = REPO / "samples" / "Base_xepelin_sintetico_vf.xlsx"
+TEMPLATE_XLSX = REPO / "Base_xepelin.xlsx"
+BASELINES = REPO / "bench_baselines.json"
+
+PAGES = {"summary": "app.py", "bridge": "pages/2_Bridge.py"}
+YEAR_LABEL = {"summary": "Año", "bridge": "Año (BP/FCST)"}
+EXTRA_SELECTORS = {
+    "M": "Mes", "YTD": "Mes", "Q": "Quarter", "H": "Half-year", "FY": None,
+    "RANGO": "Meses",            # select_slider: rangos Ene..mes (1 a 12 meses)
+    "MOVIL": "Mes de cierre",    # × ventana ("Meses")
+}
+PERIOD_TYPES = list(EXTRA_SELECTORS)
+ROLLING_WINDOW_LABEL = "Meses"
+
+SYNTH_REGIONS = 12
+LATENCY_TOLERANCE = 1.30   # p95 puede subir hasta 30% (ruido de la máquina) antes de fallar
+MEMORY_TOLERANCE = 1.15
+
+
+def build_synthetic(workdir: Path, regions: int) -> dict:
+    """Base de ejemplo × regions (cada copia con su propia región) -> build.py en workdir."""
+    import build
+    import ingest
+    from instrumentation import StageRecorder
+
+    shutil.copy(TEMPLATE_XLSX, workdir / TEMPLATE_XLSX.name)
+    ingest.normalize_to_raw_dummy(SOURCE_XLSX, StageRecorder(sample_interval=None))
+    base = pd.read_csv(ingest.RAW_DUMMY, dtype=str, keep_default_na=False)
+    parts = [base.assign(Region=f"Región {i + 1:02d}") for i in range(regions)]
+    pd.concat(parts, ignore_index=True).to_csv(ingest.RAW_DUMMY, index=False)
+    info = build.main(StageRecorder(sample_interval=None))
+    return {"raw_rows": len(base) * regions, "summary_rows": info["rows"]}
+
+
+def _select(at, label: str):
+    return next(s for s in at.selectbox if s.label == label)
+
+
+def _slider(at, label: str):
+    return next(s for s in at.select_slider if s.label == label)
+
+
+def extra_options(at, pt: str) -> list:
+    """Valores del selector propio del tipo de periodo (lo que se recorre por año × región)."""
+    label = EXTRA_SELECTORS[pt]
+    if label is None:
+        return [None]
+    if pt == "RANGO":
+        months = list(_slider(at, label).proto.options)   # SelectSlider no expone .options
+        return [(months[0], m) for m in months]
+    if pt == "MOVIL":
+        windows = _select(at, ROLLING_WINDOW_LABEL).options
+        return [(m, int(w)) for m in _select(at, label).options for w in windows]
+    return _select(at, label).options
+
+
+def set_extra(at, pt: str, extra) -> None:
+    label = EXTRA_SELECTORS[pt]
+    if label is None:
+        return
+    if pt == "RANGO":
+        _slider(at, label).set_range(*extra)
+    elif pt == "MOVIL":
+        _select(at, label).set_value(extra[0])
+        _select(at, ROLLING_WINDOW_LABEL).set_value(extra[1])
+    else:
+        _select(at, label).set_value(int(extra) if pt in ("Q", "H") else extra)
+
+
+def drive_page(page: str, max_regions: int | None = None) -> pd.DataFrame:
+    """Una fila por interacción: period_type, year, region, extra, ms, peak_rss_mb."""
+    from streamlit.testing.v1 import AppTest
+    from instrumentation import StageRecorder
+
+    at = AppTest.from_file(str(REPO / PAGES[page]), default_timeout=120).run()
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].value}")
+    regions = _select(at, "Región").options
+    regions = regions[:max_regions] if max_regions else regions
+    years = _select(at, YEAR_LABEL[page]).options
+
+    rec = StageRecorder()
+    rows = []
+
+    def interact(**combo):
+        rec.start(page)
+        at.run()
+        rec.stop()
+        if at.exception:
+            raise RuntimeError(f"{page} {combo}: {at.exception[0].value}")
+        s = rec.stages[-1]
+        rows.append({**combo, "ms": s["seconds"] * 1000, "peak_rss_mb": s["peak_rss_mb"]})
+
+    for pt in PERIOD_TYPES:
+        _select(at, "Tipo de periodo").set_value(pt)
+        interact(period_type=pt, year=None, region=None, extra=None)
+        extras = extra_options(at, pt)
+        for year in years:
+            for region in regions:
+                for extra in extras:
+                    _select(at, YEAR_LABEL[page]).set_value(int(year))
+                    _select(at, "Región").set_value(region)
+                    set_extra(at, pt, extra)
+                    interact(period_type=pt, year=year, region=region, extra=extra)
+    return pd.DataFrame(rows)
+
+
+def summarize(df: pd.DataFrame) -> dict:
+    return {
+        "interactions": int(len(df)),
+        "p50_ms": round(float(df["ms"].quantile(0.50)), 1),
+        "p95_ms": round(float(df["ms"].quantile(0.95)), 1),
+        "max_ms": round(float(df["ms"].max()), 1),
+        "peak_rss_mb": float(df["peak_rss_mb"].max()),
+        "p95_ms_by_period_type": {k: round(float(v), 1) for k, v in df.groupby("period_type")["ms"].quantile(0.95).items()},
+    }
+
+
+def regressions(results: dict, baselines: dict) -> list[str]:
+    problems = []
+    for page, res in results.items():
+        base = baselines.get("pages", {}).get(page)
+        if base is None:
+            problems.append(f"{page}: no hay baseline (correr con --update-baselines)")
+            continue
+        if res["p95_ms"] > base["p95_ms"] * LATENCY_TOLERANCE:
+            problems.append(f"{page}: p95 {res['p95_ms']:,.1f} ms > baseline {base['p95_ms']:,.1f} ms × {LATENCY_TOLERANCE}")
+        if res["peak_rss_mb"] > base["peak_rss_mb"] * MEMORY_TOLERANCE:
+            problems.append(f"{page}: RSS pico {res['peak_rss_mb']:,.1f} MB > baseline {base['peak_rss_mb']:,.1f} MB × {MEMORY_TOLERANCE}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regresión de latencia / memoria de Summary y Bridge (AppTest).")
+    parser.add_argument("--regions", type=int, default=SYNTH_REGIONS, help="Regiones sintéticas del build")
+    parser.add_argument("--max-regions", type=int, default=None, help="Recorre solo las primeras N regiones del selector")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+
+    # la config se revisa antes de correr: un baseline con otra config no se compara
+    config = {"regions": args.regions, "max_regions": args.max_regions, "period_types": PERIOD_TYPES}
+    baselines = None
+    if not args.update_baselines:
+        if not BASELINES.exists():
+            sys.exit(f"No existe {BASELINES.name}: correr con --update-baselines primero.")
+        baselines = json.loads(BASELINES.read_text(encoding="utf-8"))
+        if baselines.get("config") != config:
+            sys.exit(
+                f"❌ Config distinta a la del baseline ({baselines.get('config')} vs {config}): la comparación "
+                "no es 1 a 1. Correr con la misma config o con --update-baselines."
+            )
+
+    sys.path.insert(0, str(REPO))
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_pages_") as tmp:
+        os.chdir(tmp)  # los paths de build / páginas son relativos (input/, data/)
+        try:
+            t0 = time.perf_counter()
+            synth = build_synthetic(Path(tmp), args.regions)
+            print(f"Build sintético: {synth['raw_rows']:,} filas raw → {synth['summary_rows']:,} filas "
+                  f"({args.regions} regiones) en {time.perf_counter() - t0:,.1f}s")
+            for page in args.pages:
+                t0 = time.perf_counter()
+                results[page] = summarize(drive_page(page, args.max_regions))
+                print(f"  {page}: {results[page]['interactions']:,} interacciones en {time.perf_counter() - t0:,.1f}s")
+        finally:
+            os.chdir(REPO)
+
+    table = pd.DataFrame(results).T.drop(columns="p95_ms_by_period_type")
+    print(table.to_string())
+
+    if args.update_baselines:
+        BASELINES.write_text(json.dumps({"config": config, "pages": results}, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ Baselines guardados en {BASELINES.name}")
+        return
+
+    problems = regressions(results, baselines)
+    if problems:
+        print("\n❌ Regresión de performance:\n- " + "\n- ".join(problems))
+        sys.exit(1)
+    print("\n✅ Sin regresiones contra bench_baselines.json")
+
+
+if __name__ == "__main__":
+    main()
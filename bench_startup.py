@@ -0,0 +1,146 @@
+"""
+Benchmark de arranque y rerun por página (AppTest headless de streamlit). Para cada
+página, en un proceso nuevo (imports en frío):
+  - import_ms: imports de nivel módulo de la página (sin contar streamlit),
+  - first_paint_ms: primer run del script (lo que espera el usuario al abrir la página),
+  - rerun_ms: mediana de los reruns siguientes (cada click en un selector),
+  - módulos pesados cargados después del primer paint (deben cargarse lazy).
+Sale con código 1 si alguna página se pasa de STARTUP_BUDGETS. Usa los artefactos de
+data/ (correr antes build.py o cargar una base).
+
+    python bench_startup.py --repeat 3
+"""
+import argparse
+import ast
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PAGES = {
+    "summary": "app.py",
+    "bridge": "pages/2_Bridge.py",
+    "cargar": "pages/1_Cargar_base.py",
+}
+HEAVY_MODULES = ["duckdb", "altair", "openpyxl"]
+RERUNS = 5
+
+# ms (mediana de --repeat procesos) + módulos que no deben cargarse en el primer paint
+STARTUP_BUDGETS = {
+    "summary": {"import_ms": 1000, "first_paint_ms": 800, "rerun_ms": 200, "lazy": ["duckdb", "altair", "openpyxl"]},
+    "bridge": {"import_ms": 1000, "first_paint_ms": 1500, "rerun_ms": 250, "lazy": ["duckdb", "openpyxl"]},  # la cascada usa altair
+    "cargar": {"import_ms": 1000, "first_paint_ms": 600, "rerun_ms": 200, "lazy": ["duckdb", "altair", "openpyxl"]},
+}
+
+
+def page_imports(page_file: str) -> list[str]:
+    """Módulos importados a nivel módulo por la página (en orden, sin streamlit)."""
+    tree = ast.parse(Path(page_file).read_text(encoding="utf-8-sig"))
+    mods = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            mods += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            mods.append(node.module)
+    return [m for m in dict.fromkeys(mods) if m.split(".")[0] != "streamlit"]
+
+
+def measure_page(page_file: str, reruns: int = RERUNS) -> dict:
+    """Corre en el proceso actual (que debe ser nuevo): imports, primer paint y reruns."""
+    sys.path.insert(0, str(Path.cwd()))
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for mod in page_imports(page_file):
+        importlib.import_module(mod)
+    import_ms = (time.perf_counter() - t0) * 1000
+
+    at = AppTest.from_file(page_file, default_timeout=120)
+    t0 = time.perf_counter()
+    at.run()
+    first_paint_ms = (time.perf_counter() - t0) * 1000
+    if at.exception:
+        raise RuntimeError(f"{page_file}: {at.exception[0].value}")
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    times = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {
+        "streamlit_ms": round(streamlit_ms, 1),
+        "import_ms": round(import_ms, 1),
+        "first_paint_ms": round(first_paint_ms, 1),
+        "rerun_ms": round(statistics.median(times), 1),
+        "heavy_loaded": loaded,
+    }
+
+
+def run_child(page_file: str, reruns: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", page_file, "--reruns", str(reruns)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check_budget(page: str, result: dict, budget: dict) -> list[str]:
+    problems = [
+        f"{page}: {k} {result[k]:,.0f} ms > {budget[k]:,.0f} ms"
+        for k in ("import_ms", "first_paint_ms", "rerun_ms")
+        if result[k] > budget[k]
+    ]
+    eager = sorted(set(result["heavy_loaded"]) & set(budget["lazy"]))
+    if eager:
+        problems.append(f"{page}: carga {', '.join(eager)} en el primer paint (debe ser lazy)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de import / first paint / rerun por página.")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="Procesos nuevos por página (se reporta la mediana)")
+    parser.add_argument("--reruns", type=int, default=RERUNS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_page(args.child, args.reruns)))
+        return
+
+    if not Path("data/summary_allperiods.parquet").exists():
+        sys.exit("No hay data/summary_allperiods.parquet: corre build.py (o carga una base) antes del benchmark.")
+
+    rows, problems = [], []
+    for page in args.pages:
+        runs = [run_child(PAGES[page], args.reruns) for _ in range(args.repeat)]
+        result = {
+            k: round(statistics.median(r[k] for r in runs), 1)
+            for k in ("streamlit_ms", "import_ms", "first_paint_ms", "rerun_ms")
+        }
+        result["heavy_loaded"] = sorted({m for r in runs for m in r["heavy_loaded"]})
+        problems += check_budget(page, result, STARTUP_BUDGETS[page])
+        budget = STARTUP_BUDGETS[page]
+        rows.append({
+            "página": page,
+            **{k: v for k, v in result.items() if k != "heavy_loaded"},
+            "budget (import / paint / rerun)": f"{budget['import_ms']} / {budget['first_paint_ms']} / {budget['rerun_ms']}",
+            "pesados cargados": ", ".join(result["heavy_loaded"]) or "—",
+        })
+
+    import pandas as pd
+    print(pd.DataFrame(rows).set_index("página").to_string())
+    if problems:
+        print("\n❌ Fuera de budget:\n- " + "\n- ".join(problems))
+        sys.exit(1)
+    print("\n✅ Todas las páginas dentro de budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,172 @@
+import hashlib
+import json
+from datetime import datetime
 from pathlib import Path
 import pandas as pd
-import duckdb
+
+from core import CEDIS_REGION, REGION_DIM, TOTAL_REGION, TOTAL_REGION_ALIASES, UNASSIGNED_REGION, write_arrow_summary
+from fcst_versions import save_version, version_note
+from instrumentation import StageRecorder
+from workspace import Workspace, file_digest, get_workspace
 
 RAW_CSV = "input/raw_dummy.csv"
+RAW_PARQUET = "input/raw_dummy.parquet"   # uploads parquet/arrow: se leen sin parsing de texto
 BASE_XLSX = "Base_xepelin.xlsx"
 SHEET = "Base"
 
 OUT_DIR = Path("data")
 OUT_PARQUET = OUT_DIR / "summary_allperiods.parquet"
+OUT_PREFIX = OUT_DIR / "prefix_index.parquet"   # acumulado mensual para rangos arbitrarios
+OUT_RAW_ROWS = OUT_DIR / "raw_rows.parquet"      # filas fuente (drill-down del bridge)
+OUT_RAW_LAYOUT = OUT_DIR / "raw_rows_layout.json"
+RAW_ROWS_SORT = ["scenario", "year", "month_num", "region"]
+RAW_ROWS_ID_COLS = ["Tipo folio", "Mes", "Cedis", "region_raw"]
+RAW_ROWS_GROUP_SIZE = 4096   # row groups chicos = min/max por grupo más selectivos
+SQL_CACHE_MAX_FILES = 16     # layouts distintos guardados por workspace (se borra el más viejo)
+PLAN_METRICS = ["planner", "all_optimizers", "physical_planner"]   # profiler de duckdb (segundos)
+RAW_SCAN_PARAM = "{raw_scan}"   # en el SQL guardado: se reemplaza por raw_scan_sql() de la corrida
+
+
+# =============================
+#   LETRAS (según tu layout)
+# =============================
+# Métricas hoja: suma de columnas del template (por letra de Excel)
+LEAF_LETTERS = {
+    # Ventas y Volumen
+    "Venta": ["M"],                        # "Ventas" en el template (si cambia, ajusta)
+    "Volumen ocupación": ["N"],            # Columna N
+
+    # Gasto dedicado
+    "Tractores (fijos)": ["EC", "ED", "ET", "EU"],
+    "Variable dedicado": ["BF", "BG"],
+    "Diesel dedicado": ["AX", "BV", "CF"],
+    "Casetas": ["AV", "BT"],
+
+    # Tercero (PxV)
+    "$ de km tercero": ["CA"],             # "porteo tercero"
+    "Diesel tercero": ["CB"],              # "base diesel tercero"
+
+    # Remolques y quintas
+    "Remolques": ["EK"],                   # "remolques"
+    "Quintas": ["EL"],                     # "quintas"
+
+    # Otros variables
+    "Ferry": ["CI"],                       # "ferry"
+    "Aclaraciones": ["AZ"],                # "aclaraciones"
+    "Gastos secundarios (SICI)": [],       # <-- si lo tienes, pon su letra aquí (ej: ["DP"])
+    "Desconsolidador": ["CR"],             # "desconsolidadores"
+    "Monitoreo": ["BN"],                   # "monitoreo"
+    "Transferencias": ["CG"],              # "transferencias"
+    "Intermodal": ["AQ"],                  # "intermodal / rail"
+
+    # BKHL / Devoluciones
+    "Gasto BKHL": ["CX"],                  # "bkhl expense" (positivo)
+    "Ingreso BKHL": ["CW"],                # "ingreso bkhl" (debería venir negativo)
+    "Devoluciones": ["AH"],                # "neto devoluciones"
+
+    # FP y PA
+    "FP": ["DL"],                          # "fp expense"
+    "PA": ["DE"],                          # "pallet and packaging expense" (si tu PA está en otra, ajústala)
+}
+
+# Compuestas: suma de otras métricas (en este orden)
+COMPOSITES = {
+    "Gasto dedicado": ["Tractores (fijos)", "Variable dedicado", "Diesel dedicado", "Casetas"],
+    "Gasto tercero": ["$ de km tercero", "Diesel tercero"],
+    "Remolques y quintas": ["Remolques", "Quintas"],
+    "Otros variables": [
+        "Ferry",
+        "Aclaraciones",
+        "Gastos secundarios (SICI)",
+        "Desconsolidador",
+        "Monitoreo",
+        "Transferencias",
+        "Intermodal",
+    ],
+    "Neto BKHL": ["Gasto BKHL", "Ingreso BKHL"],
+    "Freight program & PA": ["FP", "PA"],
+    "Gasto total + BKHL + FP + PA": [
+        "Gasto dedicado",
+        "Gasto tercero",
+        "Remolques y quintas",
+        "Otros variables",
+        "Neto BKHL",
+        "Devoluciones",
+        "Freight program & PA",
+    ],
+}
+
+# Derivadas: numerador / denominador
+RATIOS = {
+    "Valor de la caja (transporte)": ("Venta", "Volumen ocupación"),
+    "%venta": ("Gasto total + BKHL + FP + PA", "Venta"),
+    "$/caja transportada": ("Gasto total + BKHL + FP + PA", "Volumen ocupación"),
+}
+
+# =============================
+#   ORDEN DE METRICS (sin WAD/ocupación x remolque/kms/remolques embarcados)
+# =============================
+METRIC_ORDER = [
+    "Venta",
+    "Volumen ocupación",
+    "Valor de la caja (transporte)",
+    "%venta",
+    "Gasto total + BKHL + FP + PA",
+    "$/caja transportada",
+
+    "Tractores (fijos)",
+    "Variable dedicado",
+    "Diesel dedicado",
+    "Casetas",
+    "Gasto dedicado",
+
+    "$ de km tercero",
+    "Diesel tercero",
+    "Gasto tercero",
+
+    "Remolques",
+    "Quintas",
+    "Remolques y quintas",
+
+    "Ferry",
+    "Aclaraciones",
+    "Gastos secundarios (SICI)",
+    "Desconsolidador",
+    "Monitoreo",
+    "Transferencias",
+    "Intermodal",
+    "Otros variables",
+
+    "Gasto BKHL",
+    "Ingreso BKHL",
+    "Neto BKHL",
+
+    "Devoluciones",
+
+    "FP",
+    "PA",
+    "Freight program & PA",
+]
+
+# =============================
+#   PERIODOS DERIVADOS (desde la tabla mensual)
+# =============================
+# Rollups: period_type -> (bucket sobre month_num, formato del label). Todos salen de
+# un solo GROUP BY GROUPING SETS; bucket None = año completo (solo uno puede ser None).
+PERIOD_ROLLUPS = {
+    "Q": ("(month_num-1) // 3 + 1", "%04d-Q%d"),
+    "H": ("CASE WHEN month_num <= 6 THEN 1 ELSE 2 END", "%04d-H%d"),
+    "FY": (None, "%04d"),
+}
+
+# Acumulados: period_type -> (partición extra a scenario/region/metric, frame). El orden
+# es el índice de mes continuo (year*12 + month_num) y el label es el mes de cierre.
+# Ejemplos para agregar sin tocar el SQL:
+#   "QTD": ("year, (month_num-1) // 3", "ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW"),
+#   "R3M": (None, "RANGE BETWEEN 2 PRECEDING AND CURRENT ROW"),   # móvil 3 meses, cruza años
+PERIOD_WINDOWS = {
+    "YTD": ("year", "ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW"),
+}
 
 # ---------- helpers: Excel col letters -> index ----------
 def excel_col_to_0idx(col: str) -> int:
@@ -22,11 +181,52 @@ def excel_col_to_0idx(col: str) -> int:
         n = n * 26 + (ord(ch) - ord("A") + 1)
     return n - 1
 
-def get_offset_and_csv_cols(anchor="Tipo de reporte"):
+def raw_source(ws: Workspace | None = None) -> str:
+    """Lo que dejó el ingest: el parquet si existe (fast path), si no el CSV canónico."""
+    if ws is not None:
+        return (ws.raw_parquet if ws.raw_parquet.exists() else ws.raw_csv).as_posix()
+    return RAW_PARQUET if Path(RAW_PARQUET).exists() else RAW_CSV
+
+def read_raw_columns(raw_path: str) -> list[str]:
+    if str(raw_path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_schema(raw_path).names
+    return pd.read_csv(raw_path, nrows=0).columns.tolist()
+
+def raw_scan_sql(raw_path: str) -> str:
+    if str(raw_path).endswith(".parquet"):
+        return f"read_parquet('{raw_path}')"
+    return f"read_csv_auto('{raw_path}', union_by_name=True)"
+
+def template_columns() -> list[str]:
     # Columnas como están en tu Excel (incluye Unnamed:0 y Unnamed:1)
-    xls_cols = pd.read_excel(BASE_XLSX, sheet_name=SHEET, header=2, nrows=0).columns.tolist()
-    # Columnas como quedaron en el CSV (tu dummy)
-    csv_cols = pd.read_csv(RAW_CSV, nrows=0).columns.tolist()
+    return pd.read_excel(BASE_XLSX, sheet_name=SHEET, header=2, nrows=0).columns.tolist()
+
+def layout_problems(columns: list[str], anchor="Tipo de reporte", xls_cols: list[str] | None = None) -> list[str]:
+    """
+    Valida que cada letra de LEAF_LETTERS caiga (vía offset del anchor) en la misma
+    columna que en el template. Lista vacía = layout OK.
+    """
+    xls_cols = xls_cols if xls_cols is not None else template_columns()
+    if anchor not in columns:
+        return [f"Falta la columna ancla '{anchor}'"]
+    offset = xls_cols.index(anchor) - columns.index(anchor)
+    problems = []
+    for metric, letters in LEAF_LETTERS.items():
+        for letter in letters:
+            expected = xls_cols[excel_col_to_0idx(letter)]
+            try:
+                got = colname_from_excel_letter(letter, offset, columns)
+            except IndexError:
+                got = None
+            if got != expected:
+                problems.append(f"{metric} ({letter}): esperaba '{expected}', encontré {got!r}")
+    return problems
+
+def get_offset_and_csv_cols(anchor="Tipo de reporte", raw_path: str | None = None):
+    xls_cols = template_columns()
+    # Columnas como quedaron en el staging (CSV dummy o parquet)
+    csv_cols = read_raw_columns(raw_path or RAW_CSV)
 
     if anchor not in xls_cols or anchor not in csv_cols:
         raise ValueError(
@@ -58,209 +258,265 @@ def sum_letters_sql(letters: list[str], offset: int, csv_cols: list[str]) -> str
     return " + ".join(terms) if terms else "0"
 
 
-# ---------- main ----------
-def main():
-    OUT_DIR.mkdir(exist_ok=True)
-
-    # 1) Prepara mapeo Excel letters -> nombres reales del CSV
-    offset, csv_cols = get_offset_and_csv_cols(anchor="Tipo de reporte")
-    print(f"✅ Offset detectado vs Excel: {offset} columnas")
-
-    # =============================
-    #   LETRAS (según tu layout)
-    # =============================
-
-    # Ventas y Volumen 
-    venta_letters = ["M"]             # "Ventas" en el template (si cambia, ajusta)
-    volumen_letters = ["N"]           # Columna N
+def leaf_columns(offset: int, csv_cols: list[str]) -> dict[str, list[str]]:
+    """Métrica hoja -> nombres reales de columnas en el CSV."""
+    return {
+        metric: [colname_from_excel_letter(l, offset, csv_cols) for l in letters]
+        for metric, letters in LEAF_LETTERS.items()
+    }
 
-    # Gasto dedicado 
-    tractores_letters = ["EC", "ED", "ET", "EU"]
-    variable_dedicado_letters = ["BF", "BG"]
-    diesel_dedicado_letters = ["AX", "BV", "CF"]
-    casetas_letters = ["AV", "BT"]
+def metric_columns(offset: int, csv_cols: list[str]) -> dict[str, list[str]]:
+    """Hojas + compuestas -> columnas del CSV que suman (las derivadas no aplican)."""
+    cols = leaf_columns(offset, csv_cols)
+    for m, parts in COMPOSITES.items():
+        cols[m] = list(dict.fromkeys(c for p in parts for c in cols[p]))
+    return cols
 
-    # Tercero (PxV)
-    km_tercero_letters = ["CA"]       # "porteo tercero"
-    diesel_tercero_letters = ["CB"]   # "base diesel tercero"
+def metric_expressions(offset: int, csv_cols: list[str]) -> dict[str, str]:
+    """
+    Expresión SQL (agregada) de cada métrica: hojas = suma de columnas,
+    compuestas = suma de sus partes, derivadas = num / NULLIF(den, 0).
+    """
+    exprs = {m: sum_letters_sql(letters, offset, csv_cols) for m, letters in LEAF_LETTERS.items()}
+    for m, parts in COMPOSITES.items():  # en orden: cada compuesta solo usa métricas ya definidas
+        exprs[m] = " + ".join(exprs[p] for p in parts)
+    for m, (num, den) in RATIOS.items():
+        exprs[m] = f"({exprs[num]}) / NULLIF(({exprs[den]}), 0)"
+    return exprs
 
-    # Remolques y quintas
-    remolques_letters = ["EK"]        # "remolques"
-    quintas_letters = ["EL"]          # "quintas"
 
-    # Otros variables 
-    ferry_letters = ["CI"]            # "ferry"
-    aclaraciones_letters = ["AZ"]     # "aclaraciones"
-    transferencias_letters = ["CG"]   # "transferencias"
-    intermodal_letters = ["AQ"]       # "intermodal / rail"
-    monitoreo_letters = ["BN"]        # "monitoreo"
-    desconsolidadores_letters = ["CR"]# "desconsolidadores"
+def period_rollup_sql(source: str = "monthly", ratios=RATIOS) -> str:
+    """
+    M + rollups (GROUPING SETS) + acumulados (una ventana por tipo, una sola pasada).
+    Solo las métricas aditivas se suman; las derivadas (ratios) de Q / H / FY / YTD salen
+    de suma(num) / suma(den) del mismo periodo, igual que el Total logística en monthly_sql.
+    """
+    keys = "scenario, year, region, metric"
+    bucket_cols = {pt: f"b_{pt}" for pt, (bucket, _) in PERIOD_ROLLUPS.items() if bucket}
+    buckets = "".join(f",\n        {PERIOD_ROLLUPS[pt][0]} AS {col}" for pt, col in bucket_cols.items())
+    sets = ", ".join(f"({keys}, {bucket_cols[pt]})" if pt in bucket_cols else f"({keys})" for pt in PERIOD_ROLLUPS)
+
+    type_case, label_case = [], []
+    for pt, (_, fmt) in PERIOD_ROLLUPS.items():
+        if pt in bucket_cols:
+            cond = f"GROUPING({bucket_cols[pt]}) = 0"
+            label = f"printf('{fmt}', year, {bucket_cols[pt]})"
+        else:
+            cond = "TRUE"
+            label = f"printf('{fmt}', year)"
+        type_case.append(f"WHEN {cond} THEN '{pt}'")
+        label_case.append(f"WHEN {cond} THEN {label}")
+
+    windows = ",\n      ".join(
+        f"SUM(value) OVER (PARTITION BY scenario, region, metric{', ' + part if part else ''} "
+        f"ORDER BY year * 12 + month_num {frame}) AS \"{pt}\""
+        for pt, (part, frame) in PERIOD_WINDOWS.items()
+    )
+    window_names = ", ".join(f'"{pt}"' for pt in PERIOD_WINDOWS)
+
+    skip = ", ".join(_sql_str(m) for m in ratios) or "NULL"
+    ratio_parts = "".join(f"""
+    UNION ALL
+    SELECT
+      period_type, period_label, scenario, year, month_num, region,
+      {_sql_str(m)} AS metric,
+      SUM(value) FILTER (WHERE metric = {_sql_str(num)})
+        / NULLIF(SUM(value) FILTER (WHERE metric = {_sql_str(den)}), 0) AS value
+    FROM rolled
+    WHERE metric IN ({_sql_str(num)}, {_sql_str(den)})
+    GROUP BY period_type, period_label, scenario, year, month_num, region
+    """ for m, (num, den) in ratios.items())
+
+    return f"""
+    WITH additive AS (
+      SELECT * FROM {source} WHERE metric NOT IN ({skip})
+    ),
+    rolled AS (
+      SELECT
+        CASE {' '.join(type_case)} END AS period_type,
+        CASE {' '.join(label_case)} END AS period_label,
+        scenario, year,
+        NULL::INT AS month_num,
+        region, metric,
+        SUM(value) AS value
+      FROM (SELECT *{buckets} FROM additive)
+      GROUP BY GROUPING SETS ({sets})
+
+      UNION ALL
+      SELECT
+        period_type,
+        printf('%04d-%02d', year, month_num) AS period_label,
+        scenario, year, month_num, region, metric, value
+      FROM (
+        UNPIVOT (
+          SELECT scenario, year, month_num, region, metric,
+            {windows}
+          FROM additive
+        )
+        ON {window_names}
+        INTO NAME period_type VALUE value
+      )
+    )
+    SELECT
+      'M' AS period_type,
+      printf('%04d-%02d', year, month_num) AS period_label,
+      scenario, year, month_num, region, metric, value
+    FROM {source}
 
-    # Si existe en tu layout real (si no, déjalo vacío)
-    gastos_secundarios_letters = []   # <-- si lo tienes, pon su letra aquí (ej: ["DP"])
+    UNION ALL
+    SELECT * FROM rolled
+    {ratio_parts}
+    """
 
-    # BKHL / Devoluciones
-    ingreso_bkhl_letters = ["CW"]     # "ingreso bkhl" (debería venir negativo)
-    gasto_bkhl_letters = ["CX"]       # "bkhl expense" (positivo)
-    devoluciones_letters = ["AH"]     # "neto devoluciones"
-
-    # FP y PA 
-    fp_letters = ["DL"]               # "fp expense"
-    pa_letters = ["DE"]               # "pallet and packaging expense" (si tu PA está en otra, ajústala)
-
-    # =============================
-    #   EXPRESIONES
-    # =============================
-    expr_venta = sum_letters_sql(venta_letters, offset, csv_cols)
-    expr_volumen = sum_letters_sql(volumen_letters, offset, csv_cols)
-
-    expr_tractores = sum_letters_sql(tractores_letters, offset, csv_cols)
-    expr_variable = sum_letters_sql(variable_dedicado_letters, offset, csv_cols)
-    expr_diesel = sum_letters_sql(diesel_dedicado_letters, offset, csv_cols)
-    expr_casetas = sum_letters_sql(casetas_letters, offset, csv_cols)
-
-    expr_gasto_dedicado = " + ".join([expr_tractores, expr_variable, expr_diesel, expr_casetas])
-
-    expr_km_tercero = sum_letters_sql(km_tercero_letters, offset, csv_cols)
-    expr_diesel_tercero = sum_letters_sql(diesel_tercero_letters, offset, csv_cols)
-    expr_gasto_tercero = " + ".join([expr_km_tercero, expr_diesel_tercero])
-
-    expr_remolques = sum_letters_sql(remolques_letters, offset, csv_cols)
-    expr_quintas = sum_letters_sql(quintas_letters, offset, csv_cols)
-    expr_remolques_quintas = " + ".join([expr_remolques, expr_quintas])
-
-    expr_ferry = sum_letters_sql(ferry_letters, offset, csv_cols)
-    expr_aclaraciones = sum_letters_sql(aclaraciones_letters, offset, csv_cols)
-    expr_gastos_sec = sum_letters_sql(gastos_secundarios_letters, offset, csv_cols) if gastos_secundarios_letters else "0"
-    expr_desconso = sum_letters_sql(desconsolidadores_letters, offset, csv_cols)
-    expr_monitoreo = sum_letters_sql(monitoreo_letters, offset, csv_cols)
-    expr_transfer = sum_letters_sql(transferencias_letters, offset, csv_cols)
-    expr_intermodal = sum_letters_sql(intermodal_letters, offset, csv_cols)
-
-    expr_otros_var = " + ".join([
-        expr_ferry,
-        expr_aclaraciones,
-        expr_gastos_sec,
-        expr_desconso,
-        expr_monitoreo,
-        expr_transfer,
-        expr_intermodal,
-    ])
-
-    expr_ingreso_bkhl = sum_letters_sql(ingreso_bkhl_letters, offset, csv_cols)
-    expr_gasto_bkhl = sum_letters_sql(gasto_bkhl_letters, offset, csv_cols)
-    expr_neto_bkhl = " + ".join([expr_gasto_bkhl, expr_ingreso_bkhl])
-
-    expr_devoluciones = sum_letters_sql(devoluciones_letters, offset, csv_cols)
-
-    expr_fp = sum_letters_sql(fp_letters, offset, csv_cols)
-    expr_pa = sum_letters_sql(pa_letters, offset, csv_cols)
-    expr_fp_pa = " + ".join([expr_fp, expr_pa])
-
-    expr_gasto_total = " + ".join([
-        expr_gasto_dedicado,
-        expr_gasto_tercero,
-        expr_remolques_quintas,
-        expr_otros_var,
-        expr_neto_bkhl,
-        expr_devoluciones,
-        expr_fp_pa,
-    ])
-
-    # Derivadas
-    expr_valor_caja = f"({expr_venta}) / NULLIF(({expr_volumen}), 0)"
-    expr_pct_venta = f"({expr_gasto_total}) / NULLIF(({expr_venta}), 0)"
-    expr_cost_per_box = f"({expr_gasto_total}) / NULLIF(({expr_volumen}), 0)"
-
-    # =============================
-    #   ORDEN DE METRICS (sin WAD/ocupación x remolque/kms/remolques embarcados)
-    # =============================
-    METRIC_ORDER = [
-        "Venta",
-        "Volumen ocupación",
-        "Valor de la caja (transporte)",
-        "%venta",
-        "Gasto total + BKHL + FP + PA",
-        "$/caja transportada",
-
-        "Tractores (fijos)",
-        "Variable dedicado",
-        "Diesel dedicado",
-        "Casetas",
-        "Gasto dedicado",
+def prefix_index_sql(source: str = "monthly", ratios=RATIOS) -> str:
+    """
+    Índice de sumas prefijo: por scenario/region/metric, una fila por mes (malla densa
+    entre el primer y el último mes de la base, meses sin dato = 0) con el acumulado.
+    Suma del rango [a, b] = cum_value[b] - cum_value[a-1]. Solo métricas aditivas: las
+    derivadas (RATIOS) se calculan sobre el rango como suma(num) / suma(den) al leerlo.
+    """
+    skip = ", ".join(_sql_str(m) for m in ratios) or "NULL"
+    return f"""
+    WITH m AS (
+      SELECT scenario, region, metric, year * 12 + month_num - 1 AS month_idx, SUM(value) AS value
+      FROM {source}
+      WHERE metric NOT IN ({skip})
+      GROUP BY scenario, region, metric, month_idx
+    ),
+    months AS (
+      SELECT unnest(range(min(month_idx), max(month_idx) + 1)) AS month_idx FROM m
+    ),
+    grid AS (
+      SELECT k.scenario, k.region, k.metric, months.month_idx
+      FROM (SELECT DISTINCT scenario, region, metric FROM m) k CROSS JOIN months
+    )
+    SELECT
+      g.scenario, g.region, g.metric, g.month_idx,
+      (g.month_idx // 12)::INT AS year,
+      (g.month_idx % 12 + 1)::INT AS month_num,
+      COALESCE(m.value, 0) AS value,
+      SUM(COALESCE(m.value, 0)) OVER (
+        PARTITION BY g.scenario, g.region, g.metric ORDER BY g.month_idx
+      ) AS cum_value
+    FROM grid g
+    LEFT JOIN m USING (scenario, region, metric, month_idx)
+    ORDER BY g.scenario, g.region, g.metric, g.month_idx
+    """
 
-        "$ de km tercero",
-        "Diesel tercero",
-        "Gasto tercero",
+def _sql_str(v: str) -> str:
+    return "'" + str(v).replace("'", "''") + "'"
 
-        "Remolques",
-        "Quintas",
-        "Remolques y quintas",
+def _sql_ident(c: str) -> str:
+    return '"' + str(c).replace('"', '""') + '"'
 
-        "Ferry",
-        "Aclaraciones",
-        "Gastos secundarios (SICI)",
-        "Desconsolidador",
-        "Monitoreo",
-        "Transferencias",
-        "Intermodal",
-        "Otros variables",
-
-        "Gasto BKHL",
-        "Ingreso BKHL",
-        "Neto BKHL",
-
-        "Devoluciones",
+def raw_rows_sql(value_cols: list[str], id_cols: list[str], source: str = "clean") -> str:
+    """Filas fuente ya con scenario/year/month/region, columnas de métricas como DOUBLE, ordenadas."""
+    values = ",\n      ".join(f"TRY_CAST({_sql_ident(c)} AS DOUBLE) AS {_sql_ident(c)}" for c in value_cols)
+    ids = ", ".join(_sql_ident(c) for c in id_cols)
+    return f"""
+    SELECT
+      {', '.join(RAW_ROWS_SORT)},
+      {ids},
+      {values}
+    FROM {source}
+    WHERE year IS NOT NULL AND month_num IS NOT NULL
+    ORDER BY {', '.join(RAW_ROWS_SORT)}
+    """
 
-        "FP",
-        "PA",
-        "Freight program & PA",
+def region_sql(csv_cols: list[str]) -> str:
+    """
+    Región de cada fila según la dimensión (core.REGION_DIM / CEDIS_REGION):
+    etiqueta conocida -> región; desconocida -> tal cual; vacía -> CEDIS -> Sin región.
+    Las filas ya totalizadas quedan en NULL (se excluyen; el total sale del GROUPING SETS).
+    """
+    raw = 'trim(CAST(region_raw AS VARCHAR))'
+    dim = " ".join(f"WHEN {_sql_str(k)} THEN {_sql_str(v)}" for k, v in REGION_DIM.items())
+    parts = [f"CASE {raw} {dim} ELSE NULLIF({raw}, '') END"]
+    if CEDIS_REGION and "Cedis" in csv_cols:
+        cedis = " ".join(f"WHEN {_sql_str(k)} THEN {_sql_str(v)}" for k, v in CEDIS_REGION.items())
+        parts.append(f'CASE trim(CAST("Cedis" AS VARCHAR)) {cedis} ELSE NULL END')
+    parts.append(_sql_str(UNASSIGNED_REGION))
+    totals = ", ".join(_sql_str(r) for r in TOTAL_REGION_ALIASES)
+    return f"CASE WHEN {raw} IN ({totals}) THEN NULL ELSE COALESCE({', '.join(parts)}) END"
+
+def quality_stats(con, columns: list[str], top_n: int = 10) -> dict:
+    """
+    Perfil de calidad sobre la tabla `staged` (ya en memoria, sin releer el archivo):
+    por columna referenciada nulls / fallas de cast / negativos / min / max, y
+    conteos de meses, folios y regiones que no mapean.
+    """
+    aggs = []
+    for i, c in enumerate(columns):
+        q = '"' + c.replace('"', '""') + '"'
+        v = f"TRY_CAST({q} AS DOUBLE)"
+        aggs += [
+            f"count(*) FILTER (WHERE {q} IS NULL) AS c{i}_nulls",
+            f"count(*) FILTER (WHERE {q} IS NOT NULL AND {v} IS NULL) AS c{i}_cast_failures",
+            f"count(*) FILTER (WHERE {v} < 0) AS c{i}_negatives",
+            f"min({v}) AS c{i}_min",
+            f"max({v}) AS c{i}_max",
+        ]
+
+    known_regions = sorted(set(REGION_DIM) | set(TOTAL_REGION_ALIASES))
+    region_known = f"trim(region_raw) IN ({', '.join(_sql_str(r) for r in known_regions)})"
+    region_blank = "NULLIF(trim(region_raw), '') IS NULL"
+    region_total = f"trim(region_raw) IN ({', '.join(_sql_str(r) for r in TOTAL_REGION_ALIASES)})"
+    aggs += [
+        "count(*) AS rows_total",
+        "count(*) FILTER (WHERE \"Tipo folio\" IS NULL) AS rows_folio_null",
+        "count(*) FILTER (WHERE \"Tipo folio\" IS NOT NULL AND scenario = 'OTRO') AS unmapped_folio",
+        "count(*) FILTER (WHERE \"Tipo folio\" IS NOT NULL AND month_num IS NULL) AS unmapped_month",
+        "count(*) FILTER (WHERE \"Tipo folio\" IS NOT NULL AND year IS NULL) AS unmapped_year",
+        f"count(*) FILTER (WHERE {region_blank}) AS region_blank",
+        f"count(*) FILTER (WHERE NOT ({region_blank}) AND NOT {region_known}) AS unmapped_region",
+        f"count(*) FILTER (WHERE {region_total}) AS region_total",
     ]
 
-    METRICS = {
-        "Venta": expr_venta,
-        "Volumen ocupación": expr_volumen,
-        "Valor de la caja (transporte)": expr_valor_caja,
-        "%venta": expr_pct_venta,
-        "Gasto total + BKHL + FP + PA": expr_gasto_total,
-        "$/caja transportada": expr_cost_per_box,
-
-        "Tractores (fijos)": expr_tractores,
-        "Variable dedicado": expr_variable,
-        "Diesel dedicado": expr_diesel,
-        "Casetas": expr_casetas,
-        "Gasto dedicado": expr_gasto_dedicado,
-
-        "$ de km tercero": expr_km_tercero,
-        "Diesel tercero": expr_diesel_tercero,
-        "Gasto tercero": expr_gasto_tercero,
-
-        "Remolques": expr_remolques,
-        "Quintas": expr_quintas,
-        "Remolques y quintas": expr_remolques_quintas,
-
-        "Ferry": expr_ferry,
-        "Aclaraciones": expr_aclaraciones,
-        "Gastos secundarios (SICI)": expr_gastos_sec,
-        "Desconsolidador": expr_desconso,
-        "Monitoreo": expr_monitoreo,
-        "Transferencias": expr_transfer,
-        "Intermodal": expr_intermodal,
-        "Otros variables": expr_otros_var,
-
-        "Gasto BKHL": expr_gasto_bkhl,
-        "Ingreso BKHL": expr_ingreso_bkhl,
-        "Neto BKHL": expr_neto_bkhl,
-
-        "Devoluciones": expr_devoluciones,
-
-        "FP": expr_fp,
-        "PA": expr_pa,
-        "Freight program & PA": expr_fp_pa,
+    cur = con.execute(f"SELECT {', '.join(aggs)} FROM staged")
+    names = [d[0] for d in cur.description]
+    row = dict(zip(names, cur.fetchone()))
+
+    def top_values(expr: str, where: str) -> dict:
+        rows = con.execute(
+            f"SELECT CAST({expr} AS VARCHAR) AS v, count(*) AS n FROM staged WHERE {where} "
+            f"GROUP BY 1 ORDER BY n DESC LIMIT {int(top_n)}"
+        ).fetchall()
+        return {str(v): int(n) for v, n in rows}
+
+    def num(x):
+        return float(x) if x is not None else None
+
+    return {
+        "rows_total": int(row["rows_total"]),
+        "rows_folio_null": int(row["rows_folio_null"]),
+        "unmapped": {
+            "folio": int(row["unmapped_folio"]),
+            "month": int(row["unmapped_month"]),
+            "year": int(row["unmapped_year"]),
+            "region_blank": int(row["region_blank"]),
+            "region": int(row["unmapped_region"]),
+            "region_total": int(row["region_total"]),
+        },
+        "unmapped_values": {
+            "folio": top_values('"Tipo folio"', "\"Tipo folio\" IS NOT NULL AND scenario = 'OTRO'") if row["unmapped_folio"] else {},
+            "month": top_values('"Mes"', "\"Tipo folio\" IS NOT NULL AND month_num IS NULL") if row["unmapped_month"] else {},
+            "region": top_values("region_raw", f"NOT ({region_blank}) AND NOT {region_known}") if row["unmapped_region"] else {},
+        },
+        "columns": {
+            c: {
+                "nulls": int(row[f"c{i}_nulls"]),
+                "cast_failures": int(row[f"c{i}_cast_failures"]),
+                "negatives": int(row[f"c{i}_negatives"]),
+                "min": num(row[f"c{i}_min"]),
+                "max": num(row[f"c{i}_max"]),
+            }
+            for i, c in enumerate(columns)
+        },
     }
 
-    # 3) SQL base: leer, limpiar, crear scenario + month_num + region
-    month_case = """
+
+# ---------- main ----------
+MONTH_CASE = """
     CASE lower(trim("Mes"))
       WHEN 'enero' THEN 1
       WHEN 'febrero' THEN 2
@@ -278,12 +534,12 @@ def main():
     END
     """
 
-    con = duckdb.connect()
-
-    con.execute(f"""
-    CREATE OR REPLACE TEMP VIEW clean AS
+def staged_sql(csv_cols: list[str], source: str = RAW_SCAN_PARAM) -> str:
+    """Única lectura del raw: scenario + year + month_num + region sobre todas las columnas."""
+    return f"""
+    CREATE OR REPLACE TEMP TABLE staged AS
     SELECT
-      *,
+      * RENAME ("Region" AS region_raw),
       CASE
         WHEN trim("Tipo folio") = 'Business Plan' THEN 'BP'
         WHEN trim("Tipo folio") = 'Real 2025' THEN 'REAL2025'
@@ -291,111 +547,272 @@ def main():
         ELSE 'OTRO'
       END AS scenario,
       TRY_CAST(CAST("Periodo" AS VARCHAR) AS INTEGER) AS year,
-      {month_case} AS month_num,
-      COALESCE(NULLIF(trim("Region"), ''), 'Total logística') AS region
-    FROM read_csv_auto('{RAW_CSV}', union_by_name=True)
-    WHERE "Tipo folio" IS NOT NULL;
-    """)
+      {MONTH_CASE} AS month_num,
+      {region_sql(csv_cols)} AS region
+    FROM {source};
+    """
 
-    # 4) Construye tabla mensual LONG (metric, value) + region
+def monthly_sql(metrics: dict[str, str], source: str = "clean") -> str:
+    """
+    Tabla mensual LONG (metric, value) por región + Total logística: los dos niveles en el
+    mismo GROUP BY (el total es la suma de las filas, no de las regiones).
+    """
     union_parts = []
     for metric_name in METRIC_ORDER:
-        expr = METRICS.get(metric_name, "0")
+        expr = metrics.get(metric_name, "0")
         union_parts.append(f"""
         SELECT
           scenario,
           year,
           month_num,
-          region,
+          CASE WHEN GROUPING(region) = 1 THEN {_sql_str(TOTAL_REGION)} ELSE region END AS region,
           "Mes" AS month_name,
           '{metric_name}' AS metric,
           {expr} AS value
-        FROM clean
+        FROM {source}
         WHERE year IS NOT NULL AND month_num IS NOT NULL
-        GROUP BY scenario, year, month_num, region, month_name
+        GROUP BY GROUPING SETS (
+          (scenario, year, month_num, month_name, region),
+          (scenario, year, month_num, month_name)
+        )
         """)
+    return "\nUNION ALL\n".join(union_parts)
+
+
+# ---------- SQL generado por layout (cache en data/sql_cache/<fingerprint>.json) ----------
+# El SQL solo depende de las columnas del staging, del template y de las reglas de este
+# archivo / core.py, no de los datos: misma huella = mismo SQL, así que se genera una vez
+# y las corridas siguientes lo leen del JSON. El path del raw no va en el texto (RAW_SCAN_PARAM;
+# con una vista encima el CSV se olfatea dos veces), así sirve entre corridas y workspaces.
+def layout_fingerprint(csv_cols: list[str], raw_path: str) -> str:
+    """sha256 de columnas del staging + tipo de fuente + reglas de métricas/periodos/regiones + template + build.py."""
+    rules = {
+        "columns": csv_cols,
+        "source": Path(raw_path).suffix,
+        "leaf": LEAF_LETTERS, "composites": COMPOSITES, "ratios": RATIOS, "metric_order": METRIC_ORDER,
+        "rollups": PERIOD_ROLLUPS, "windows": PERIOD_WINDOWS,
+        "region_dim": REGION_DIM, "cedis": CEDIS_REGION, "total": [TOTAL_REGION, *TOTAL_REGION_ALIASES],
+        "unassigned": UNASSIGNED_REGION, "raw_rows": [RAW_ROWS_SORT, RAW_ROWS_ID_COLS],
+    }
+    h = hashlib.sha256(json.dumps(rules, ensure_ascii=False, sort_keys=True).encode())
+    file_digest(Path(BASE_XLSX), h)
+    file_digest(Path(__file__), h)   # cambios en las plantillas de SQL
+    return h.hexdigest()
+
+def generate_sql_plan(offset: int, csv_cols: list[str]) -> dict:
+    """Todo el SQL del pipeline para un layout + los mapas de columnas que usa main()."""
+    referenced_cols = list(dict.fromkeys(c for cols in leaf_columns(offset, csv_cols).values() for c in cols))
+    id_cols = [c for c in RAW_ROWS_ID_COLS if c in csv_cols or c == "region_raw"]
+    return {
+        "offset": offset,
+        "referenced_cols": referenced_cols,
+        "id_cols": id_cols,
+        "metric_columns": metric_columns(offset, csv_cols),
+        "sql": {
+            "staged": staged_sql(csv_cols),
+            "monthly": monthly_sql(metric_expressions(offset, csv_cols)),
+            "period_rollup": period_rollup_sql("monthly"),
+            "prefix_index": prefix_index_sql("monthly"),
+            "raw_rows": raw_rows_sql(referenced_cols, id_cols),
+        },
+    }
 
-    monthly_sql = "\nUNION ALL\n".join(union_parts)
-    con.execute(f"CREATE OR REPLACE TEMP VIEW monthly AS {monthly_sql};")
-
-    # 5) Derivados: Q / H / FY / YTD desde mensual (con region)
-    con.execute("""
-    CREATE OR REPLACE TEMP VIEW monthly_labeled AS
-    SELECT
-      'M' AS period_type,
-      printf('%04d-%02d', year, month_num) AS period_label,
-      scenario, year, month_num, region, metric, value
-    FROM monthly;
-    """)
-
-    con.execute("""
-    CREATE OR REPLACE TEMP VIEW quarterly AS
-    SELECT
-      'Q' AS period_type,
-      printf('%04d-Q%d', year, ((month_num-1)/3)::INT + 1) AS period_label,
-      scenario, year,
-      NULL::INT AS month_num,
-      region,
-      metric,
-      SUM(value) AS value
-    FROM monthly
-    GROUP BY scenario, year, ((month_num-1)/3)::INT + 1, region, metric;
-    """)
-
-    con.execute("""
-    CREATE OR REPLACE TEMP VIEW halfyear AS
-    SELECT
-      'H' AS period_type,
-      printf('%04d-H%d', year, CASE WHEN month_num <= 6 THEN 1 ELSE 2 END) AS period_label,
-      scenario, year,
-      NULL::INT AS month_num,
-      region,
-      metric,
-      SUM(value) AS value
-    FROM monthly
-    GROUP BY scenario, year, CASE WHEN month_num <= 6 THEN 1 ELSE 2 END, region, metric;
-    """)
-
-    con.execute("""
-    CREATE OR REPLACE TEMP VIEW fullyear AS
-    SELECT
-      'FY' AS period_type,
-      printf('%04d', year) AS period_label,
-      scenario, year,
-      NULL::INT AS month_num,
-      region,
-      metric,
-      SUM(value) AS value
-    FROM monthly
-    GROUP BY scenario, year, region, metric;
-    """)
+def load_sql_plan(cache_dir: Path, fingerprint: str) -> dict | None:
+    path = cache_dir / f"{fingerprint}.json"
+    if not path.exists():
+        return None
+    try:
+        plan = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None  # archivo a medias / corrupto: se regenera
+    path.touch()  # último uso (el más viejo es el que se borra)
+    return plan
+
+def save_sql_plan(cache_dir: Path, fingerprint: str, plan: dict) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{fingerprint}.json"
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({**plan, "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+    for old in sorted(cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)[:-SQL_CACHE_MAX_FILES]:
+        old.unlink(missing_ok=True)
+
+def sql_plan_kb(plan: dict) -> float:
+    return round(sum(len(q) for q in plan["sql"].values()) / 1024, 1)
+
+# Costo de planeación (binder + optimizador + plan físico) de cada sentencia: duckdb no
+# guarda planes entre conexiones, así que se mide con su profiler en vez de adivinarlo.
+# En la lectura del raw el binder incluye el sniffing de read_csv_auto (o leer el footer
+# del parquet): eso es costo del scan, no del SQL, y se reporta aparte (scan_bind_ms).
+def enable_plan_profiling(con, path: Path) -> None:
+    con.execute("SET enable_profiling = 'json'")
+    con.execute(f"SET profiling_output = {_sql_str(path.as_posix())}")
+    con.execute(f"SET custom_profiling_settings = {_sql_str(json.dumps({m.upper(): 'true' for m in PLAN_METRICS}))}")
+
+def last_plan_ms(path: Path) -> float | None:
+    """Planeación de la última sentencia que terminó; None si el profiler no escribió el archivo."""
+    if not path.exists():
+        return None
+    prof = json.loads(path.read_text(encoding="utf-8"))
+    return round(sum(prof.get(m, 0.0) for m in PLAN_METRICS) * 1000, 2)
+
+def execute_profiled(con, path: Path, query: str, fetch: bool = False):
+    """
+    Corre query con el profiler prendido solo para ella (los conteos y el perfil de
+    calidad no escriben archivo). Regresa (DataFrame si fetch, si no None; plan_ms).
+    """
+    path.unlink(missing_ok=True)  # si la sentencia no lo reescribe, no se reporta la anterior
+    enable_plan_profiling(con, path)
+    try:
+        cur = con.execute(query)
+        df = cur.fetchdf() if fetch else None
+        return df, last_plan_ms(path)
+    finally:
+        con.execute("PRAGMA disable_profiling")
+
+def main(recorder: StageRecorder | None = None, fcst_version: str | None = None, workspace: Workspace | None = None) -> dict:
+    """
+    Corre el pipeline completo. Si se pasa un recorder, las etapas se agregan ahí
+    (así la página de carga junta ingest + build en un solo registro).
+    fcst_version: nombre con el que se guarda el FCST como versión (default: fecha/hora).
+    workspace: de dónde lee el staging y a dónde escribe (default: input/ y data/ del repo).
+    Regresa un dict con rows, rows por vista, la versión de Forecast, si el SQL salió del
+    cache (sql_cache), la planeación de duckdb por sentencia (plan_ms), el bind de la lectura
+    del raw (scan_bind_ms, sniffing incluido) y las etapas medidas.
+    """
+    rec = recorder if recorder is not None else StageRecorder()
+    ws = workspace if workspace is not None else get_workspace()
+    ws.data_dir.mkdir(parents=True, exist_ok=True)
+    out_parquet, out_prefix, out_raw_rows, out_raw_layout = ws.summary, ws.prefix, ws.raw_rows, ws.raw_layout
+    out_arrow = ws.arrow
+
+    # 1) Layout del staging -> SQL del pipeline (del cache si ya se generó para esta huella)
+    rec.start("build.layout_fingerprint")
+    raw_path = raw_source(ws)
+    csv_cols = read_raw_columns(raw_path)
+    fingerprint = layout_fingerprint(csv_cols, raw_path)
+
+    # hit: leer el JSON del cache; miss: detectar el offset vs el template + generar y guardar
+    rec.start("build.sql_generation")
+    plan = load_sql_plan(ws.sql_cache_dir, fingerprint)
+    sql_cache = "miss" if plan is None else "hit"
+    if plan is None:
+        offset, csv_cols = get_offset_and_csv_cols(anchor="Tipo de reporte", raw_path=raw_path)
+        plan = generate_sql_plan(offset, csv_cols)
+        save_sql_plan(ws.sql_cache_dir, fingerprint, plan)
+    rec.note(cache=sql_cache, fingerprint=fingerprint[:12], sql_kb=sql_plan_kb(plan))
+    sql = plan["sql"]
+    offset, referenced_cols, id_cols = plan["offset"], plan["referenced_cols"], plan["id_cols"]
+    print(f"✅ Offset detectado vs Excel: {offset} columnas (SQL {fingerprint[:12]}: {sql_cache})")
+
+    # etapa propia (import + connect): solo la primera corrida del proceso paga el import
+    rec.start("build.duckdb_init")
+    import duckdb  # lazy: whatif.py importa este módulo solo por las fórmulas
 
+    con = duckdb.connect()
+    profile_path = ws.sql_cache_dir / "last_run.prof"
+    plan_ms = {}
+
+    # Única lectura del raw (sniffing de read_csv_auto o read_parquet + carga a memoria);
+    # todo lo demás (perfil de calidad, unión mensual) trabaja sobre la tabla staged.
+    rec.start("build.stage_raw", source=Path(raw_path).suffix.lstrip("."))
+    _, scan_bind_ms = execute_profiled(con, profile_path, sql["staged"].replace(RAW_SCAN_PARAM, raw_scan_sql(raw_path)))
+    rec.note(scan_bind_ms=scan_bind_ms)
     con.execute("""
-    CREATE OR REPLACE TEMP VIEW ytd AS
-    SELECT
-      'YTD' AS period_type,
-      printf('%04d-%02d', year, month_num) AS period_label,
-      scenario, year, month_num,
-      region,
-      metric,
-      SUM(value) OVER (
-        PARTITION BY scenario, year, region, metric
-        ORDER BY month_num
-        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
-      ) AS value
-    FROM monthly;
+    CREATE OR REPLACE TEMP VIEW clean AS
+    SELECT * FROM staged
+    WHERE "Tipo folio" IS NOT NULL AND region IS NOT NULL;
     """)
 
-    final_df = con.execute("""
-      SELECT * FROM monthly_labeled
-      UNION ALL SELECT * FROM quarterly
-      UNION ALL SELECT * FROM halfyear
-      UNION ALL SELECT * FROM fullyear
-      UNION ALL SELECT * FROM ytd
-    """).fetchdf()
-
-    final_df.to_parquet(OUT_PARQUET, index=False)
-    print(f"✅ Generado: {OUT_PARQUET} (rows={len(final_df)})")
+    rec.start("build.quality_stats", columns=len(referenced_cols))
+    quality = quality_stats(con, referenced_cols)
+    rec.note(rows=quality["rows_total"])
+
+    # 4) Tabla mensual LONG por región + Total logística (ver monthly_sql)
+    rec.start("build.materialize_monthly", metrics=len(METRIC_ORDER))
+    # Tabla (no vista): los derivados la leen varias veces sin recalcular las 32 partes
+    _, plan_ms["monthly"] = execute_profiled(con, profile_path, f"CREATE OR REPLACE TEMP TABLE monthly AS {sql['monthly']};")
+    rec.note(plan_ms=plan_ms["monthly"], rows=con.execute("SELECT count(*) FROM monthly").fetchone()[0])
+
+    # 5) Derivados: Q / H / FY (GROUPING SETS) + YTD (ventana) desde mensual, ver PERIOD_*
+    rec.start("build.period_rollup", rollups=list(PERIOD_ROLLUPS), windows=list(PERIOD_WINDOWS))
+    final_df, plan_ms["period_rollup"] = execute_profiled(con, profile_path, sql["period_rollup"], fetch=True)
+    view_rows = {k: int(v) for k, v in final_df["period_type"].value_counts().items()}
+    rec.note(plan_ms=plan_ms["period_rollup"], rows=len(final_df), view_rows=view_rows)
+
+    rec.start("build.write_parquet")
+    # tmp + replace: el archivo anterior puede ser un hardlink al cache de artefactos
+    tmp_parquet = out_parquet.with_suffix(".parquet.tmp")
+    final_df.to_parquet(tmp_parquet, index=False)
+    tmp_parquet.replace(out_parquet)
+    rec.stop(parquet_mb=round(out_parquet.stat().st_size / (1024 * 1024), 2))
+    print(f"✅ Generado: {out_parquet} (rows={len(final_df)})")
+
+    # Mismo dataset en Arrow IPC (diccionarios, sin compresión): las páginas lo mapean en
+    # memoria al arrancar en vez de leer + normalizar el parquet completo
+    rec.start("build.write_arrow")
+    arrow_bytes = write_arrow_summary(final_df, out_arrow, {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": Path(raw_path).name,
+        "rows": int(len(final_df)),
+        "view_rows": view_rows,
+    })
+    rec.stop(arrow_mb=round(arrow_bytes / (1024 * 1024), 2))
+    print(f"✅ Generado: {out_arrow} (memory-map)")
+
+    rec.start("build.fcst_version")
+    version = save_version(final_df, fcst_version, ws.versions_dir)
+    rec.note(**version_note(version))
+    print(f"✅ Versión de Forecast: {version['name']} ({'sin cambios' if version.get('unchanged') else version['kind']})"
+          + (f" · alias {version['alias']!r}" if version.get("alias") else ""))
+
+    rec.start("build.prefix_index")
+    tmp_prefix = out_prefix.with_suffix(".parquet.tmp")
+    _, plan_ms["prefix_index"] = execute_profiled(
+        con, profile_path, f"COPY ({sql['prefix_index']}) TO '{tmp_prefix.as_posix()}' (FORMAT PARQUET)"
+    )
+    tmp_prefix.replace(out_prefix)
+    prefix_rows = con.execute(f"SELECT count(*) FROM read_parquet('{out_prefix.as_posix()}')").fetchone()[0]
+    rec.stop(plan_ms=plan_ms["prefix_index"], rows=prefix_rows)
+    print(f"✅ Generado: {out_prefix} (rows={prefix_rows})")
+
+    # Filas fuente para el drill-down: parquet ordenado (row groups con min/max útiles para
+    # filtrar por escenario/periodo/región) + mapa métrica -> columnas que la componen
+    rec.start("build.raw_rows")
+    tmp_raw = out_raw_rows.with_suffix(".parquet.tmp")
+    _, plan_ms["raw_rows"] = execute_profiled(
+        con, profile_path,
+        f"COPY ({sql['raw_rows']}) TO '{tmp_raw.as_posix()}' "
+        f"(FORMAT PARQUET, ROW_GROUP_SIZE {RAW_ROWS_GROUP_SIZE})",
+    )
+    tmp_raw.replace(out_raw_rows)
+    raw_rows = con.execute(f"SELECT count(*) FROM read_parquet('{out_raw_rows.as_posix()}')").fetchone()[0]
+    tmp_layout = out_raw_layout.with_suffix(".json.tmp")
+    tmp_layout.write_text(json.dumps({
+        "sort": RAW_ROWS_SORT,
+        "id_columns": id_cols,
+        "metric_columns": plan["metric_columns"],
+        "rows": int(raw_rows),
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_layout.replace(out_raw_layout)
+    rec.stop(plan_ms=plan_ms["raw_rows"], rows=raw_rows, parquet_mb=round(out_raw_rows.stat().st_size / (1024 * 1024), 2))
+    print(f"✅ Generado: {out_raw_rows} (rows={raw_rows})")
+    if recorder is None:
+        rec.print_table()
+        print(f"   calidad: unmapped={quality['unmapped']}")
+        print(f"   planeación duckdb: {sum(v or 0.0 for v in plan_ms.values()):,.1f} ms {plan_ms}"
+              f" · bind del scan raw (sniffing): {scan_bind_ms} ms")
+
+    return {
+        "rows": int(len(final_df)),
+        "view_rows": view_rows,
+        "quality": quality,
+        "fcst_version": version,
+        "sql_cache": sql_cache,
+        "plan_ms": plan_ms,
+        "scan_bind_ms": scan_bind_ms,
+        **rec.as_dict(),
+    }
 
 
 if __name__ == "__main__":
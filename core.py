@@ -0,0 +1,696 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Lógica compartida entre las páginas (Summary / Bridge) y los scripts headless
+# (export_packs.py). Nada aquí depende de streamlit.
+
+DATA_PATH = Path("data/summary_allperiods.parquet")
+ARROW_PATH = Path("data/summary_allperiods.arrow")   # mismo dataset, Arrow IPC para memory-map
+ARROW_DICT_COLUMNS = ["period_type", "period_label", "scenario", "region", "metric"]
+PREFIX_PATH = Path("data/prefix_index.parquet")
+RAW_ROWS_PATH = Path("data/raw_rows.parquet")
+RAW_LAYOUT_PATH = Path("data/raw_rows_layout.json")
+DRILLDOWN_MAX_ROWS = 500
+
+MONTHS = [
+    "Enero","Febrero","Marzo","Abril","Mayo","Junio",
+    "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"
+]
+MONTH_TO_NUM = {m: i+1 for i, m in enumerate(MONTHS)}
+
+METRIC_ORDER = [
+    "Venta",
+    "Volumen ocupación",
+    "Valor de la caja (transporte)",
+    "%venta",
+    "Ocupación x remolque",
+    "Kilometros recorridos",
+    "Remolques embarcados",
+    "WAD",
+    "Gasto total + BKHL + FP + PA",
+    "$/caja transportada",
+    "Tractores (fijos)",
+    "Variable dedicado",
+    "Diesel dedicado",
+    "Casetas",
+    "Gasto dedicado",
+    "$ de km tercero",
+    "Diesel tercero",
+    "Gasto tercero",
+    "Remolques",
+    "Quintas",
+    "Remolques y quintas",
+    "Ferry",
+    "Aclaraciones",
+    "Gastos secundarios (SICI)",
+    "Desconsolidador",
+    "Monitoreo",
+    "Transferencias",
+    "Intermodal",
+    "Otros variables",
+    "Gasto BKHL",
+    "Ingreso BKHL",
+    "Neto BKHL",
+    "Devoluciones",
+    "LI",
+    "Devo & LI",
+    "FP",
+    "PA",
+    "Freight program & PA",
+]
+
+SCENARIO_LABEL = {
+    "REAL2025": "Real 2025",
+    "BP": "Business Plan",
+    "FCST": "Forecast actual",
+}
+
+PERIOD_TYPES = ["M", "YTD", "Q", "H", "FY"]
+PERIOD_TYPE_LABEL = {
+    "M": "Mensual",
+    "YTD": "YTD",
+    "Q": "Quarter",
+    "H": "Half-year",
+    "FY": "Full year",
+    "RANGO": "Rango de meses",
+    "MOVIL": "Móvil (N meses)",
+}
+# Se resuelven con el índice de sumas prefijo (PREFIX_PATH), no con el parquet de periodos
+RANGE_PERIOD_TYPES = ["RANGO", "MOVIL"]
+ROLLING_WINDOWS = [3, 6, 12]
+
+ALLOWED_YEARS = [2025, 2026]
+REAL_BASE_YEAR = 2025
+
+TOTAL_REGION = "Total logística"
+UNASSIGNED_REGION = "Sin región"
+PREFERRED_REGION_ORDER = [TOTAL_REGION, "Norte", "Centro", "Sur"]
+
+# ====== Dimensión de región: CEDIS -> región -> Total logística ======
+# Se aplica una sola vez en build.py; el parquet ya trae las regiones finales y el total
+# calculado (GROUPING SETS), las páginas no renombran ni suman nada.
+# Etiqueta de la columna Region en la base -> región
+REGION_DIM = {
+    "Zona Norte": "Norte",
+    "Zona Sur": "Sur",
+    "Zona Centro": "Centro",
+    "Norte": "Norte",
+    "Sur": "Sur",
+    "Centro": "Centro",
+}
+# CEDIS -> región, solo para filas con Region vacía. Vacío hasta que exista el catálogo de
+# CEDIS (la base de ejemplo trae Cedis = 0 en todas las filas): esas filas van a "Sin región".
+CEDIS_REGION: dict[str, str] = {}
+# Filas que ya vienen totalizadas en la base: se excluyen (el total se recalcula)
+TOTAL_REGION_ALIASES = ["Total logistica", TOTAL_REGION]
+
+# ====== Métricas del bridge (según tus definiciones) ======
+TOTAL_METRIC = "Gasto total + BKHL + FP + PA"
+
+MET_TRACTORES = "Tractores (fijos)"
+MET_VAR_DED = "Variable dedicado"
+MET_DIESEL_DED = "Diesel dedicado"
+MET_CASETAS = "Casetas"
+MET_REM_QUINT = "Remolques y quintas"
+MET_PXV = "Gasto tercero"
+MET_OTROS = "Otros variables"
+MET_NETO_BKHL = "Neto BKHL"
+MET_FP_PA = "Freight program & PA"
+MET_VOLUMEN = "Volumen ocupación"
+
+# driver del waterfall -> métricas cuyo delta (FCST - BP) lo componen
+BRIDGE_DRIVERS = [
+    ("Fijos", [MET_TRACTORES]),
+    ("Variables", [MET_VAR_DED, MET_DIESEL_DED, MET_CASETAS]),
+    ("Remolques y quintas", [MET_REM_QUINT]),
+    ("PxV", [MET_PXV]),
+    ("Otros", [MET_OTROS]),
+    ("Iniciativas ahorro", [MET_NETO_BKHL, MET_FP_PA]),
+]
+BRIDGE_ABSORB_DRIVER = "Otros"
+
+
+def normalize_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Filtra años permitidos y normaliza el nombre de la columna de región."""
+    if "year" in df.columns:
+        df = df[df["year"].isin(ALLOWED_YEARS)].copy()
+
+    # --- Normaliza nombre de columna de región ---
+    if "region" not in df.columns:
+        if "Region" in df.columns:
+            df = df.rename(columns={"Region": "region"})
+        elif "REGION" in df.columns:
+            df = df.rename(columns={"REGION": "region"})
+
+    # Los valores ya vienen de la dimensión de región (build.py)
+    if "region" not in df.columns:
+        df["region"] = TOTAL_REGION
+
+    return df
+
+
+def load_summary(path: Path = DATA_PATH) -> pd.DataFrame:
+    """Lee el parquet del build y lo normaliza (sin streamlit)."""
+    return normalize_df(pd.read_parquet(path))
+
+
+def region_options(df: pd.DataFrame) -> tuple[list[str], int]:
+    """Regresa (opciones, índice default): primero las preferidas que existan, luego las demás."""
+    if isinstance(df, ArrowSummary):
+        regions_found = sorted(df.regions())
+    else:
+        regions_found = sorted(df["region"].dropna().astype(str).unique().tolist())
+    options = [r for r in PREFERRED_REGION_ORDER if r in regions_found] + [
+        r for r in regions_found if r not in PREFERRED_REGION_ORDER
+    ]
+    default_index = options.index(TOTAL_REGION) if TOTAL_REGION in options else 0
+    return options, default_index
+
+
+def build_period_label(period_type: str, year: int, extra_value) -> tuple[str, int | None]:
+    """Regresa (period_label, month_num). month_num solo aplica para M/YTD."""
+    if period_type in ["M", "YTD"]:
+        month_num = MONTH_TO_NUM[extra_value]
+        return f"{year:04d}-{month_num:02d}", month_num
+    if period_type == "Q":
+        return f"{year:04d}-Q{int(extra_value)}", None
+    if period_type == "H":
+        return f"{year:04d}-H{int(extra_value)}", None
+    return f"{year:04d}", None  # FY
+
+
+def month_index(year: int, month_num: int) -> int:
+    """Índice de mes continuo (mismo que month_idx del prefix index)."""
+    return year * 12 + month_num - 1
+
+
+def _month_label(month_idx: int) -> str:
+    return f"{month_idx // 12:04d}-{month_idx % 12 + 1:02d}"
+
+
+def build_range_period(period_type: str, year: int, extra_value) -> tuple[str, int, int]:
+    """
+    Regresa (period_label, mes inicial, mes final) como índices de mes inclusivos.
+    RANGO: extra_value = (mes desde, mes hasta) dentro del año.
+    MOVIL: extra_value = (mes de cierre, N); la ventana puede cruzar al año anterior.
+    """
+    if period_type == "RANGO":
+        m_from, m_to = extra_value
+        start, end = month_index(year, MONTH_TO_NUM[m_from]), month_index(year, MONTH_TO_NUM[m_to])
+        return f"{_month_label(start)}..{_month_label(end)}", start, end
+    month_name, n = extra_value
+    end = month_index(year, MONTH_TO_NUM[month_name])
+    return f"{_month_label(end)} (últimos {int(n)}M)", end - int(n) + 1, end
+
+
+def period_month_range(period_type: str, year: int, extra_value) -> tuple[int, int]:
+    """Cualquier tipo de periodo como rango de meses inclusivo (índices de month_index)."""
+    if period_type in RANGE_PERIOD_TYPES:
+        _, start, end = build_range_period(period_type, year, extra_value)
+        return start, end
+    if period_type == "M":
+        m = MONTH_TO_NUM[extra_value]
+        return month_index(year, m), month_index(year, m)
+    if period_type == "YTD":
+        return month_index(year, 1), month_index(year, MONTH_TO_NUM[extra_value])
+    if period_type == "Q":
+        q = int(extra_value)
+        return month_index(year, 3 * q - 2), month_index(year, 3 * q)
+    if period_type == "H":
+        h = int(extra_value)
+        return month_index(year, 6 * h - 5), month_index(year, 6 * h)
+    return month_index(year, 1), month_index(year, 12)  # FY
+
+
+def real_range(start: int, end: int, year: int) -> tuple[str, int, int]:
+    """Mismo rango corrido al año del Real (2025)."""
+    shift = 12 * (year - REAL_BASE_YEAR)
+    start, end = start - shift, end - shift
+    return f"{_month_label(start)}..{_month_label(end)}", start, end
+
+
+def real_period_label(period_label: str) -> str:
+    """period_label del Real siempre amarrado a 2025 (misma granularidad)."""
+    return f"{REAL_BASE_YEAR:04d}{period_label[4:]}"
+
+
+def period_slice(df: pd.DataFrame, period_type: str, period_label: str, region: str, scenarios=None) -> pd.DataFrame:
+    if isinstance(df, ArrowSummary):
+        return df.period_slice(period_type, period_label, region, scenarios)
+    mask = (
+        (df["period_type"] == period_type)
+        & (df["period_label"] == period_label)
+        & (df["region"] == region)
+    )
+    if scenarios is not None:
+        mask &= df["scenario"].isin(scenarios)
+    return df[mask].copy()
+
+
+# ---------------- Dataset mapeado (Arrow IPC) ----------------
+def write_arrow_summary(df: pd.DataFrame, path: Path = ARROW_PATH, meta: dict | None = None) -> int:
+    """
+    Escribe el dataset del build como Arrow IPC (archivo, sin compresión) con las columnas
+    de texto como diccionario y meta en el schema. Sin compresión para poder mapearlo tal
+    cual; tmp + replace para no dejar a medias un archivo que otra sesión tiene mapeado.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in ARROW_DICT_COLUMNS:
+        i = table.schema.get_field_index(name)
+        table = table.set_column(i, name, pc.dictionary_encode(table.column(name)))
+    table = table.combine_chunks().replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"build_info": json.dumps(meta or {}, ensure_ascii=False).encode("utf-8"),
+    })
+    tmp = path.with_suffix(".arrow.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    tmp.replace(path)
+    return path.stat().st_size
+
+
+class ArrowSummary:
+    """
+    El parquet del build como Arrow IPC mapeado en memoria: abrirlo no deserializa nada
+    (las páginas arrancan sin pd.read_parquet + normalize_df). Las columnas diccionario se
+    filtran por código (numpy sobre el mmap) y solo las filas del slice pasan a pandas.
+    """
+
+    def __init__(self, path: Path = ARROW_PATH):
+        import pyarrow as pa
+
+        self.path = Path(path)
+        self.table = pa.ipc.open_file(pa.memory_map(str(self.path), "r")).read_all()
+        self.meta = json.loads((self.table.schema.metadata or {}).get(b"build_info", b"{}"))
+        self._codes = {}
+        self._values = {}
+        for name in ARROW_DICT_COLUMNS:
+            col = self.table.column(name).chunk(0) if self.table.num_rows else None
+            self._codes[name] = col.indices.to_numpy(zero_copy_only=False) if col is not None else np.array([], dtype=np.int32)
+            self._values[name] = col.dictionary.to_pylist() if col is not None else []
+        self._in_years = np.isin(self.table.column("year").to_numpy(), ALLOWED_YEARS)
+
+    @property
+    def mapped_mb(self) -> float:
+        return round(self.table.nbytes / (1024 * 1024), 2)
+
+    def codes(self, name: str) -> np.ndarray:
+        """Código de diccionario por fila de una columna de ARROW_DICT_COLUMNS (filas de ALLOWED_YEARS)."""
+        return self._codes[name][self._in_years]
+
+    def labels(self, name: str) -> list:
+        """Valor de cada código de la columna name."""
+        return list(self._values[name])
+
+    def values(self) -> np.ndarray:
+        """Columna value, mismas filas que codes()."""
+        return self.table.column("value").to_numpy()[self._in_years]
+
+    def regions(self) -> list[str]:
+        used = np.unique(self._codes["region"][self._in_years])
+        return [self._values["region"][i] for i in used]
+
+    def period_labels(self, period_type: str) -> list[str]:
+        used = np.unique(self._codes["period_label"][self._in_years & self._eq("period_type", period_type)])
+        return sorted(self._values["period_label"][i] for i in used)
+
+    def _eq(self, name: str, value) -> np.ndarray:
+        try:
+            return self._codes[name] == self._values[name].index(value)
+        except ValueError:
+            return np.zeros(len(self._codes[name]), dtype=bool)
+
+    def period_slice(self, period_type: str, period_label: str, region: str, scenarios=None) -> pd.DataFrame:
+        mask = self._in_years & self._eq("period_type", period_type) & self._eq("period_label", period_label) & self._eq("region", region)
+        if scenarios is not None:
+            codes = [self._values["scenario"].index(s) for s in scenarios if s in self._values["scenario"]]
+            mask &= np.isin(self._codes["scenario"], codes)
+        return self._to_pandas(self.table.take(np.flatnonzero(mask)))
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Dataset completo normalizado (lo que daba load_summary)."""
+        return normalize_df(self._to_pandas(self.table))
+
+    @staticmethod
+    def _to_pandas(table) -> pd.DataFrame:
+        df = table.to_pandas()
+        for name in ARROW_DICT_COLUMNS:
+            df[name] = df[name].astype(object)  # categorías -> str, como en el parquet
+        return df
+
+
+def load_dataset(data_path: Path = DATA_PATH, arrow_path: Path = ARROW_PATH):
+    """ArrowSummary si el .arrow está al día con el parquet; si no, el DataFrame normalizado."""
+    if arrow_path.exists() and (not data_path.exists() or arrow_path.stat().st_mtime >= data_path.stat().st_mtime):
+        return ArrowSummary(arrow_path)
+    return load_summary(data_path)
+
+
+# ---------------- Rangos arbitrarios (sumas prefijo) ----------------
+class PrefixIndex:
+    """
+    Matriz de acumulados (una fila por scenario/region/metric, una columna por mes).
+    La suma de cualquier rango de meses es cum[:, fin] - cum[:, inicio - 1]: O(1) por
+    métrica sin importar el largo del rango. Meses fuera de la base cuentan como 0.
+    Las métricas derivadas (ratios: métrica -> (num, den)) no se acumulan: en cada rango
+    salen de suma(num) / suma(den), no de sumar los ratios mensuales.
+    """
+
+    def __init__(self, cum_wide: pd.DataFrame, ratios: dict | None = None):
+        self.ratios = dict(ratios or {})
+        # artefactos de antes de excluirlas en build.py también traen los ratios acumulados
+        cum_wide = cum_wide[~cum_wide.index.get_level_values("metric").isin(list(self.ratios))]
+        self.keys = cum_wide.index.to_frame(index=False)
+        self.first_month = int(cum_wide.columns.min())
+        self.n_months = cum_wide.shape[1]
+        # columna 0 = acumulado antes del primer mes
+        self.cum = np.hstack([np.zeros((len(cum_wide), 1)), cum_wide.to_numpy(dtype=float)])
+
+    def _col(self, month_idx: int) -> int:
+        return int(np.clip(month_idx - self.first_month + 1, 0, self.n_months))
+
+    def range_values(self, start: int, end: int) -> np.ndarray:
+        """Suma de [start, end] (índices de mes inclusivos) para todas las llaves."""
+        return self.cum[:, self._col(end)] - self.cum[:, self._col(start - 1)]
+
+    def range_slice(self, start: int, end: int, region: str, scenarios=None,
+                    period_type: str = "RANGO", period_label: str = "") -> pd.DataFrame:
+        """Mismo formato que period_slice (scenario / metric / value) para un rango de meses."""
+        mask = (self.keys["region"] == region).to_numpy()
+        if scenarios is not None:
+            mask &= self.keys["scenario"].isin(scenarios).to_numpy()
+        out = self.keys[mask].copy()
+        out["value"] = self.range_values(start, end)[mask]
+        if self.ratios:
+            out = pd.concat([out, self._ratio_rows(out)], ignore_index=True)
+        out.insert(0, "period_label", period_label)
+        out.insert(0, "period_type", period_type)
+        return out.reset_index(drop=True)
+
+
+    def _ratio_rows(self, additive: pd.DataFrame) -> pd.DataFrame:
+        wide = additive.set_index(["scenario", "region", "metric"])["value"].unstack("metric")
+        parts = []
+        for metric, (num, den) in self.ratios.items():
+            if num in wide and den in wide:
+                value = wide[num] / wide[den].where(wide[den] != 0)   # como NULLIF(den, 0) del build
+                parts.append(value.rename("value").reset_index().assign(metric=metric))
+        cols = ["scenario", "region", "metric", "value"]
+        return pd.concat(parts, ignore_index=True)[cols] if parts else pd.DataFrame(columns=cols)
+
+
+def load_prefix_index(path: Path = PREFIX_PATH, ratios: dict | None = None) -> PrefixIndex:
+    """
+    Lee el prefix index del build (regiones normalizadas igual que el summary).
+    ratios: default build.RATIOS (las mismas parejas num / den que usa whatif).
+    """
+    if ratios is None:
+        from build import RATIOS as ratios
+    # sin la columna year: el filtro de ALLOWED_YEARS rompería los acumulados
+    df = normalize_df(pd.read_parquet(path).drop(columns=["year"]))
+    # misma malla de meses para todas las llaves: sumar acumulados = acumular la suma
+    cum_wide = df.pivot_table(
+        index=["scenario", "region", "metric"], columns="month_idx", values="cum_value", aggfunc="sum"
+    ).fillna(0)
+    return PrefixIndex(cum_wide, ratios)
+
+
+def range_summary_slice(index: PrefixIndex, period_type: str, year: int, extra_value, region: str) -> tuple[pd.DataFrame, str, str]:
+    """Como summary_slice para RANGO / MOVIL. Regresa (slice, label, label del Real)."""
+    label, start, end = build_range_period(period_type, year, extra_value)
+    label_real, real_start, real_end = real_range(start, end, year)
+    slice_real = index.range_slice(real_start, real_end, region, ["REAL2025"], period_type, label_real)
+    slice_bp_fcst = index.range_slice(start, end, region, ["BP", "FCST"], period_type, label)
+    return pd.concat([slice_real, slice_bp_fcst], ignore_index=True), label, label_real
+
+
+def range_bridge_slices(index: PrefixIndex, period_type: str, year: int, extra_value, region: str):
+    """Como los period_slice del Bridge para RANGO / MOVIL: (slice_main, slice_real, label, label_real)."""
+    label, start, end = build_range_period(period_type, year, extra_value)
+    label_real, real_start, real_end = real_range(start, end, year)
+    slice_main = index.range_slice(start, end, region, None, period_type, label)
+    slice_real = index.range_slice(real_start, real_end, region, ["REAL2025"], period_type, label_real)
+    return slice_main, slice_real, label, label_real
+
+
+# ---------------- Drill-down (filas fuente) ----------------
+def load_raw_layout(path: Path = RAW_LAYOUT_PATH) -> dict:
+    """Mapa métrica -> columnas fuente que escribió build.py junto a raw_rows.parquet."""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def driver_columns(driver: str, layout: dict) -> list[str]:
+    metrics = dict(BRIDGE_DRIVERS)[driver]
+    return list(dict.fromkeys(c for m in metrics for c in layout["metric_columns"].get(m, [])))
+
+
+def drilldown_rows(driver: str, start: int, end: int, region: str, layout: dict,
+                   scenarios=("BP", "FCST"), path: Path = RAW_ROWS_PATH,
+                   limit: int = DRILLDOWN_MAX_ROWS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Filas fuente que suman al driver en [start, end] (índices de mes) y región.
+    Regresa (top filas por |aporte|, totales por escenario). Los filtros por
+    escenario/año/región van directo al parquet ordenado (se saltan row groups).
+    """
+    import duckdb
+
+    cols = driver_columns(driver, layout)
+    q = lambda c: '"' + c.replace('"', '""') + '"'
+    aporte = " + ".join(f"COALESCE({q(c)}, 0)" for c in cols) or "0"
+    where = [
+        f"scenario IN ({', '.join('?' for _ in scenarios)})",
+        "year BETWEEN ? AND ?",
+        "year * 12 + month_num - 1 BETWEEN ? AND ?",
+    ]
+    params = [*scenarios, start // 12, end // 12, start, end]
+    if region != TOTAL_REGION:
+        where.append("region = ?")
+        params.append(region)
+    base = f"FROM read_parquet('{Path(path).as_posix()}') WHERE {' AND '.join(where)}"
+    select = ", ".join([*layout["sort"], *(q(c) for c in layout["id_columns"]), *(q(c) for c in cols)])
+
+    con = duckdb.connect()
+    try:
+        rows = con.execute(
+            f"SELECT {select}, {aporte} AS aporte {base} ORDER BY abs(aporte) DESC LIMIT {int(limit)}", params
+        ).fetchdf()
+        totals = con.execute(
+            f"SELECT scenario, count(*) AS filas, SUM({aporte}) AS aporte {base} GROUP BY scenario ORDER BY scenario",
+            params,
+        ).fetchdf()
+    finally:
+        con.close()
+    totals["scenario"] = totals["scenario"].map(lambda x: SCENARIO_LABEL.get(x, x))
+    return rows, totals.set_index("scenario")
+
+
+def drilldown_delta(totals: pd.DataFrame) -> float | None:
+    """FCST − BP del aporte en filas fuente (None si falta alguno de los dos escenarios)."""
+    bp, fcst = SCENARIO_LABEL["BP"], SCENARIO_LABEL["FCST"]
+    if not {bp, fcst}.issubset(totals.index):
+        return None
+    return float(totals.loc[fcst, "aporte"] - totals.loc[bp, "aporte"])
+
+
+# ---------------- Summary ----------------
+def ensure_cols(summary: pd.DataFrame) -> pd.DataFrame:
+    for c in ["Real 2025", "Business Plan", "Forecast actual"]:
+        if c not in summary.columns:
+            summary[c] = 0.0
+
+    # Variaciones
+    if {"Business Plan", "Forecast actual"}.issubset(summary.columns):
+        summary["Δ Forecast vs BP"] = summary["Forecast actual"] - summary["Business Plan"]
+    if {"Real 2025", "Forecast actual"}.issubset(summary.columns):
+        summary["Δ Forecast vs Real"] = summary["Forecast actual"] - summary["Real 2025"]
+
+    ordered = ["Real 2025", "Business Plan", "Forecast actual", "Δ Forecast vs BP", "Δ Forecast vs Real"]
+    ordered = [c for c in ordered if c in summary.columns]
+    return summary[ordered]
+
+
+def summary_slice(df: pd.DataFrame, period_type: str, period_label: str, period_label_real: str, region: str) -> pd.DataFrame:
+    """Real 2025 (period_label_real) + BP/FCST (period_label) para una región."""
+    slice_real = period_slice(df, period_type, period_label_real, region, scenarios=["REAL2025"])
+    slice_bp_fcst = period_slice(df, period_type, period_label, region, scenarios=["BP", "FCST"])
+    return pd.concat([slice_real, slice_bp_fcst], ignore_index=True)
+
+
+def replace_scenario(slice_df: pd.DataFrame, scenario: str, rows: pd.DataFrame) -> pd.DataFrame:
+    """Cambia las filas de un escenario del slice por otras (ej. una versión guardada del Forecast)."""
+    rows = rows.assign(scenario=scenario)
+    return pd.concat([slice_df[slice_df["scenario"] != scenario], rows[rows.columns.intersection(slice_df.columns)]], ignore_index=True)
+
+
+def add_compare_column(summary: pd.DataFrame, slice_other: pd.DataFrame, label: str) -> pd.DataFrame:
+    """Agrega la columna `label` (otra versión del Forecast) y su delta contra el Forecast mostrado."""
+    other = slice_other.groupby("metric")["value"].sum().reindex(summary.index).fillna(0)
+    summary = summary.copy()
+    summary[label] = other
+    summary[f"Δ Forecast vs {label}"] = summary["Forecast actual"] - other
+    return summary
+
+
+def summary_table(slice_df: pd.DataFrame) -> pd.DataFrame:
+    summary = (
+        slice_df.pivot_table(index="metric", columns="scenario", values="value", aggfunc="sum")
+        .reindex(METRIC_ORDER)
+        .rename(columns=SCENARIO_LABEL)
+        .fillna(0)
+    )
+    return ensure_cols(summary)
+
+
+# ---------------- Bridge ----------------
+def metric_sum(df_slice: pd.DataFrame, scenario: str, metric: str) -> float:
+    s = df_slice[(df_slice["scenario"] == scenario) & (df_slice["metric"] == metric)]["value"]
+    return float(s.sum()) if not s.empty else 0.0
+
+
+def metric_delta(df_slice: pd.DataFrame, metric: str) -> float:
+    """Delta FCST - BP para una métrica."""
+    return metric_sum(df_slice, "FCST", metric) - metric_sum(df_slice, "BP", metric)
+
+
+def bridge_waterfall(slice_main: pd.DataFrame, slice_real: pd.DataFrame,
+                     base_label: str = "Business plan (BP 2026)",
+                     final_label: str = "Gasto actual (Forecast)") -> tuple[pd.DataFrame, dict]:
+    """
+    Arma el dataset del waterfall (Real 2025 -> BP -> drivers -> Forecast).
+    Regresa (wdf, debug) donde debug trae los totales para el expander.
+    Con versiones de Forecast, "BP" del slice es la versión base (y base_label su nombre).
+    """
+    # --- Totales ---
+    last_year = metric_sum(slice_real, "REAL2025", TOTAL_METRIC)
+    bp_total = metric_sum(slice_main, "BP", TOTAL_METRIC)
+    fc_total = metric_sum(slice_main, "FCST", TOTAL_METRIC)
+
+    # --- Drivers (deltas FCST - BP) ---
+    drivers = {
+        name: sum(metric_delta(slice_main, m) for m in metrics)
+        for name, metrics in BRIDGE_DRIVERS
+    }
+
+    # ====== CIERRE PERFECTO SIN "Residual" ======
+    # Queremos que:
+    #   bp_total + (sum_drivers) == fc_total
+    delta_total = fc_total - bp_total
+    eps = delta_total - sum(drivers.values())
+
+    # Absorbemos cualquier mini-diferencia en "Otros" (para que cierre exacto sin residual)
+    drivers[BRIDGE_ABSORB_DRIVER] += eps
+
+    # Recalcula sum_drivers ya ajustado
+    sum_drivers = sum(drivers.values())
+
+    # --- arma waterfall dataset ---
+    rows = []
+    rows.append({"step": "Last year (Real 2025)", "start": 0.0, "end": last_year, "delta": 0.0, "kind": "total"})
+    rows.append({"step": base_label, "start": 0.0, "end": bp_total, "delta": 0.0, "kind": "total"})
+
+    cum = bp_total
+    for name, dv in drivers.items():
+        rows.append({"step": name, "start": cum, "end": cum + dv, "delta": dv, "kind": "delta"})
+        cum += dv
+
+    # Sin residual: el cierre debe dar EXACTO al forecast
+    rows.append({"step": final_label, "start": 0.0, "end": fc_total, "delta": 0.0, "kind": "total"})
+
+    debug = {
+        "Last year (Real 2025)": last_year,
+        "Business Plan": bp_total,
+        "Forecast actual": fc_total,
+        "Drivers sum (ajustado)": sum_drivers,
+        "Epsilon absorbido en 'Otros'": eps,
+        "BP + Drivers (debe = Forecast)": bp_total + sum_drivers,
+    }
+    return pd.DataFrame(rows), debug
+
+
+# ---------------- Bridge tarifa / volumen ----------------
+RATE_VOLUME_KEYS = ["period_type", "period_label", "region"]
+
+
+def rate_volume_effects(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Para cada (period_type, period_label, region) y driver del bridge parte el delta
+    FCST - BP en efecto volumen (ΔVolumen x costo por caja BP) y efecto tarifa
+    (Δcosto por caja x Volumen FCST; se calcula como delta - volumen para que cierre
+    exacto). Una sola pasada vectorizada: sirve para todo el parquet o para un slice.
+    El epsilon contra el total se absorbe en BRIDGE_ABSORB_DRIVER, igual que la cascada.
+    """
+    metrics = {MET_VOLUMEN, TOTAL_METRIC} | {m for _, ms in BRIDGE_DRIVERS for m in ms}
+    sub = df[df["scenario"].isin(["BP", "FCST"]) & df["metric"].isin(metrics)]
+    wide = sub.pivot_table(index=RATE_VOLUME_KEYS, columns=["scenario", "metric"], values="value", aggfunc="sum").fillna(0.0)
+    n = len(wide)
+
+    def col(scenario: str, metric: str) -> np.ndarray:
+        key = (scenario, metric)
+        return wide[key].to_numpy(dtype=float) if key in wide.columns else np.zeros(n)
+
+    names = [name for name, _ in BRIDGE_DRIVERS]
+    cost_bp = np.column_stack([sum((col("BP", m) for m in ms), np.zeros(n)) for _, ms in BRIDGE_DRIVERS])
+    cost_fc = np.column_stack([sum((col("FCST", m) for m in ms), np.zeros(n)) for _, ms in BRIDGE_DRIVERS])
+    vol_bp, vol_fc = col("BP", MET_VOLUMEN), col("FCST", MET_VOLUMEN)
+
+    delta = cost_fc - cost_bp
+    eps = (col("FCST", TOTAL_METRIC) - col("BP", TOTAL_METRIC)) - delta.sum(axis=1)
+    delta[:, names.index(BRIDGE_ABSORB_DRIVER)] += eps
+
+    rate_bp = np.divide(cost_bp, vol_bp[:, None], out=np.zeros_like(cost_bp), where=vol_bp[:, None] != 0)
+    volume_effect = (vol_fc - vol_bp)[:, None] * rate_bp
+    rate_effect = delta - volume_effect
+
+    out = wide.index.to_frame(index=False).loc[np.repeat(np.arange(n), len(names))].reset_index(drop=True)
+    out["driver"] = np.tile(names, n)
+    out["bp"] = cost_bp.ravel()
+    out["fcst"] = cost_fc.ravel()
+    out["delta"] = delta.ravel()
+    out["volumen_bp"] = np.repeat(vol_bp, len(names))
+    out["volumen_fcst"] = np.repeat(vol_fc, len(names))
+    out["efecto_volumen"] = volume_effect.ravel()
+    out["efecto_tarifa"] = rate_effect.ravel()
+    return out
+
+
+def rate_volume_waterfall(effects: pd.DataFrame, wdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cascada Real -> BP -> efecto volumen (todos los buckets) -> efecto tarifa por bucket
+    -> Forecast, con los totales de la cascada por bucket (wdf de bridge_waterfall).
+    """
+    totals = wdf[wdf["kind"] == "total"].reset_index(drop=True)
+    bp_total = float(totals.loc[1, "end"])
+    steps = [("Efecto volumen", float(effects["efecto_volumen"].sum()))]
+    steps += [(f"{d} · tarifa", float(v)) for d, v in zip(effects["driver"], effects["efecto_tarifa"])]
+
+    rows = totals.iloc[:2].to_dict(orient="records")
+    cum = bp_total
+    for name, dv in steps:
+        rows.append({"step": name, "start": cum, "end": cum + dv, "delta": dv, "kind": "delta"})
+        cum += dv
+    rows.append(totals.iloc[2].to_dict())
+    return pd.DataFrame(rows)
+
+
+def bridge_chart(wdf: pd.DataFrame):
+    import altair as alt
+
+    return (
+        alt.Chart(wdf)
+        .mark_bar()
+        .encode(
+            x=alt.X("step:N", sort=None, axis=alt.Axis(labelAngle=-90)),
+            y=alt.Y("start:Q", title=None),
+            y2=alt.Y2("end:Q"),
+            tooltip=[
+                alt.Tooltip("step:N"),
+                alt.Tooltip("delta:Q", format=",.2f"),
+                alt.Tooltip("end:Q", format=",.2f"),
+            ],
+        )
+    )
@@ -0,0 +1,182 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core import ARROW_DICT_COLUMNS, DATA_PATH, METRIC_ORDER, PERIOD_TYPES, ArrowSummary, load_summary
+
+# Cubo denso del build: scenario × periodo × región × métrica en un solo ndarray float64
+# (NaN = celda que no existe). Cada lookup es un índice y los slices de las páginas son
+# vistas del array, no filtros de strings sobre el DataFrame long.
+# `python cube.py [parquet]` imprime el footprint del cubo vs el DataFrame.
+
+SCENARIO_ORDER = ["REAL2025", "BP", "FCST"]
+_PT_RANK = {pt: i for i, pt in enumerate(PERIOD_TYPES)}
+
+
+def _sorted_axis(items: list, codes: np.ndarray, key=None) -> tuple[list, np.ndarray]:
+    order = sorted(range(len(items)), key=(lambda i: key(items[i])) if key else (lambda i: items[i]))
+    remap = np.empty(len(items), dtype=np.int64)
+    remap[order] = np.arange(len(items))
+    return [items[i] for i in order], remap[codes]
+
+
+class Cube:
+    def __init__(self, scenarios, periods, regions, metrics, values: np.ndarray):
+        self.scenarios = list(scenarios)
+        self.periods = list(periods)          # (period_type, period_label)
+        self.regions = list(regions)
+        self.metrics = list(metrics)
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.s_idx = {v: i for i, v in enumerate(self.scenarios)}
+        self.p_idx = {v: i for i, v in enumerate(self.periods)}
+        self.r_idx = {v: i for i, v in enumerate(self.regions)}
+        self.m_idx = {v: i for i, v in enumerate(self.metrics)}
+
+    # ---------- construcción ----------
+    @classmethod
+    def from_codes(cls, codes: dict, labels: dict, value: np.ndarray) -> "Cube":
+        """
+        codes[col] = código entero por fila y labels[col] = valor de cada código, para las
+        columnas de ARROW_DICT_COLUMNS. Reordena escenarios / métricas al orden de negocio.
+        """
+        s_order = [s for s in SCENARIO_ORDER if s in labels["scenario"]] + [
+            s for s in labels["scenario"] if s not in SCENARIO_ORDER
+        ]
+        m_order = [m for m in METRIC_ORDER if m in labels["metric"]] + [
+            m for m in labels["metric"] if m not in METRIC_ORDER
+        ]
+        s_map = np.array([s_order.index(s) for s in labels["scenario"]], dtype=np.int64)
+        m_map = np.array([m_order.index(m) for m in labels["metric"]], dtype=np.int64)
+
+        # periodo = par (period_type, period_label): solo los pares que existen
+        pair = codes["period_type"].astype(np.int64) * len(labels["period_label"]) + codes["period_label"]
+        uniq_pairs, p_codes = np.unique(pair, return_inverse=True)
+        periods = [
+            (labels["period_type"][p // len(labels["period_label"])], labels["period_label"][p % len(labels["period_label"])])
+            for p in uniq_pairs
+        ]
+        r_used, r_codes = np.unique(codes["region"], return_inverse=True)
+        regions = [labels["region"][r] for r in r_used]
+        # orden estable (no depende de cómo se codificó el diccionario): tipo de periodo y label, región alfabética
+        periods, p_codes = _sorted_axis(periods, p_codes, key=lambda p: (_PT_RANK.get(p[0], len(_PT_RANK)), p[0], p[1]))
+        regions, r_codes = _sorted_axis(regions, r_codes)
+
+        shape = (len(s_order), len(periods), len(regions), len(m_order))
+        flat = np.ravel_multi_index(
+            (s_map[codes["scenario"]], p_codes, r_codes, m_map[codes["metric"]]), shape
+        )
+        total = np.bincount(flat, weights=value, minlength=int(np.prod(shape)))
+        count = np.bincount(flat, minlength=int(np.prod(shape)))
+        values = np.where(count > 0, total, np.nan).reshape(shape)
+        return cls(s_order, periods, regions, m_order, values)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Cube":
+        """Desde el DataFrame normalizado (load_summary)."""
+        codes, labels = {}, {}
+        for col in ARROW_DICT_COLUMNS:
+            cat = pd.Categorical(df[col])
+            codes[col], labels[col] = cat.codes.astype(np.int64), list(cat.categories)
+        return cls.from_codes(codes, labels, df["value"].to_numpy(dtype=np.float64))
+
+    @classmethod
+    def from_arrow(cls, ds: ArrowSummary) -> "Cube":
+        """Desde el .arrow mapeado: usa los códigos del diccionario, sin pasar por pandas."""
+        codes = {col: ds.codes(col).astype(np.int64) for col in ARROW_DICT_COLUMNS}
+        labels = {col: ds.labels(col) for col in ARROW_DICT_COLUMNS}
+        return cls.from_codes(codes, labels, ds.values())
+
+    @classmethod
+    def load(cls, dataset) -> "Cube":
+        return cls.from_arrow(dataset) if isinstance(dataset, ArrowSummary) else cls.from_frame(dataset)
+
+    # ---------- lookups ----------
+    def value(self, scenario: str, period_type: str, period_label: str, region: str, metric: str) -> float:
+        """O(1); NaN si la celda no existe."""
+        return float(self.values[
+            self.s_idx[scenario], self.p_idx[(period_type, period_label)], self.r_idx[region], self.m_idx[metric]
+        ])
+
+    def column(self, scenario: str, period_type: str, period_label: str, region: str) -> pd.Series:
+        """Todas las métricas de un escenario / periodo / región (una columna del Summary)."""
+        p = self.p_idx.get((period_type, period_label))
+        if p is None or scenario not in self.s_idx or region not in self.r_idx:
+            return pd.Series(np.nan, index=self.metrics)
+        return pd.Series(self.values[self.s_idx[scenario], p, self.r_idx[region]], index=self.metrics)
+
+    def delta(self, period_type: str, period_label: str, region: str, a: str = "FCST", b: str = "BP") -> pd.Series:
+        """a − b por métrica (celdas faltantes cuentan 0), una resta sobre el eje de escenario."""
+        return self.column(a, period_type, period_label, region).fillna(0) - self.column(b, period_type, period_label, region).fillna(0)
+
+    def trend(self, region: str, metric: str, period_type: str = "M") -> pd.DataFrame:
+        """Serie por periodo (filas) y escenario (columnas) de una métrica."""
+        ps = [i for i, (pt, _) in enumerate(self.periods) if pt == period_type]
+        block = self.values[:, ps, self.r_idx[region], self.m_idx[metric]]
+        out = pd.DataFrame(block.T, index=[self.periods[i][1] for i in ps], columns=self.scenarios)
+        return out.sort_index()
+
+    def period_slice(self, period_type: str, period_label: str, region: str, scenarios=None) -> pd.DataFrame:
+        """Mismo formato que core.period_slice (solo celdas que existen)."""
+        p = self.p_idx.get((period_type, period_label))
+        cols = ["period_type", "period_label", "scenario", "region", "metric", "value"]
+        if p is None or region not in self.r_idx:
+            return pd.DataFrame(columns=cols)
+        s_list = [s for s in (scenarios if scenarios is not None else self.scenarios) if s in self.s_idx]
+        block = self.values[[self.s_idx[s] for s in s_list], p, self.r_idx[region]]   # (escenarios, métricas)
+        s_i, m_i = np.nonzero(~np.isnan(block))
+        return pd.DataFrame({
+            "period_type": period_type,
+            "period_label": period_label,
+            "scenario": np.array(s_list, dtype=object)[s_i],
+            "region": region,
+            "metric": np.array(self.metrics, dtype=object)[m_i],
+            "value": block[s_i, m_i],
+        }, columns=cols)
+
+    def frame(self, scenarios=None) -> pd.DataFrame:
+        """Todas las celdas que existen en formato long (columnas de period_slice)."""
+        s_list = [s for s in (scenarios if scenarios is not None else self.scenarios) if s in self.s_idx]
+        block = self.values[[self.s_idx[s] for s in s_list]]
+        s_i, p_i, r_i, m_i = np.nonzero(~np.isnan(block))
+        return pd.DataFrame({
+            "period_type": np.array([pt for pt, _ in self.periods], dtype=object)[p_i],
+            "period_label": np.array([pl for _, pl in self.periods], dtype=object)[p_i],
+            "scenario": np.array(s_list, dtype=object)[s_i],
+            "region": np.array(self.regions, dtype=object)[r_i],
+            "metric": np.array(self.metrics, dtype=object)[m_i],
+            "value": block[s_i, p_i, r_i, m_i],
+        })
+
+    def summary_slice(self, period_type: str, period_label: str, period_label_real: str, region: str) -> pd.DataFrame:
+        """Real (period_label_real) + BP/FCST (period_label), como core.summary_slice."""
+        return pd.concat([
+            self.period_slice(period_type, period_label_real, region, scenarios=["REAL2025"]),
+            self.period_slice(period_type, period_label, region, scenarios=["BP", "FCST"]),
+        ], ignore_index=True)
+
+    # ---------- memoria ----------
+    def footprint(self) -> dict:
+        n_cells = self.values.size
+        filled = int(np.count_nonzero(~np.isnan(self.values)))
+        return {
+            "shape": dict(zip(["scenario", "period", "region", "metric"], self.values.shape)),
+            "cells": int(n_cells),
+            "density": round(filled / n_cells, 3) if n_cells else 0.0,
+            "values_mb": round(self.values.nbytes / (1024 * 1024), 3),
+        }
+
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_PATH
+    df = load_summary(path)
+    cube = Cube.from_frame(df)
+    fp = cube.footprint()
+    long_mb = df.memory_usage(index=True, deep=True).sum() / (1024 * 1024)
+    print(f"Cubo {fp['shape']} · {fp['cells']:,} celdas · densidad {fp['density']:.1%}")
+    print(f"   ndarray float64: {fp['values_mb']:,.3f} MB  vs  DataFrame long: {long_mb:,.2f} MB ({len(df):,} filas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Cache en memoria (por proceso) para el parquet normalizado, el prefix index, versiones y
+# slices derivados. Reemplaza st.cache_data: aquel no tiene tope y cada rebuild (mtime
+# nuevo) dejaba otra copia completa viva hasta reiniciar el server. Aquí:
+#   - cada entrada pertenece a un artefacto (path) + versión (mtime); al pedir una versión
+#     nueva, las entradas de la anterior se descartan,
+#   - LRU con presupuesto en bytes (tamaño estimado de lo que se guarda),
+#   - invalidate(prefix) al publicar un build (workspace.publish),
+#   - contadores hits / misses / evictions para el Debug de las páginas.
+
+DATA_CACHE_MAX_MB = 512
+
+
+def estimate_nbytes(obj) -> int:
+    """Bytes aproximados en memoria (deep para DataFrames; recursivo en contenedores)."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(v) for v in obj)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + estimate_nbytes(vars(obj))
+    return sys.getsizeof(obj)
+
+
+class MemoryCache:
+    def __init__(self, max_bytes: int = DATA_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()   # key -> (artifact, version, value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _drop(self, key) -> None:
+        self._bytes -= self._entries.pop(key)[3]
+
+    def get_or_load(self, artifact: str, version, key: tuple, loader):
+        """Valor de key para (artifact, version); si no está (o es de otra versión) corre loader()."""
+        full_key = (artifact, *key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry[1] == version:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            # versión vieja del artefacto: ya no se va a pedir, se libera de una vez
+            stale = [k for k, e in self._entries.items() if e[0] == artifact and e[1] != version]
+            for k in stale:
+                self._drop(k)
+            self.invalidations += len(stale)
+
+        # fuera del lock: dos sesiones pueden cargar lo mismo a la vez, pero no se bloquean
+        value = loader()
+        nbytes = estimate_nbytes(value)
+        if nbytes > self.max_bytes:
+            return value  # no cabe ni solo: se regresa sin guardar
+
+        with self._lock:
+            if full_key in self._entries:
+                self._drop(full_key)
+            self._entries[full_key] = (artifact, version, value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def memoize(self, func):
+        """
+        Decorador estilo st.cache_data: el primer argumento es el artefacto (path), el
+        segundo su versión (mtime); el resto forma la llave, excepto los que empiezan
+        con "_" (no hasheables, ej. un DataFrame ya cargado), igual que en streamlit.
+        """
+        sig = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = list(bound.arguments.items())
+            artifact, version = str(params[0][1]), params[1][1]
+            key = (name, *(v for k, v in params[2:] if not k.startswith("_")))
+            return self.get_or_load(artifact, version, key, lambda: func(*bound.args, **bound.kwargs))
+
+        return wrapper
+
+    def invalidate(self, prefix: str | None = None) -> int:
+        """Descarta las entradas cuyo artefacto es prefix o está bajo prefix/ (None = todo)."""
+        with self._lock:
+            keys = [
+                k for k, e in self._entries.items()
+                if prefix is None or e[0] == prefix or e[0].startswith(prefix.rstrip("/") + "/")
+            ]
+            for k in keys:
+                self._drop(k)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "mb": round(self._bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def entries(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"artifact": e[0], "key": str(k[1:])[:80], "version": e[1], "mb": round(e[3] / (1024 * 1024), 3)}
+                for k, e in reversed(self._entries.items())
+            ]
+
+
+DATA_CACHE = MemoryCache()
+
+
+@DATA_CACHE.memoize
+def load_fcst_version(versions_dir: str, manifest_mtime: float, name: str) -> pd.DataFrame:
+    """Versión de Forecast materializada; la misma entrada para Summary y Bridge."""
+    from fcst_versions import load_version
+
+    return load_version(name, Path(versions_dir))
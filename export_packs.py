@@ -0,0 +1,163 @@
+"""
+Export headless de los "executive packs": para cada región × tipo de periodo × label
+genera la gráfica del bridge (PNG/SVG) y un Excel con Summary + Bridge.
+
+Usa la misma lógica que app.py / pages/2_Bridge.py (core.py) y reparte los packs
+en un pool de procesos. Al final imprime el benchmark (packs por minuto).
+
+    python export_packs.py --workers 4 --formats png svg
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from core import (
+    DATA_PATH,
+    PERIOD_TYPES,
+    PERIOD_TYPE_LABEL,
+    REAL_BASE_YEAR,
+    bridge_chart,
+    bridge_waterfall,
+    load_summary,
+    period_slice,
+    real_period_label,
+    region_options,
+    summary_slice,
+    summary_table,
+)
+
+EXPORT_DIR = Path("exports")
+CHART_FORMATS = ["png", "svg"]
+
+# DataFrame cargado una vez por worker (initializer) para no serializarlo en cada pack
+_DF = None
+
+
+def _init_worker(data_path: str) -> None:
+    global _DF
+    _DF = load_summary(Path(data_path))
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "_", text.strip()).strip("_") or "x"
+
+
+def list_packs(df: pd.DataFrame) -> list[tuple[str, str, str]]:
+    """(region, period_type, period_label) para todo lo que tenga BP/FCST en el parquet."""
+    regions, _ = region_options(df)
+    main = df[df["scenario"].isin(["BP", "FCST"]) & (df["year"] != REAL_BASE_YEAR)]
+    labels = main[["period_type", "period_label"]].drop_duplicates()
+
+    packs = []
+    for region in regions:
+        for period_type in PERIOD_TYPES:
+            for period_label in sorted(labels.loc[labels["period_type"] == period_type, "period_label"]):
+                packs.append((region, period_type, period_label))
+    return packs
+
+
+def render_pack(region: str, period_type: str, period_label: str, out_dir: str, formats: list[str]) -> dict:
+    """Corre en el worker: summary + bridge de un pack y los escribe a disco."""
+    t0 = time.perf_counter()
+    df = _DF
+    period_label_real = real_period_label(period_label)
+
+    pack_dir = Path(out_dir) / slugify(region) / period_type
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    stem = slugify(period_label)
+
+    summary = summary_table(summary_slice(df, period_type, period_label, period_label_real, region))
+
+    slice_main = period_slice(df, period_type, period_label, region)
+    slice_real = period_slice(df, period_type, period_label_real, region, scenarios=["REAL2025"])
+    wdf, bridge_debug = bridge_waterfall(slice_main, slice_real)
+
+    title = f"Bridge — {PERIOD_TYPE_LABEL.get(period_type, period_type)} · {period_label} (Real: {period_label_real}) · {region}"
+    chart = bridge_chart(wdf).properties(title=title, width=640, height=400)
+    files = []
+    for fmt in formats:
+        path = pack_dir / f"{stem}_bridge.{fmt}"
+        chart.save(str(path))  # png/svg requieren vl-convert-python
+        files.append(str(path))
+
+    xlsx_path = pack_dir / f"{stem}.xlsx"
+    with pd.ExcelWriter(xlsx_path, engine="openpyxl") as writer:
+        summary.to_excel(writer, sheet_name="Summary")
+        wdf.to_excel(writer, sheet_name="Bridge", index=False)
+        pd.Series(bridge_debug, name="valor").to_excel(writer, sheet_name="Bridge debug")
+    files.append(str(xlsx_path))
+
+    return {
+        "region": region,
+        "period_type": period_type,
+        "period_label": period_label,
+        "files": files,
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export batch de executive packs (región × periodo).")
+    parser.add_argument("--data", default=str(DATA_PATH), help="Parquet generado por build.py")
+    parser.add_argument("--out", default=str(EXPORT_DIR), help="Carpeta de salida")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--formats", nargs="+", default=CHART_FORMATS, choices=CHART_FORMATS)
+    parser.add_argument("--limit", type=int, default=None, help="Solo los primeros N packs (para probar)")
+    args = parser.parse_args()
+
+    data_path = Path(args.data)
+    if not data_path.exists():
+        raise SystemExit(f"No encuentro {data_path}. Corre el pipeline (Cargar base o py build.py).")
+
+    packs = list_packs(load_summary(data_path))
+    if args.limit is not None:
+        packs = packs[: args.limit]
+
+    out_dir = Path(args.out) / datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"📦 {len(packs)} packs -> {out_dir} ({args.workers} workers, formatos: {', '.join(args.formats)})")
+
+    t0 = time.perf_counter()
+    results, errors = [], []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(str(data_path),)) as pool:
+        futures = {
+            pool.submit(render_pack, region, period_type, period_label, str(out_dir), args.formats): (region, period_type, period_label)
+            for region, period_type, period_label in packs
+        }
+        for i, fut in enumerate(as_completed(futures), start=1):
+            region, period_type, period_label = futures[fut]
+            try:
+                results.append(fut.result())
+                print(f"[{i}/{len(packs)}] ✅ {region} · {period_type} · {period_label}")
+            except Exception as e:
+                errors.append({"region": region, "period_type": period_type, "period_label": period_label, "error": repr(e)})
+                print(f"[{i}/{len(packs)}] ❌ {region} · {period_type} · {period_label}: {e!r}")
+
+    elapsed = time.perf_counter() - t0
+    packs_per_min = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+
+    bench = {
+        "packs": len(results),
+        "errors": len(errors),
+        "workers": args.workers,
+        "formats": args.formats,
+        "elapsed_s": round(elapsed, 2),
+        "packs_per_min": round(packs_per_min, 1),
+    }
+    manifest = {"benchmark": bench, "packs": results, "errors": errors}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"✅ {len(results)} packs en {elapsed:.1f}s → {packs_per_min:.1f} packs/min ({len(errors)} errores)")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Versiones del Forecast: cada corrida del pipeline guarda el FCST agregado como versión
+# con nombre ("Forecast Enero 2026", ...). Para que el disco no crezca con la tabla
+# completa por versión, solo cada SNAPSHOT_EVERY versiones se guarda completa; las demás
+# son deltas (celdas que cambiaron / desaparecieron) contra la versión anterior. Si una
+# corrida con nombre no cambia el FCST, el nombre queda como alias de la última versión.
+
+VERSIONS_DIR = Path("data/fcst_versions")
+MANIFEST = VERSIONS_DIR / "manifest.json"
+KEY_COLS = ["period_type", "period_label", "region", "metric"]
+SNAPSHOT_EVERY = 8
+VALUE_TOL = 1e-9
+
+
+def read_manifest(path: Path = MANIFEST) -> list[dict]:
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8")).get("versions", [])
+
+
+def _write_manifest(versions: list[dict], path: Path = MANIFEST) -> None:
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"versions": versions}, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def version_names(path: Path = MANIFEST) -> list[str]:
+    """Nombres en orden de creación; los alias van justo después de su versión."""
+    return [n for v in read_manifest(path) for n in [v["name"], *v.get("aliases", [])]]
+
+
+def _fcst_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Solo llaves + value, una fila por llave (orden estable para comparar)."""
+    if "scenario" in df.columns:
+        df = df[df["scenario"] == "FCST"]
+    out = df.groupby(KEY_COLS, as_index=False)["value"].sum()
+    return out.sort_values(KEY_COLS).reset_index(drop=True)
+
+
+def diff_versions(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Delta old -> new: filas nuevas o con valor distinto (op U) y llaves que ya no están (op D)."""
+    m = old.merge(new, on=KEY_COLS, how="outer", suffixes=("_old", "_new"), indicator=True)
+    gone = m["_merge"] == "left_only"
+    v_old, v_new = m["value_old"].to_numpy(float), m["value_new"].to_numpy(float)
+    both_nan = np.isnan(v_old) & np.isnan(v_new)
+    changed = (m["_merge"] == "right_only") | (
+        (m["_merge"] == "both") & ~both_nan & ~(np.abs(v_old - v_new) <= VALUE_TOL)
+    )
+    delta = m.loc[changed | gone, KEY_COLS + ["value_new"]].rename(columns={"value_new": "value"})
+    delta["op"] = np.where(gone[changed | gone], "D", "U")
+    return delta.reset_index(drop=True)
+
+
+def apply_delta(base: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    if delta.empty:
+        return base
+    rest = base.merge(delta[KEY_COLS], on=KEY_COLS, how="left", indicator=True)
+    rest = rest[rest["_merge"] == "left_only"].drop(columns="_merge")
+    upserts = delta.loc[delta["op"] == "U", KEY_COLS + ["value"]]
+    return pd.concat([rest, upserts], ignore_index=True).sort_values(KEY_COLS).reset_index(drop=True)
+
+
+def load_version(name: str, versions_dir: Path = VERSIONS_DIR) -> pd.DataFrame:
+    """Reconstruye la versión: último snapshot anterior + deltas en orden."""
+    versions = read_manifest(versions_dir / MANIFEST.name)
+    idx = next((i for i, v in enumerate(versions) if name == v["name"] or name in v.get("aliases", [])), None)
+    if idx is None:
+        raise KeyError(f"No existe la versión de Forecast {name!r}")
+    start = max(i for i in range(idx + 1) if versions[i]["kind"] == "snapshot")
+    df = pd.read_parquet(versions_dir / versions[start]["file"])
+    for v in versions[start + 1: idx + 1]:
+        df = apply_delta(df, pd.read_parquet(versions_dir / v["file"]))
+    return df
+
+
+def save_version(df: pd.DataFrame, name: str | None, versions_dir: Path = VERSIONS_DIR) -> dict:
+    """
+    Guarda el FCST de df (formato del parquet de build.py) como nueva versión (name None =
+    "Forecast <fecha hora>"). Si no cambió nada contra la última versión no escribe datos y
+    regresa esa versión con unchanged=True; un name explícito se registra como alias de
+    ella (alias = name) salvo que ya exista, en cuyo caso alias = None (no se guardó).
+    """
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    manifest = versions_dir / MANIFEST.name
+    versions = read_manifest(manifest)
+    new = _fcst_frame(df)
+    requested, name = name, name or f"Forecast {datetime.now():%Y-%m-%d %H:%M}"
+    taken = set(version_names(manifest))
+
+    entry = {"created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "rows": int(len(new))}
+    since_snapshot = next((n for n, v in enumerate(reversed(versions)) if v["kind"] == "snapshot"), None)
+    if versions and since_snapshot is not None and since_snapshot + 1 < SNAPSHOT_EVERY:
+        delta = diff_versions(load_version(versions[-1]["name"], versions_dir), new)
+        if delta.empty:
+            alias = requested if requested and requested not in taken else None
+            if alias:
+                versions[-1].setdefault("aliases", []).append(alias)
+                _write_manifest(versions, manifest)
+            return {**versions[-1], "unchanged": True, "requested_name": requested, "alias": alias}
+        entry.update(kind="delta", changed_cells=int(len(delta)))
+        payload = delta
+    else:
+        entry.update(kind="snapshot", changed_cells=int(len(new)))
+        payload = new
+
+    unique, n = name, 2
+    while unique in taken:
+        unique, n = f"{name} ({n})", n + 1
+    entry["name"] = unique
+    entry["file"] = f"v{len(versions) + 1:04d}_{entry['kind']}.parquet"
+
+    payload.to_parquet(versions_dir / entry["file"], index=False)
+    entry["file_kb"] = round((versions_dir / entry["file"]).stat().st_size / 1024, 1)
+    _write_manifest(versions + [entry], manifest)
+    return entry
+
+
+def version_note(version: dict) -> dict:
+    """Lo que se anota en la etapa build.fcst_version: sin cambios no escribe celdas."""
+    if version.get("unchanged"):
+        return {"kind": "unchanged", "changed_cells": 0, "same_as": version["name"], "alias": version.get("alias")}
+    return {"kind": version["kind"], "changed_cells": version["changed_cells"]}
+
+
+def version_slice(vdf: pd.DataFrame, period_type: str, period_label: str, region: str, scenario: str = "FCST") -> pd.DataFrame:
+    """Filas de una versión con el formato de period_slice (scenario / metric / value)."""
+    mask = (vdf["period_type"] == period_type) & (vdf["period_label"] == period_label) & (vdf["region"] == region)
+    out = vdf[mask].copy()
+    out["scenario"] = scenario
+    return out
@@ -0,0 +1,442 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import csv
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from instrumentation import StageRecorder
+from workspace import Workspace
+
+# Ingest de la base subida -> CSV canónico input/raw_dummy.csv (lo que lee build.py).
+# El upload se copia a disco por bloques y luego se procesa por chunks de filas, así
+# la memoria pico no depende del tamaño del archivo (solo de INGEST_CHUNK_ROWS).
+
+# Paths esperados por tu pipeline
+INPUT_DIR = Path("input")
+DATA_DIR = Path("data")
+RAW_DUMMY = INPUT_DIR / "raw_dummy.csv"          # <- para no tocar build.py
+RAW_PARQUET = INPUT_DIR / "raw_dummy.parquet"    # fast path: uploads parquet / Arrow IPC
+
+REQUIRED_HINTS = ["Tipo de reporte", "Tipo folio", "Mes", "Periodo"]
+ARROW_SUFFIXES = (".parquet", ".arrow", ".feather", ".ipc")
+UPLOAD_TYPES = ["csv", "xlsx"] + [s.lstrip(".") for s in ARROW_SUFFIXES]
+
+SPOOL_CHUNK_BYTES = 8 * 1024 * 1024
+INGEST_CHUNK_ROWS = 20_000
+HEADER_SCAN_ROWS = 40
+HEADER_SCAN_LINES = 60
+HEADER_SCAN_COLS = 80
+# el pool de varios archivos corre dentro del server de streamlit (multihilo): fork copiaría
+# locks tomados por otros hilos al hijo, spawn arranca intérpretes limpios
+POOL_START_METHOD = "spawn"
+
+
+def find_header_row_excel(source, sheet_name: str = "Base", scan_rows: int = HEADER_SCAN_ROWS) -> int:
+    """Encuentra la fila donde están los headers (busca 'Tipo de reporte'). source: path o bytes."""
+    import openpyxl
+    from io import BytesIO
+
+    wb = openpyxl.load_workbook(BytesIO(source) if isinstance(source, bytes) else source, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+        for r, row in enumerate(ws.iter_rows(max_row=scan_rows, max_col=HEADER_SCAN_COLS, values_only=True)):
+            if any(v is not None and str(v).strip().lower() == "tipo de reporte" for v in row):
+                return r  # pandas usa header 0-based
+        return 0
+    finally:
+        wb.close()
+
+def find_header_row_csv(text: str, scan_lines: int = HEADER_SCAN_LINES) -> int:
+    lines = text.splitlines()
+    for i, line in enumerate(lines[:scan_lines]):
+        low = line.lower()
+        if ("tipo de reporte" in low) and ("tipo folio" in low) and ("mes" in low) and ("periodo" in low):
+            return i
+    return 0
+
+def read_head_text(path: Path, max_lines: int = HEADER_SCAN_LINES) -> str:
+    """Solo las primeras líneas del archivo (para detectar el header sin leerlo todo)."""
+    lines = []
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        for line in f:
+            lines.append(line)
+            if len(lines) >= max_lines:
+                break
+    return "".join(lines)
+
+
+def spool_upload(uploaded_file, suffix: str, input_dir: Path = INPUT_DIR) -> Path:
+    """Copia el upload a un archivo temporal en input/ por bloques (sin getvalue())."""
+    input_dir.mkdir(parents=True, exist_ok=True)
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    fd, tmp = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=input_dir)
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(uploaded_file, out, SPOOL_CHUNK_BYTES)
+    return Path(tmp)
+
+
+def _excel_header_names(values) -> list[str]:
+    """Nombres de columna como los pone pd.read_excel (Unnamed: i, duplicados .1, .2 ...)."""
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = f"Unnamed: {i}" if v is None or str(v).strip() == "" else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def iter_excel_chunks(path: Path, sheet_name: str, header_row: int, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Lee la hoja en modo streaming (openpyxl read_only) y produce DataFrames de chunk_rows filas."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
+        rows = ws.iter_rows(min_row=header_row + 1, values_only=True)
+        columns = _excel_header_names(next(rows, ()))
+        width = len(columns)
+
+        buf, pending_blank = [], []
+        for row in rows:
+            row = (tuple(row) + (None,) * width)[:width]
+            if all(v is None for v in row):
+                # como pandas: filas vacías intermedias se conservan, las del final no
+                pending_blank.append(row)
+                continue
+            if pending_blank:
+                buf.extend(pending_blank)
+                pending_blank = []
+            buf.append(row)
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame.from_records(buf, columns=columns)
+                buf = []
+        if buf:
+            yield pd.DataFrame.from_records(buf, columns=columns)
+    finally:
+        wb.close()
+
+def iter_csv_chunks(path: Path, header_line: int, chunk_rows: int = INGEST_CHUNK_ROWS):
+    yield from pd.read_csv(path, encoding="utf-8-sig", skiprows=header_line, chunksize=chunk_rows)
+
+
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    # Limpieza mínima para evitar mismatches típicos (vacíos quedan como 'nan', igual que astype(str))
+    for col in ["Tipo folio", "Mes"]:
+        if col in df.columns:
+            s = df[col]
+            df[col] = s.astype(str).str.strip().where(s.notna(), "nan")
+    return df
+
+
+def write_chunks(chunks, out_path: Path, rec: StageRecorder) -> tuple[int, int]:
+    """Escribe los chunks al CSV canónico (append) acumulando tiempos de lectura/limpieza/escritura."""
+    rows = cols = n_chunks = 0
+    read_s = clean_s = write_s = 0.0
+    tmp_out = out_path.with_suffix(".csv.tmp")
+
+    try:
+        t = time.perf_counter()
+        for df in chunks:
+            t1 = time.perf_counter()
+            read_s += t1 - t
+            df = clean_chunk(df)
+            t2 = time.perf_counter()
+            clean_s += t2 - t1
+            df.to_csv(tmp_out, index=False, mode="w" if n_chunks == 0 else "a", header=(n_chunks == 0))
+            t = time.perf_counter()
+            write_s += t - t2
+            rows += len(df)
+            cols = df.shape[1]
+            n_chunks += 1
+
+        if n_chunks == 0:
+            raise ValueError("El archivo no tiene filas después del header.")
+    except BaseException:
+        tmp_out.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_out, out_path)  # el CSV anterior queda intacto hasta el final
+    rec.note(rows=rows, chunks=n_chunks, read_s=round(read_s, 4), clean_s=round(clean_s, 4), write_s=round(write_s, 4))
+    return rows, cols
+
+
+def open_arrow_batches(path: Path):
+    """(schema, iterador de RecordBatch) para parquet o Arrow IPC (file o stream), sin leer todo."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if path.suffix.lower() == ".parquet":
+        pf = pq.ParquetFile(path)
+        return pf.schema_arrow, pf.iter_batches(batch_size=INGEST_CHUNK_ROWS)
+    source = pa.memory_map(str(path))
+    try:
+        reader = pa.ipc.open_file(source)
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        reader = pa.ipc.open_stream(source)
+        return reader.schema, iter(reader)
+
+def arrow_layout(names: list[str]) -> list[str]:
+    """
+    Valida el schema contra el template (columnas requeridas + columnas de métricas en
+    su posición). Si solo cambia el orden, regresa las columnas en orden del template.
+    """
+    from build import layout_problems, template_columns
+
+    missing = [c for c in REQUIRED_HINTS + ["Region"] if c not in names]
+    if missing:
+        raise ValueError(f"Faltan columnas requeridas del template: {missing}")
+
+    xls_cols = template_columns()
+    problems = layout_problems(names, xls_cols=xls_cols)
+    if not problems:
+        return names
+
+    # headers numéricos (ej. cuentas 4513019) vienen como int en el template
+    tpl = [str(c) for c in xls_cols]
+    ordered = [c for c in tpl if c in names] + [c for c in names if c not in tpl]
+    if not layout_problems(ordered, xls_cols=xls_cols):
+        return ordered
+    raise ValueError("El archivo no coincide con el layout del template:\n- " + "\n- ".join(problems[:20]))
+
+def _select_schema(schema, names: list[str]):
+    import pyarrow as pa
+    return pa.schema([schema.field(n) for n in names], metadata=schema.metadata)
+
+def stage_arrow(path: Path, rec: StageRecorder, raw_parquet: Path = RAW_PARQUET, raw_csv: Path = RAW_DUMMY) -> tuple[int, int]:
+    """Parquet / Arrow IPC -> input/raw_dummy.parquet sin pasar por texto."""
+    import pyarrow.parquet as pq
+
+    rec.start("ingest.validate_schema")
+    schema, batches = open_arrow_batches(path)
+    names = arrow_layout(schema.names)
+
+    if path.suffix.lower() == ".parquet" and names == schema.names:
+        rec.start("ingest.copy_parquet")
+        shutil.copyfile(path, raw_parquet)
+        rows = pq.ParquetFile(raw_parquet).metadata.num_rows
+    else:
+        rec.start("ingest.write_parquet")
+        tmp_out = raw_parquet.with_suffix(".parquet.tmp")
+        rows = 0
+        try:
+            with pq.ParquetWriter(tmp_out, schema=_select_schema(schema, names)) as writer:
+                for batch in batches:
+                    writer.write_batch(batch.select(names))
+                    rows += batch.num_rows
+        except BaseException:
+            tmp_out.unlink(missing_ok=True)
+            raise
+        os.replace(tmp_out, raw_parquet)
+    rec.note(rows=rows)
+    raw_csv.unlink(missing_ok=True)  # build.py toma el parquet
+    return rows, len(names)
+
+
+def normalize_to_raw_dummy(
+    uploaded_file, recorder: StageRecorder | None = None, workspace: Workspace | None = None
+) -> tuple[int, int]:
+    """
+    Convierte CSV/XLSX al CSV canónico input/raw_dummy.csv; parquet / Arrow IPC se
+    validan y quedan como input/raw_dummy.parquet (build.py lee el que exista).
+    uploaded_file: UploadedFile de streamlit (o cualquier file-like con .name) o un path.
+    workspace: staging del dataset (default: input/ y data/ del repo).
+    """
+    rec = recorder if recorder is not None else StageRecorder()
+    if workspace is not None:
+        input_dir, raw_csv, raw_parquet = workspace.input_dir, workspace.raw_csv, workspace.raw_parquet
+        workspace.ensure_dirs()
+    else:
+        input_dir, raw_csv, raw_parquet = INPUT_DIR, RAW_DUMMY, RAW_PARQUET
+        INPUT_DIR.mkdir(exist_ok=True)
+        DATA_DIR.mkdir(exist_ok=True)
+
+    if isinstance(uploaded_file, (str, Path)):
+        path, spooled = Path(uploaded_file), False
+        name = path.name.lower()
+    else:
+        name = (getattr(uploaded_file, "name", "") or "").lower()
+        rec.start("ingest.spool_to_disk")
+        path, spooled = spool_upload(uploaded_file, suffix=Path(name).suffix, input_dir=input_dir), True
+        rec.note(input_mb=round(path.stat().st_size / (1024 * 1024), 2))
+
+    try:
+        if name.endswith(ARROW_SUFFIXES):
+            rows, cols = stage_arrow(path, rec, raw_parquet, raw_csv)
+            rec.stop()
+            return rows, cols
+
+        if name.endswith(".xlsx"):
+            rec.start("ingest.header_scan_excel")
+            header_row = find_header_row_excel(path, sheet_name="Base")
+            rec.start("ingest.stream_excel_chunks", chunk_rows=INGEST_CHUNK_ROWS)
+            rows, cols = write_chunks(iter_excel_chunks(path, "Base", header_row), raw_csv, rec)
+        else:
+            rec.start("ingest.header_scan_csv")
+            header_line = find_header_row_csv(read_head_text(path))
+            rec.start("ingest.stream_csv_chunks", chunk_rows=INGEST_CHUNK_ROWS)
+            rows, cols = write_chunks(iter_csv_chunks(path, header_line), raw_csv, rec)
+        rec.stop()
+        raw_parquet.unlink(missing_ok=True)  # build.py vuelve a leer el CSV
+    finally:
+        if spooled:
+            path.unlink(missing_ok=True)
+
+    return rows, cols
+
+
+# ---------- varios archivos (una base por CEDIS) ----------
+MULTI_UPLOAD_TYPES = ["csv", "xlsx"]
+
+
+def parse_part(path: str, name: str, out_path: str) -> dict:
+    """
+    Worker del process pool: detecta el header de un archivo (xlsx / csv), lo limpia por
+    chunks y lo deja como CSV parcial. Regresa columnas, filas y tiempos del archivo.
+    """
+    t0 = time.perf_counter()
+    path, out_path = Path(path), Path(out_path)
+    rec = StageRecorder(sample_interval=None)
+    try:
+        if name.lower().endswith(".xlsx"):
+            header_row = find_header_row_excel(path, sheet_name="Base")
+            rec.start("parse")
+            rows, cols = write_chunks(iter_excel_chunks(path, "Base", header_row), out_path, rec)
+        else:
+            header_row = find_header_row_csv(read_head_text(path))
+            rec.start("parse")
+            rows, cols = write_chunks(iter_csv_chunks(path, header_row), out_path, rec)
+    except ValueError as e:
+        raise ValueError(f"{name}: {e}") from e
+    rec.stop()
+    with open(out_path, "r", encoding="utf-8", newline="") as f:
+        columns = next(csv.reader(f))
+    return {
+        "archivo": name,
+        "header_row": header_row,
+        "rows": rows,
+        "cols": cols,
+        "columns": columns,
+        "parse_s": round(time.perf_counter() - t0, 3),
+        **{k: rec.stages[0][k] for k in ("read_s", "clean_s", "write_s")},
+    }
+
+
+def unify_columns(parts: list[dict]) -> list[str]:
+    """Unión de columnas por nombre (orden del primer archivo, luego las nuevas) validada contra el template."""
+    names = list(dict.fromkeys(c for p in parts for c in p["columns"]))
+    return arrow_layout(names)
+
+
+def merge_parts(parts: list[dict], columns: list[str], out_path: Path) -> int:
+    """
+    Junta los CSV parciales en el CSV canónico. Si un parcial ya tiene exactamente las
+    columnas unificadas se copia tal cual (sin parsear); si no, se reindexa por nombre
+    (columnas faltantes quedan vacías) leyendo todo como texto para no alterar valores.
+    """
+    tmp_out = out_path.with_suffix(".csv.tmp")
+    rows = 0
+    try:
+        with open(tmp_out, "w", encoding="utf-8", newline="") as out:
+            pd.DataFrame(columns=columns).to_csv(out, index=False)  # mismo formato que write_chunks
+            for part in parts:
+                if part["columns"] == columns:
+                    with open(part["part_path"], "r", encoding="utf-8", newline="") as f:
+                        f.readline()  # header
+                        shutil.copyfileobj(f, out, SPOOL_CHUNK_BYTES)
+                else:
+                    for df in pd.read_csv(part["part_path"], dtype=str, keep_default_na=False, chunksize=INGEST_CHUNK_ROWS):
+                        df.reindex(columns=columns, fill_value="").to_csv(out, index=False, header=False)
+                rows += part["rows"]
+    except BaseException:
+        tmp_out.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_out, out_path)
+    return rows
+
+
+def normalize_many_to_raw_dummy(
+    uploaded_files, recorder: StageRecorder | None = None, workspace: Workspace | None = None,
+    max_workers: int | None = None,
+) -> tuple[int, int, list[dict]]:
+    """
+    Varias bases (xlsx / csv, una por CEDIS) -> un solo input/raw_dummy.csv. Cada archivo se
+    parsea en un proceso del pool (detección de header + limpieza), las columnas se unifican
+    por nombre y los parciales se concatenan. Regresa (rows, cols, reporte por archivo).
+    """
+    rec = recorder if recorder is not None else StageRecorder()
+    if workspace is not None:
+        input_dir, raw_csv, raw_parquet = workspace.input_dir, workspace.raw_csv, workspace.raw_parquet
+        workspace.ensure_dirs()
+    else:
+        input_dir, raw_csv, raw_parquet = INPUT_DIR, RAW_DUMMY, RAW_PARQUET
+        INPUT_DIR.mkdir(exist_ok=True)
+        DATA_DIR.mkdir(exist_ok=True)
+
+    files = []
+    for f in uploaded_files:
+        name = Path(f).name if isinstance(f, (str, Path)) else (getattr(f, "name", "") or "")
+        if Path(name).suffix.lower().lstrip(".") not in MULTI_UPLOAD_TYPES:
+            raise ValueError(f"{name}: con varios archivos solo se aceptan {', '.join(MULTI_UPLOAD_TYPES)}")
+        files.append((f, name))
+
+    spooled, parts = [], []
+    try:
+        rec.start("ingest.spool_to_disk", files=len(files))
+        sources = []
+        for f, name in files:
+            if isinstance(f, (str, Path)):
+                sources.append(Path(f))
+            else:
+                sources.append(spool_upload(f, suffix=Path(name).suffix, input_dir=input_dir))
+                spooled.append(sources[-1])
+
+        workers = max(1, min(len(files), max_workers or os.cpu_count() or 1))
+        # sin hilo de muestreo mientras vive el pool (el RSS de los workers no es el nuestro)
+        rec.start("ingest.parse_files", sample=False, files=len(files), workers=workers)
+        mp_context = multiprocessing.get_context(POOL_START_METHOD)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            futures = {
+                pool.submit(parse_part, str(src), name, str(input_dir / f"part_{i:03d}.csv")): i
+                for i, (src, (_, name)) in enumerate(zip(sources, files))
+            }
+            results = {}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                results[i] = {**fut.result(), "part_path": input_dir / f"part_{i:03d}.csv"}
+        parts = [results[i] for i in range(len(files))]
+
+        rec.start("ingest.unify_schema")
+        columns = unify_columns(parts)
+        rec.note(columns=len(columns), reindexed=sum(p["columns"] != columns for p in parts))
+
+        rec.start("ingest.merge_parts")
+        rows = merge_parts(parts, columns, raw_csv)
+        rec.stop(rows=rows)
+        raw_parquet.unlink(missing_ok=True)  # build.py lee el CSV
+    finally:
+        for p in spooled:
+            p.unlink(missing_ok=True)
+        for i in range(len(files)):
+            (input_dir / f"part_{i:03d}.csv").unlink(missing_ok=True)
+
+    report = [
+        {
+            **{k: v for k, v in p.items() if k not in ("columns", "part_path")},
+            "faltantes": len(set(columns) - set(p["columns"])),
+        }
+        for p in parts
+    ]
+    return rows, len(columns), report
@@ -0,0 +1,215 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource  # no existe en Windows
+except ImportError:
+    resource = None
+
+# Instrumentación por etapa (tiempo + memoria pico) para normalize_to_raw_dummy y build.py.
+# La memoria se mide muestreando el RSS del proceso en un hilo (incluye lo que usa DuckDB);
+# tracemalloc multiplica x5 el tiempo de read_excel, por eso no se usa.
+# RENDER_STATS junta los tiempos de render de las páginas (todas las sesiones del proceso).
+
+RUN_HISTORY = Path("data/run_history.jsonl")
+RUN_HISTORY_MAX = 50
+SAMPLE_INTERVAL_S = 0.02
+
+
+def current_rss_bytes() -> int | None:
+    """RSS actual del proceso (Linux); en otros SO cae al pico reportado por getrusage."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+    return None
+
+
+def _mb(n: int | None) -> float | None:
+    return round(n / (1024 * 1024), 1) if n is not None else None
+
+
+class _PeakSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss_bytes()
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        while not self._stop_evt.wait(self.interval):
+            rss = current_rss_bytes()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def finish(self) -> int | None:
+        self._stop_evt.set()
+        self.join()
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return self.peak
+
+
+class StageRecorder:
+    """
+    Registra etapas secuenciales:
+
+        rec.start("build.sql")          # cierra la etapa anterior si la hay
+        ...
+        rec.start("build.execute")
+        ...
+        rec.stop(rows=len(df))          # extras quedan en el registro de la etapa
+
+    o con `with rec.stage("ingest.read") as s: ...; s["rows"] = n`.
+
+    sample_interval=None mide solo tiempo (sin hilo de memoria); enabled=False
+    hace todo no-op, para dejar las llamadas en el código de las páginas.
+    """
+
+    def __init__(self, sample_interval: float | None = SAMPLE_INTERVAL_S, enabled: bool = True):
+        self.sample_interval = sample_interval
+        self.enabled = enabled
+        self.stages: list[dict] = []
+        self._current = None
+
+    def start(self, name: str, sample: bool = True, **extra) -> dict:
+        """sample=False: etapa sin hilo de memoria (ej. mientras se arranca un pool de procesos)."""
+        self.stop()
+        rec = {"stage": name, **extra}
+        if not self.enabled:
+            return rec
+        sampler = None
+        if sample and self.sample_interval is not None:
+            sampler = _PeakSampler(self.sample_interval)
+            sampler.start()
+        self._current = (rec, sampler, time.perf_counter())
+        return rec
+
+    def note(self, **extra) -> None:
+        """Agrega datos (ej. rows) a la etapa en curso."""
+        if self._current is not None:
+            self._current[0].update(extra)
+
+    def stop(self, **extra) -> None:
+        if self._current is None:
+            return
+        rec, sampler, t0 = self._current
+        self._current = None
+        rec["seconds"] = round(time.perf_counter() - t0, 4)
+        if sampler is not None:
+            rec["peak_rss_mb"] = _mb(sampler.finish())
+        rec.update(extra)
+        self.stages.append(rec)
+
+    @contextmanager
+    def stage(self, name: str, **extra):
+        rec = self.start(name, **extra)
+        try:
+            yield rec
+        finally:
+            self.stop()
+
+    @property
+    def total_seconds(self) -> float:
+        return round(sum(s["seconds"] for s in self.stages), 4)
+
+    @property
+    def peak_rss_mb(self) -> float | None:
+        peaks = [s["peak_rss_mb"] for s in self.stages if s.get("peak_rss_mb") is not None]
+        return max(peaks) if peaks else None
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": self.total_seconds,
+            "peak_rss_mb": self.peak_rss_mb,
+            "stages": self.stages,
+        }
+
+    def print_table(self) -> None:
+        for s in self.stages:
+            extra = f"  rows={s['rows']:,}" if "rows" in s else ""
+            print(f"   {s['stage']:<28} {s['seconds']:>9.3f}s  peak={s.get('peak_rss_mb')} MB{extra}")
+        print(f"   {'TOTAL':<28} {self.total_seconds:>9.3f}s")
+
+
+def append_run_history(meta: dict, path: Path = RUN_HISTORY, max_runs: int = RUN_HISTORY_MAX) -> None:
+    """Agrega la corrida al historial (jsonl) y conserva solo las últimas max_runs."""
+    path.parent.mkdir(exist_ok=True)
+    lines = path.read_text(encoding="utf-8").splitlines() if path.exists() else []
+    lines.append(json.dumps(meta, ensure_ascii=False))
+    path.write_text("\n".join(lines[-max_runs:]) + "\n", encoding="utf-8")
+
+
+def read_run_history(path: Path = RUN_HISTORY) -> list[dict]:
+    if not path.exists():
+        return []
+    runs = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return runs
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Percentil con interpolación lineal (q en 0..100)."""
+    xs = sorted(values)
+    if not xs:
+        return float("nan")
+    k = (len(xs) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+class RenderStats:
+    """
+    Ventana de las últimas `window` muestras por (página, etapa), compartida por
+    todas las sesiones del proceso. Thread-safe (cada sesión corre en su hilo).
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: dict[tuple[str, str], deque] = {}
+
+    def add(self, page: str, recorder: StageRecorder) -> None:
+        if not recorder.stages:
+            return
+        with self._lock:
+            for s in recorder.stages + [{"stage": "total", "seconds": recorder.total_seconds}]:
+                key = (page, s["stage"])
+                if key not in self._samples:
+                    self._samples[key] = deque(maxlen=self.window)
+                self._samples[key].append(s["seconds"])
+
+    def summary(self, page: str) -> list[dict]:
+        """[{stage, n, p50_ms, p95_ms, max_ms}] para una página."""
+        with self._lock:
+            items = [(stage, list(v)) for (p, stage), v in self._samples.items() if p == page]
+        return [
+            {
+                "stage": stage,
+                "n": len(v),
+                "p50_ms": round(percentile(v, 50) * 1000, 1),
+                "p95_ms": round(percentile(v, 95) * 1000, 1),
+                "max_ms": round(max(v) * 1000, 1),
+            }
+            for stage, v in items
+        ]
+
+
+RENDER_STATS = RenderStats()
@@ -1,106 +1,210 @@
-from io import BytesIO
 from pathlib import Path
 import runpy
+import shutil
+import uuid
 import pandas as pd
 import streamlit as st
 
-# Paths esperados por tu pipeline
-INPUT_DIR = Path("input")
-DATA_DIR = Path("data")
-RAW_DUMMY = INPUT_DIR / "raw_dummy.csv"          # <- para no tocar build.py
-PARQUET_OUT = DATA_DIR / "summary_allperiods.parquet"
-
-REQUIRED_HINTS = ["Tipo de reporte", "Tipo folio", "Mes", "Periodo"]
-
-def find_header_row_excel(file_bytes: bytes, sheet_name: str = "Base", scan_rows: int = 40) -> int:
-    """Encuentra la fila donde están los headers (busca 'Tipo de reporte')."""
-    import openpyxl
-    wb = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
-    ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.active
-
-    for r in range(1, scan_rows + 1):
-        row_vals = []
-        for c in range(1, 80):
-            v = ws.cell(r, c).value
-            if v is not None:
-                row_vals.append(str(v).strip())
-        if any(v.lower() == "tipo de reporte" for v in row_vals):
-            return r - 1  # pandas usa header 0-based
-    return 0
-
-def find_header_row_csv(text: str, scan_lines: int = 60) -> int:
-    lines = text.splitlines()
-    for i, line in enumerate(lines[:scan_lines]):
-        low = line.lower()
-        if ("tipo de reporte" in low) and ("tipo folio" in low) and ("mes" in low) and ("periodo" in low):
-            return i
-    return 0
-
-def normalize_to_raw_dummy(uploaded_file) -> tuple[int, int]:
-    """Convierte CSV/XLSX al CSV canónico input/raw_dummy.csv."""
-    INPUT_DIR.mkdir(exist_ok=True)
-    DATA_DIR.mkdir(exist_ok=True)
-
-    name = (uploaded_file.name or "").lower()
-    file_bytes = uploaded_file.getvalue()
-
-    if name.endswith(".xlsx"):
-        header_row = find_header_row_excel(file_bytes, sheet_name="Base")
-        df = pd.read_excel(BytesIO(file_bytes), sheet_name="Base", header=header_row)
+from core import MONTHS
+from ingest import UPLOAD_TYPES, normalize_many_to_raw_dummy, normalize_to_raw_dummy
+from instrumentation import StageRecorder, append_run_history, read_run_history
+from workspace import (
+    ARTIFACTS,
+    DEFAULT_WORKSPACE,
+    create_workspace,
+    get_workspace,
+    list_workspaces,
+    promote_staging,
+    publish,
+    session_staging,
+    workspace_lock,
+)
+
+
+def show_run_stages(meta: dict) -> None:
+    """Tabla de etapas (tiempo / memoria pico) de una corrida."""
+    stages = meta.get("stages") or []
+    if not stages:
+        return
+    st.write(f"⏱️ Total: {meta.get('total_seconds', 0):,.2f}s · pico RSS: {meta.get('peak_rss_mb')} MB")
+    st.dataframe(
+        pd.DataFrame(stages).set_index("stage"),
+        use_container_width=True,
+    )
+    if meta.get("files"):
+        st.write(f"📂 {len(meta['files'])} archivos (parseados en paralelo, tiempo por archivo):")
+        st.dataframe(pd.DataFrame(meta["files"]).set_index("archivo"), use_container_width=True)
+
+def show_fcst_version(meta: dict) -> None:
+    """Qué versión de Forecast quedó registrada (y si el nombre pedido no se guardó)."""
+    version = meta.get("fcst_version")
+    if not version:
+        return
+    if not version.get("unchanged"):
+        st.write(f"📚 Versión de Forecast guardada: **{version['name']}** ({version['kind']}, {version['changed_cells']:,} celdas)")
+    elif version.get("alias"):
+        st.info(f"📚 El Forecast no cambió vs **{version['name']}**: **{version['alias']}** quedó como alias de esa versión.")
+    elif version.get("requested_name"):
+        st.warning(
+            f"📚 El Forecast no cambió vs **{version['name']}** y el nombre **{version['requested_name']}** "
+            "ya existe: no se guardó ninguna versión nueva."
+        )
     else:
-        text = file_bytes.decode("utf-8-sig", errors="replace")
-        header_line = find_header_row_csv(text)
-        df = pd.read_csv(BytesIO(file_bytes), encoding="utf-8-sig", skiprows=header_line)
-
-    # Limpieza mínima para evitar mismatches típicos
-    if "Tipo folio" in df.columns:
-        df["Tipo folio"] = df["Tipo folio"].astype(str).str.strip()
-    if "Mes" in df.columns:
-        df["Mes"] = df["Mes"].astype(str).str.strip()
-
-    df.to_csv(RAW_DUMMY, index=False)
-    return df.shape[0], df.shape[1]
+        st.write(f"📚 Forecast sin cambios vs **{version['name']}** (no se guardó versión nueva).")
+
+def show_quality(meta: dict) -> None:
+    """Resumen del perfil de calidad que build.py calcula sobre la tabla staged."""
+    quality = meta.get("quality")
+    if not quality:
+        return
+    unmapped = quality.get("unmapped", {})
+    cols = quality.get("columns", {})
+    issues = sum(unmapped.values()) + sum(c["cast_failures"] for c in cols.values())
+    label = "🧪 Calidad de datos" + (f" — ⚠️ {issues:,} celdas/filas con problemas" if issues else " — ✅ sin problemas")
+    with st.expander(label):
+        st.write({
+            "Filas leídas": quality.get("rows_total"),
+            "Filas sin 'Tipo folio' (se ignoran)": quality.get("rows_folio_null"),
+            "Folio no reconocido (→ OTRO)": unmapped.get("folio"),
+            "Mes no reconocido (→ NULL, se ignora)": unmapped.get("month"),
+            "Periodo no numérico (se ignora)": unmapped.get("year"),
+            "Región vacía (→ CEDIS / Sin región)": unmapped.get("region_blank"),
+            "Región no reconocida (queda tal cual)": unmapped.get("region"),
+            "Filas 'Total logística' en la base (se excluyen, el total se calcula)": unmapped.get("region_total"),
+        })
+        for kind, values in (quality.get("unmapped_values") or {}).items():
+            if values:
+                st.write(f"Valores de {kind} no reconocidos:", values)
+        if cols:
+            st.dataframe(pd.DataFrame(cols).T, use_container_width=True)
 
 
 st.title("📤 Cargar base (MVP)")
-st.caption("Sube CSV o Excel con el layout del template. Internamente lo convertimos a input/raw_dummy.csv y corremos el pipeline.")
+st.caption("Sube CSV, Excel, Parquet o Arrow (IPC/Feather) con el layout del template. CSV/Excel se convierten a input/raw_dummy.csv; Parquet/Arrow pasan directo (sin parsing de texto) y corremos el pipeline.")
 
 import json
 from datetime import datetime
 from pathlib import Path
 
-LAST_RUN = Path("data/last_run.json")
-PARQUET_OUT = Path("data/summary_allperiods.parquet")  # por si no estaba definido arriba
+# Dataset (workspace): cada uno con su staging y artefactos; la selección vive en la sesión
+datasets = list_workspaces()
+current = st.session_state.get("dataset", DEFAULT_WORKSPACE)
+dataset = st.sidebar.selectbox("🗂️ Dataset", options=datasets, index=datasets.index(current) if current in datasets else 0)
+with st.sidebar.expander("➕ Nuevo dataset"):
+    new_name = st.text_input("Nombre", key="new_dataset")
+    if st.button("Crear", disabled=not new_name.strip()):
+        try:
+            dataset = create_workspace(new_name).name
+        except ValueError as e:
+            st.error(str(e))
+    cache_stats = ARTIFACTS.stats()
+    st.caption(
+        f"Cache de artefactos: {cache_stats['entries']} entradas · {cache_stats['mb']:,.1f} / "
+        f"{cache_stats['max_mb']:,.0f} MB · {cache_stats['hits']} reusos"
+    )
+st.session_state["dataset"] = dataset
+ws = get_workspace(dataset)
+LAST_RUN = ws.last_run
+PARQUET_OUT = ws.summary
+st.caption(f"🗂️ Dataset **{ws.name}** → `{ws.root.as_posix()}/`")
 
 if LAST_RUN.exists():
     st.info("📌 Última corrida detectada:")
-    st.json(json.loads(LAST_RUN.read_text(encoding="utf-8")))
-
-uploaded = st.file_uploader("Sube tu base", type=["csv", "xlsx"])
-process = st.button("Procesar base", type="primary", disabled=(uploaded is None))
-if process and uploaded is not None:
+    last_meta = json.loads(LAST_RUN.read_text(encoding="utf-8"))
+    show_run_stages(last_meta)
+    show_fcst_version(last_meta)
+    show_quality(last_meta)
+    with st.expander("Detalle (last_run.json)"):
+        st.json(last_meta)
+
+history = read_run_history(ws.run_history)
+if len(history) > 1:
+    with st.expander(f"Historial de corridas ({len(history)})"):
+        hist_df = pd.DataFrame([
+            {
+                "timestamp": h.get("timestamp"),
+                "archivo": h.get("uploaded_name"),
+                "rows": h.get("rows"),
+                "total_s": h.get("total_seconds"),
+                "peak_rss_mb": h.get("peak_rss_mb"),
+                **{s["stage"]: s["seconds"] for s in h.get("stages", [])},
+            }
+            for h in history
+        ]).set_index("timestamp")
+        if st.checkbox("📈 Ver gráfica de tiempos", key="history_chart"):  # altair solo si se pide
+            st.line_chart(hist_df[["total_s"]])
+        st.dataframe(hist_df, use_container_width=True)
+
+uploads = st.file_uploader(
+    "Sube tu base (o varias: una por CEDIS, xlsx/csv)", type=UPLOAD_TYPES, accept_multiple_files=True,
+    help="Con varios archivos cada uno se lee en paralelo, las columnas se juntan por nombre y se procesa una sola base.",
+)
+_now = datetime.now()
+fcst_version = st.text_input(
+    "Nombre de la versión de Forecast",
+    value=f"Forecast {MONTHS[_now.month - 1]} {_now.year}",
+    help="Cada corrida guarda el Forecast como versión (solo los cambios vs la anterior) para compararlas en Summary y Bridge.",
+)
+process = st.button("Procesar base", type="primary", disabled=not uploads)
+if process and uploads:
     # status da feedback claro por etapas
     with st.status("Procesando base…", expanded=True) as status:
         try:
-            st.write("1) Normalizando archivo (layout → raw_dummy.csv)…")
-            rows, cols = normalize_to_raw_dummy(uploaded)
-
-            st.write("2) Corriendo pipeline (build.py)…")
-            runpy.run_path("build.py", run_name="__main__")
+            recorder = StageRecorder()
+            files_report = None
+            # ingest + publish bajo el mismo lock: otra sesión no puede cambiar input/raw_dummy.*
+            # entre que lo escribimos y build.py lo lee. El ingest escribe a un staging propio
+            # de la sesión y se renombra a su lugar solo si terminó bien.
+            lock = workspace_lock(ws)
+            if not lock.acquire(blocking=False):
+                st.write("⏳ Otra sesión está procesando este dataset, esperando…")
+                lock.acquire()
+            try:
+                staging = session_staging(ws, st.session_state.setdefault("session_id", uuid.uuid4().hex))
+                try:
+                    st.write("1) Normalizando archivo (layout → staging)…")
+                    if len(uploads) == 1:
+                        rows, cols = normalize_to_raw_dummy(uploads[0], recorder, workspace=staging)
+                    else:
+                        rows, cols, files_report = normalize_many_to_raw_dummy(uploads, recorder, workspace=staging)
+                        st.write(f"   {len(uploads)} archivos unificados:")
+                        st.dataframe(pd.DataFrame(files_report).set_index("archivo"), use_container_width=True)
+                    promote_staging(ws, staging)
+                finally:
+                    shutil.rmtree(staging.root, ignore_errors=True)
+
+                st.write("2) Corriendo pipeline (build.py, o artefactos del cache si la base ya se procesó)…")
+                # run_path sin __main__ para recargar build.py y obtener el resultado de main()
+                build_info = publish(
+                    ws, recorder, fcst_version=fcst_version.strip() or None,
+                    build_main=runpy.run_path("build.py")["main"],
+                )
+            finally:
+                lock.release()
 
             # meta de corrida
             stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             meta = {
                 "timestamp": stamp,
-                "uploaded_name": getattr(uploaded, "name", None),
+                "uploaded_name": ", ".join(getattr(u, "name", "") for u in uploads),
+                "files": files_report,
                 "rows": int(rows),
                 "cols": int(cols),
                 "parquet_exists": PARQUET_OUT.exists(),
                 "parquet_size_mb": round(PARQUET_OUT.stat().st_size / (1024 * 1024), 2) if PARQUET_OUT.exists() else None,
+                "parquet_rows": build_info["rows"],
+                "view_rows": build_info["view_rows"],
+                "quality": build_info["quality"],
+                "fcst_version": build_info["fcst_version"],
+                "dataset": ws.name,
+                "artifact_cache": build_info["artifact_cache"],
+                **recorder.as_dict(),
             }
 
-            Path("data").mkdir(exist_ok=True)
-            Path("data/last_run.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+            ws.data_dir.mkdir(parents=True, exist_ok=True)
+            LAST_RUN.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+            append_run_history(meta, ws.run_history)
+            show_fcst_version(meta)
 
             status.update(label="✅ Pipeline terminado", state="complete", expanded=False)
 
@@ -115,10 +219,10 @@ if process and uploaded is not None:
 
 
     if PARQUET_OUT.exists():
-        st.info("Se generó data/summary_allperiods.parquet.")
+        st.info(f"Se generó {PARQUET_OUT.as_posix()}.")
         # Opción 1: link
         st.page_link("app.py", label="➡️ Ir al Summary", icon="📊")
         # Si tu summary vive en pages/2_Summary.py, usa esta en vez de app.py:
         # st.page_link("pages/2_Summary.py", label="➡️ Ir al Summary", icon="📊")
     else:
-        st.error("No se encontró data/summary_allperiods.parquet. Revisa qué está escribiendo tu build.py.")
+        st.error(f"No se encontró {PARQUET_OUT.as_posix()}. Revisa qué está escribiendo tu build.py.")
@@ -1,109 +1,103 @@
+import time
 from pathlib import Path
+
 import pandas as pd
 import streamlit as st
-import altair as alt
 
-st.set_page_config(page_title="Transportes TLOG - Bridge (MVP)", layout="wide")
+from core import (
+    BRIDGE_DRIVERS,
+    MONTHS,
+    PERIOD_TYPES,
+    PERIOD_TYPE_LABEL,
+    RANGE_PERIOD_TYPES,
+    ROLLING_WINDOWS,
+    bridge_chart,
+    bridge_waterfall,
+    build_period_label,
+    drilldown_delta,
+    drilldown_rows,
+    load_dataset,
+    load_prefix_index,
+    load_raw_layout,
+    period_month_range,
+    range_bridge_slices,
+    rate_volume_effects,
+    rate_volume_waterfall,
+    real_period_label,
+    region_options as get_region_options,
+    replace_scenario,
+)
+from cube import Cube
+from datacache import DATA_CACHE, load_fcst_version
+from fcst_versions import MANIFEST, version_names, version_slice
+from instrumentation import RENDER_STATS, StageRecorder
+from whatif import LEVER_RANGE, WHATIF_LEVERS, WhatIf
+from workspace import DEFAULT_WORKSPACE, get_workspace, list_workspaces
 
-DATA_PATH = Path("data/summary_allperiods.parquet")
+st.set_page_config(page_title="Transportes TLOG - Bridge (MVP)", layout="wide")
 
-MONTHS = [
-    "Enero","Febrero","Marzo","Abril","Mayo","Junio",
-    "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"
-]
-MONTH_TO_NUM = {m: i+1 for i, m in enumerate(MONTHS)}
+PAGE_KEY = "bridge"
 
-PERIOD_TYPE_LABEL = {
-    "M": "Mensual",
-    "YTD": "YTD",
-    "Q": "Quarter",
-    "H": "Half-year",
-    "FY": "Full year",
-}
 
-ALLOWED_YEARS = [2025, 2026]
-REAL_BASE_YEAR = 2025
+# Cache acotado por bytes (datacache.DATA_CACHE); ("summary",) / ("prefix",) son las
+# mismas llaves que usa Summary, así las dos páginas comparten la misma copia.
+def load_df(path: str, arrow_path: str, mtime: tuple):
+    if not Path(path).exists():
+        st.error(f"No encuentro {path}. Corre el pipeline (Cargar base o py build.py).")
+        st.stop()
 
-# ====== Métricas del summary (según tus definiciones) ======
-TOTAL_METRIC = "Gasto total + BKHL + FP + PA"
+    def read():
+        st.session_state["_bridge_cache_miss"] = True  # solo corre si no hubo cache hit
+        return load_dataset(Path(path), Path(arrow_path))
 
-MET_TRACTORES = "Tractores (fijos)"
-MET_VAR_DED = "Variable dedicado"
-MET_DIESEL_DED = "Diesel dedicado"
-MET_CASETAS = "Casetas"
-MET_REM_QUINT = "Remolques y quintas"
-MET_PXV = "Gasto tercero"
-MET_OTROS = "Otros variables"
-MET_NETO_BKHL = "Neto BKHL"
-MET_FP_PA = "Freight program & PA"
+    return DATA_CACHE.get_or_load(path, mtime, ("summary",), read)
 
 
-def build_period_label(period_type: str, year: int, extra_value) -> tuple[str, int | None]:
-    """Regresa (period_label, month_num). month_num solo aplica para M/YTD."""
-    if period_type in ["M", "YTD"]:
-        month_num = MONTH_TO_NUM[extra_value]
-        return f"{year:04d}-{month_num:02d}", month_num
-    if period_type == "Q":
-        return f"{year:04d}-Q{int(extra_value)}", None
-    if period_type == "H":
-        return f"{year:04d}-H{int(extra_value)}", None
-    return f"{year:04d}", None  # FY
-
-
-@st.cache_data
-def load_df(_mtime: float) -> pd.DataFrame:
-    if not DATA_PATH.exists():
-        st.error(f"No encuentro {DATA_PATH}. Corre el pipeline (Cargar base o py build.py).")
+def load_prefix(path: str, mtime: float):
+    if not Path(path).exists():
+        st.error(f"No encuentro {path} (rangos de meses). Corre el pipeline (Cargar base o py build.py).")
         st.stop()
+    return DATA_CACHE.get_or_load(path, mtime, ("prefix",), lambda: load_prefix_index(Path(path)))
 
-    df = pd.read_parquet(DATA_PATH)
-
-    # solo 2025/2026
-    if "year" in df.columns:
-        df = df[df["year"].isin(ALLOWED_YEARS)].copy()
-
-    # normaliza region si viene en otra col
-    if "region" not in df.columns and "Region" in df.columns:
-        df = df.rename(columns={"Region": "region"})
-
-    if "region" not in df.columns:
-        df["region"] = "Total logística"
-
-    # normaliza valores
-    df["region"] = (
-        df["region"]
-        .astype(str)
-        .str.strip()
-        .replace({
-            "Zona Norte": "Norte",
-            "Zona Sur": "Sur",
-            "Zona Centro": "Centro",
-            "Total logistica": "Total logística",
-        })
-    )
 
-    return df
+def load_cube(path: str, mtime: tuple, dataset) -> Cube:
+    # se arma una vez por artefacto (misma llave que Summary)
+    return DATA_CACHE.get_or_load(path, mtime, ("cube",), lambda: Cube.load(dataset))
 
 
-def metric_sum(df_slice: pd.DataFrame, scenario: str, metric: str) -> float:
-    s = df_slice[(df_slice["scenario"] == scenario) & (df_slice["metric"] == metric)]["value"]
-    return float(s.sum()) if not s.empty else 0.0
+@DATA_CACHE.memoize
+def load_effects(path: str, mtime: tuple, _cube: Cube) -> pd.DataFrame:
+    # una pasada sobre el cubo (BP / FCST) por versión del artefacto; el toggle solo filtra
+    return rate_volume_effects(_cube.frame(scenarios=["BP", "FCST"]))
 
 
-def metric_delta(df_slice: pd.DataFrame, metric: str) -> float:
-    """Delta FCST - BP para una métrica."""
-    return metric_sum(df_slice, "FCST", metric) - metric_sum(df_slice, "BP", metric)
+@DATA_CACHE.memoize
+def load_layout(path: str, mtime: float) -> dict:
+    return load_raw_layout(Path(path))
 
 
 st.title("Transportes TLOG — Bridge / Cascada (MVP)")
-mtime = DATA_PATH.stat().st_mtime if DATA_PATH.exists() else 0.0
-df = load_df(mtime)
+
+# Profiling opt-in del rerun (tiempos por etapa + p50/p95 de todas las sesiones)
+profile_on = st.sidebar.toggle("⏱️ Perfilar render", key="profile_render")
+prof = StageRecorder(sample_interval=None, enabled=profile_on)
+
+# Dataset (workspace) de la sesión: se comparte entre páginas vía session_state
+datasets = list_workspaces()
+current = st.session_state.get("dataset", DEFAULT_WORKSPACE)
+dataset = st.sidebar.selectbox("🗂️ Dataset", options=datasets, index=datasets.index(current) if current in datasets else 0)
+st.session_state["dataset"] = dataset
+ws = get_workspace(dataset)
+
+prof.start("load")
+st.session_state["_bridge_cache_miss"] = False
+mtime = tuple(p.stat().st_mtime if p.exists() else 0.0 for p in (ws.summary, ws.arrow))
+df = load_df(ws.summary.as_posix(), ws.arrow.as_posix(), mtime)
+cube = load_cube(ws.summary.as_posix(), mtime, df)
+prof.note(stage="load (miss)" if st.session_state["_bridge_cache_miss"] else "load (cache hit)")
 
 # --- Región options ---
-preferred_order = ["Total logística", "Norte", "Centro", "Sur"]
-regions_found = sorted(df["region"].dropna().astype(str).unique().tolist())
-region_options = [r for r in preferred_order if r in regions_found] + [r for r in regions_found if r not in preferred_order]
-default_region_index = region_options.index("Total logística") if "Total logística" in region_options else 0
+region_options, default_region_index = get_region_options(df)
 
 # --- UI ---
 c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
@@ -111,7 +105,7 @@ c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
 with c1:
     period_type = st.selectbox(
         "Tipo de periodo",
-        options=["M", "YTD", "Q", "H", "FY"],
+        options=PERIOD_TYPES + RANGE_PERIOD_TYPES,
         format_func=lambda x: PERIOD_TYPE_LABEL.get(x, x),
         index=0,
     )
@@ -130,126 +124,176 @@ with c4:
         extra_value = st.selectbox("Quarter", options=[1, 2, 3, 4], index=0)
     elif period_type == "H":
         extra_value = st.selectbox("Half-year", options=[1, 2], index=0)
+    elif period_type == "RANGO":
+        extra_value = st.select_slider("Meses", options=MONTHS, value=(MONTHS[0], MONTHS[2]))
+    elif period_type == "MOVIL":
+        m1, m2 = st.columns(2)
+        month_end = m1.selectbox("Mes de cierre", options=MONTHS, index=0)
+        window = m2.selectbox("Meses", options=ROLLING_WINDOWS, index=0)
+        extra_value = (month_end, window)
     else:
         st.write("")
 
-period_label_main, month_num = build_period_label(period_type, year, extra_value)
-
-# Real siempre amarrado a 2025 (mismo tipo de periodo)
-if period_type in ["M", "YTD"]:
-    period_label_real = f"{REAL_BASE_YEAR:04d}-{month_num:02d}"
-elif period_type == "Q":
-    period_label_real = f"{REAL_BASE_YEAR:04d}-Q{int(extra_value)}"
-elif period_type == "H":
-    period_label_real = f"{REAL_BASE_YEAR:04d}-H{int(extra_value)}"
+# --- slices ---
+if period_type in RANGE_PERIOD_TYPES:
+    # Rango arbitrario desde el prefix index (Real = mismo rango corrido a 2025)
+    prefix_mtime = ws.prefix.stat().st_mtime if ws.prefix.exists() else 0.0
+    prefix_index = load_prefix(ws.prefix.as_posix(), prefix_mtime)
+    prof.start("filter")
+    slice_main, slice_real, period_label_main, period_label_real = range_bridge_slices(
+        prefix_index, period_type, year, extra_value, region
+    )
 else:
-    period_label_real = f"{REAL_BASE_YEAR:04d}"
+    period_label_main, month_num = build_period_label(period_type, year, extra_value)
 
-# --- slices ---
-slice_main = df[
-    (df["period_type"] == period_type)
-    & (df["period_label"] == period_label_main)
-    & (df["region"] == region)
-].copy()
-
-slice_real = df[
-    (df["period_type"] == period_type)
-    & (df["period_label"] == period_label_real)
-    & (df["region"] == region)
-    & (df["scenario"] == "REAL2025")
-].copy()
+    # Real siempre amarrado a 2025 (mismo tipo de periodo)
+    period_label_real = real_period_label(period_label_main)
 
+    prof.start("filter")
+    slice_main = cube.period_slice(period_type, period_label_main, region)
+    slice_real = cube.period_slice(period_type, period_label_real, region, scenarios=["REAL2025"])
+
+slice_main_base = slice_main  # build tal cual (sin versiones ni what-if): lo que suman las filas fuente
 if slice_main.empty:
     st.warning(f"No hay datos para {PERIOD_TYPE_LABEL.get(period_type, period_type)} · {period_label_main} · {region}")
     st.stop()
 
-# --- Totales ---
-last_year = metric_sum(slice_real, "REAL2025", TOTAL_METRIC)
-bp_total = metric_sum(slice_main, "BP", TOTAL_METRIC)
-fc_total = metric_sum(slice_main, "FCST", TOTAL_METRIC)
-
-# --- Drivers (deltas FCST - BP) ---
-fijos = metric_delta(slice_main, MET_TRACTORES)
-
-variables = (
-    metric_delta(slice_main, MET_VAR_DED)
-    + metric_delta(slice_main, MET_DIESEL_DED)
-    + metric_delta(slice_main, MET_CASETAS)
-)
-
-rem_quintas = metric_delta(slice_main, MET_REM_QUINT)
-pxv = metric_delta(slice_main, MET_PXV)
-otros = metric_delta(slice_main, MET_OTROS)
-
-# iniciativas ahorro = delta( Neto BKHL + Freight program & PA )
-iniciativas_ahorro = (
-    metric_delta(slice_main, MET_NETO_BKHL)
-    + metric_delta(slice_main, MET_FP_PA)
-)
-
-# ====== CIERRE PERFECTO SIN "Residual" ======
-# Queremos que:
-#   bp_total + (sum_drivers) == fc_total
-delta_total = fc_total - bp_total
-sum_drivers = fijos + variables + rem_quintas + pxv + otros + iniciativas_ahorro
-eps = delta_total - sum_drivers
-
-# Absorbemos cualquier mini-diferencia en "Otros" (para que cierre exacto sin residual)
-otros += eps
-
-# Recalcula sum_drivers ya ajustado
-sum_drivers = fijos + variables + rem_quintas + pxv + otros + iniciativas_ahorro
-
-# --- arma waterfall dataset ---
-rows = []
-rows.append({"step": "Last year (Real 2025)", "start": 0.0, "end": last_year, "delta": 0.0, "kind": "total"})
-rows.append({"step": "Business plan (BP 2026)", "start": 0.0, "end": bp_total, "delta": 0.0, "kind": "total"})
-
-cum = bp_total
-for name, dv in [
-    ("Fijos", fijos),
-    ("Variables", variables),
-    ("Remolques y quintas", rem_quintas),
-    ("PxV", pxv),
-    ("Otros", otros),
-    ("Iniciativas ahorro", iniciativas_ahorro),
-]:
-    rows.append({"step": name, "start": cum, "end": cum + dv, "delta": dv, "kind": "delta"})
-    cum += dv
-
-# Sin residual: el cierre debe dar EXACTO al forecast
-rows.append({"step": "Gasto actual (Forecast)", "start": 0.0, "end": fc_total, "delta": 0.0, "kind": "total"})
-
-wdf = pd.DataFrame(rows)
+# --- versiones de Forecast: cascada de la versión base a la versión comparada ---
+ACTUAL_VERSION = "Actual (último build)"
+manifest = ws.versions_dir / MANIFEST.name
+versions = version_names(manifest)[::-1]
+with st.sidebar.expander("📚 Versiones de Forecast"):
+    if not versions:
+        st.caption("Aún no hay versiones guardadas (se crean al procesar una base).")
+        version_a, version_b = ACTUAL_VERSION, "—"
+    elif period_type in RANGE_PERIOD_TYPES:
+        st.caption("Las versiones se comparan con los periodos fijos (M / YTD / Q / H / FY).")
+        version_a, version_b = ACTUAL_VERSION, "—"
+    else:
+        version_a = st.selectbox("Forecast", options=[ACTUAL_VERSION] + versions, index=0)
+        version_b = st.selectbox("Base (en lugar de BP)", options=["—"] + versions, index=0)
+
+versions_active = version_a != ACTUAL_VERSION or version_b != "—"
+if versions_active:
+    manifest_mtime = manifest.stat().st_mtime
+    if version_a != ACTUAL_VERSION:
+        vdf = load_fcst_version(ws.versions_dir.as_posix(), manifest_mtime, version_a)
+        slice_main = replace_scenario(slice_main, "FCST", version_slice(vdf, period_type, period_label_main, region))
+    if version_b != "—":
+        vdf = load_fcst_version(ws.versions_dir.as_posix(), manifest_mtime, version_b)
+        slice_main = replace_scenario(slice_main, "BP", version_slice(vdf, period_type, period_label_main, region))
+waterfall_labels = {
+    "base_label": version_b if version_b != "—" else "Business plan (BP 2026)",
+    "final_label": f"Forecast ({version_a})" if version_a != ACTUAL_VERSION else "Gasto actual (Forecast)",
+}
 
+# --- what-if: palancas sobre el Forecast del slice (propaga solo los deltas, sin rebuild) ---
+with st.expander("🎛️ What-if (Forecast)"):
+    lever_cols = st.columns(len(WHATIF_LEVERS))
+    levers = {
+        key: col.slider(cfg["label"], *LEVER_RANGE, value=0, step=1, key=f"whatif_{key}")
+        for col, (key, cfg) in zip(lever_cols, WHATIF_LEVERS.items())
+    }
+
+whatif_key = (dataset, mtime, period_type, period_label_main, region, version_a, version_b)
+if any(levers.values()) or st.session_state.get("_whatif_key") == whatif_key:
+    prof.start("whatif")
+    t0 = time.perf_counter()
+    if st.session_state.get("_whatif_key") != whatif_key:
+        st.session_state["_whatif"] = WhatIf.from_slice(slice_main)
+        st.session_state["_whatif_key"] = whatif_key
+    sim = st.session_state["_whatif"]
+    for key, pct in levers.items():
+        sim.set(key, pct)
+    whatif_ms = (time.perf_counter() - t0) * 1000
+    whatif_active = any(levers.values())
+    if whatif_active:
+        slice_main = sim.apply_to_slice(slice_main)
+else:
+    whatif_active = False
+
+view = st.radio("Vista", options=["Buckets", "Tarifa / volumen"], horizontal=True)
+
+# --- waterfall (totales + drivers FCST - BP, cierre exacto en "Otros") ---
+prof.start("bridge")
+wdf, bridge_debug = bridge_waterfall(slice_main, slice_real, **waterfall_labels)
+chart_df = wdf
+if view == "Tarifa / volumen":
+    # efecto volumen = ΔVolumen x costo por caja BP; efecto tarifa = Δcosto por caja x Volumen FCST
+    if period_type in RANGE_PERIOD_TYPES or whatif_active or versions_active:
+        effects = rate_volume_effects(slice_main)
+    else:
+        effects = load_effects(ws.summary.as_posix(), mtime, cube)
+        effects = effects[
+            (effects["period_type"] == period_type)
+            & (effects["period_label"] == period_label_main)
+            & (effects["region"] == region)
+        ]
+    chart_df = rate_volume_waterfall(effects, wdf)
+
+prof.start("render")
 st.subheader(
     f"Bridge — {PERIOD_TYPE_LABEL.get(period_type, period_type)} · {period_label_main} "
     f"(Real: {period_label_real}) · {region}"
 )
 
-chart = (
-    alt.Chart(wdf)
-    .mark_bar()
-    .encode(
-        x=alt.X("step:N", sort=None, axis=alt.Axis(labelAngle=-90)),
-        y=alt.Y("start:Q", title=None),
-        y2=alt.Y2("end:Q"),
-        tooltip=[
-            alt.Tooltip("step:N"),
-            alt.Tooltip("delta:Q", format=",.2f"),
-            alt.Tooltip("end:Q", format=",.2f"),
-        ],
+st.altair_chart(bridge_chart(chart_df), use_container_width=True)
+if whatif_active:
+    st.caption(
+        "🎛️ Forecast simulado: "
+        + ", ".join(f"{WHATIF_LEVERS[k]['label']} {v:+d}" for k, v in levers.items() if v)
+        + f" · recalculado en {whatif_ms:,.2f} ms"
+    )
+    st.dataframe(sim.changed_metrics().style.format("{:,.2f}"), use_container_width=True)
+if view == "Tarifa / volumen":
+    st.dataframe(
+        effects.set_index("driver")[["bp", "fcst", "delta", "efecto_volumen", "efecto_tarifa"]].style.format("{:,.2f}"),
+        use_container_width=True,
     )
-)
 
-st.altair_chart(chart, use_container_width=True)
+# --- drill-down: filas fuente detrás de un driver (BP y FCST del mismo periodo) ---
+st.markdown("#### 🔎 Drill-down por driver")
+if not (ws.raw_rows.exists() and ws.raw_layout.exists()):
+    st.info("No hay filas fuente guardadas. Vuelve a correr el pipeline (Cargar base o py build.py).")
+else:
+    driver = st.selectbox("Driver", options=["—"] + [name for name, _ in BRIDGE_DRIVERS], index=0)
+    if driver != "—":
+        prof.start("drilldown")
+        t0 = time.perf_counter()
+        layout = load_layout(ws.raw_layout.as_posix(), ws.raw_layout.stat().st_mtime)
+        start, end = period_month_range(period_type, year, extra_value)
+        rows, totals = drilldown_rows(driver, start, end, region, layout, path=ws.raw_rows)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+
+        delta_src = drilldown_delta(totals)
+        if delta_src is not None:
+            # las filas fuente son BP / FCST del build: con versión o palancas la cascada de
+            # arriba es otra cosa, así que se concilia contra la del build base (y se dice)
+            base_build = versions_active or whatif_active
+            wdf_ref = bridge_waterfall(slice_main_base, slice_real)[0] if base_build else wdf
+            st.write(
+                f"Δ en filas fuente (FCST − BP): **{delta_src:,.2f}** · driver en la cascada"
+                + (" del **base build**" if base_build else "")
+                + f": **{wdf_ref.set_index('step').loc[driver, 'delta']:,.2f}**"
+                + (" (incluye el epsilon de cierre)" if driver == "Otros" else "")
+            )
+            if base_build:
+                st.caption("🧱 Base build: la cascada de arriba usa versiones de Forecast o what-if; "
+                           "las filas fuente solo existen para el build, así que se comparan contra él.")
+        st.dataframe(totals.style.format({"aporte": "{:,.2f}"}), use_container_width=True)
+        st.dataframe(rows, use_container_width=True, height=400)
+        st.caption(f"{len(rows):,} filas (top por |aporte|) · {elapsed_ms:,.0f} ms")
+prof.stop()
+if profile_on:
+    RENDER_STATS.add(PAGE_KEY, prof)
 
 with st.expander("Debug (números)"):
-    st.write({
-        "Last year (Real 2025)": last_year,
-        "Business Plan": bp_total,
-        "Forecast actual": fc_total,
-        "Drivers sum (ajustado)": sum_drivers,
-        "Epsilon absorbido en 'Otros'": eps,
-        "BP + Drivers (debe = Forecast)": bp_total + sum_drivers,
-    })
+    st.write(bridge_debug)
+    st.write("Δ FCST − BP por métrica (cubo):", cube.delta(period_type, period_label_main, region).round(2).to_dict()
+             if period_type not in RANGE_PERIOD_TYPES else "—")
+    st.write("🧊 Cubo:", cube.footprint())
+    st.write("🧠 Cache de datos (proceso):", DATA_CACHE.stats())
+    if profile_on:
+        st.write("⏱️ Este rerun:", {s["stage"]: f"{s['seconds'] * 1000:,.1f} ms" for s in prof.stages})
+        st.write("⏱️ p50 / p95 (todas las sesiones):")
+        st.dataframe(pd.DataFrame(RENDER_STATS.summary(PAGE_KEY)).set_index("stage"), use_container_width=True)
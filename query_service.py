@@ -0,0 +1,305 @@
+"""
+Servicio HTTP/JSON local (solo stdlib + pandas) sobre el dataset de un workspace: el
+mismo que ven las páginas (core.load_dataset: el .arrow mapeado si está al día, si no
+el parquet).
+
+    python query_service.py --port 8765 [--dataset default]
+
+Endpoints (GET), todos aceptan &dataset=<nombre> (default: el de --dataset):
+    /health                                           -> estado + versión del artefacto
+    /meta                                             -> regiones y period_labels por tipo
+    /summary?period_type=M&period_label=2026-01&region=Norte
+    /bridge?period_type=Q&period_label=2026-Q1&region=Centro
+
+Las respuestas se cachean en memoria por (dataset, versión del artefacto, endpoint, query)
+y llevan un ETag ligado a esa versión (mtime + tamaño del parquet y del .arrow); con
+If-None-Match se responde 304.
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from core import (
+    PERIOD_TYPES,
+    ArrowSummary,
+    bridge_waterfall,
+    load_dataset,
+    period_slice,
+    real_period_label,
+    region_options,
+    summary_slice,
+    summary_table,
+)
+from workspace import DEFAULT_WORKSPACE, Workspace, get_workspace, list_workspaces
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+CACHE_MAX_ENTRIES = 512
+
+
+class QueryError(ValueError):
+    """Parámetros inválidos en la query (-> 400)."""
+
+
+class SliceNotFound(LookupError):
+    """period_label / region que no existen en el artefacto (-> 404, no se cachea)."""
+
+
+def _clean(v):
+    # JSON no admite NaN/inf
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    return v
+
+
+class ArtifactStore:
+    """
+    Carga el dataset de un workspace una sola vez por versión (mtime_ns + size del parquet
+    y del .arrow) y cachea las respuestas ya serializadas. Thread-safe para ThreadingHTTPServer.
+    """
+
+    def __init__(self, ws: Workspace, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ws = ws
+        self.path = ws.summary
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._df = None
+        self._version = None
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def current_version(self) -> str | None:
+        if not self.ws.summary.exists() and not self.ws.arrow.exists():
+            return None
+        # load_dataset elige entre los dos por mtime: cualquiera que cambie es otra versión
+        return ".".join(
+            f"{st.st_mtime_ns:x}-{st.st_size:x}"
+            for st in (p.stat() for p in (self.ws.summary, self.ws.arrow) if p.exists())
+        )
+
+    def snapshot(self):
+        """(version, df) consistentes; recarga si el artefacto cambió en disco."""
+        version = self.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No encuentro {self.path}. Corre el pipeline (Cargar base o py build.py).")
+        with self._lock:
+            if version != self._version:
+                self._df = load_dataset(self.ws.summary, self.ws.arrow)
+                self._version = version
+                self._cache.clear()
+            return self._version, self._df
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def get(self, key: tuple, compute) -> tuple[str, bytes]:
+        """
+        Regresa (etag, body) desde el cache o calculándolo con compute(df). Si compute
+        lanza (400 / 404) no se guarda nada: solo las respuestas 200 llevan ETag.
+        """
+        version, df = self.snapshot()
+        cache_key = (self.ws.name, version) + key
+        with self._lock:
+            hit = self._cache.get(cache_key)
+            if hit is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return hit
+
+        payload = compute(df)
+        payload["artifact_version"] = version
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()[:20] + '"'
+
+        with self._lock:
+            self.misses += 1
+            self._cache[cache_key] = (etag, body)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return etag, body
+
+
+# ---------------- endpoints ----------------
+def _slice_params(params: dict) -> tuple[str, str, str]:
+    period_type = params.get("period_type", "M")
+    period_label = params.get("period_label")
+    region = params.get("region")
+    if period_type not in PERIOD_TYPES:
+        raise QueryError(f"period_type inválido: {period_type!r} (usa {PERIOD_TYPES})")
+    if not period_label or not region:
+        raise QueryError("Faltan parámetros: period_label y region son obligatorios")
+    return period_type, period_label, region
+
+
+def _period_labels(df, period_type: str) -> list[str]:
+    if isinstance(df, ArrowSummary):
+        return df.period_labels(period_type)
+    return sorted(df.loc[df["period_type"] == period_type, "period_label"].unique().tolist())
+
+
+def meta_payload(df, params: dict) -> dict:
+    regions, default_index = region_options(df)
+    labels = {pt: _period_labels(df, pt) for pt in PERIOD_TYPES}
+    return {"regions": regions, "default_region": regions[default_index] if regions else None, "period_labels": labels}
+
+
+def summary_payload(df, params: dict) -> dict:
+    period_type, period_label, region = _slice_params(params)
+    period_label_real = real_period_label(period_label)
+    slice_df = summary_slice(df, period_type, period_label, period_label_real, region)
+    # el Real siempre trae su label 2025: el periodo pedido existe solo si hay filas con ese label
+    if not (slice_df["period_label"] == period_label).any():
+        raise SliceNotFound(f"Sin datos para {period_type} {period_label!r} / región {region!r}")
+    summary = summary_table(slice_df)
+    return {
+        "period_type": period_type,
+        "period_label": period_label,
+        "period_label_real": period_label_real,
+        "region": region,
+        "records": int(len(slice_df)),
+        "columns": summary.columns.tolist(),
+        "rows": [
+            {"metric": metric, **{c: _clean(float(v)) for c, v in row.items()}}
+            for metric, row in summary.iterrows()
+        ],
+    }
+
+
+def bridge_payload(df, params: dict) -> dict:
+    period_type, period_label, region = _slice_params(params)
+    period_label_real = real_period_label(period_label)
+    slice_main = period_slice(df, period_type, period_label, region)
+    if slice_main.empty:
+        raise SliceNotFound(f"Sin datos para {period_type} {period_label!r} / región {region!r}")
+    slice_real = period_slice(df, period_type, period_label_real, region, scenarios=["REAL2025"])
+    wdf, debug = bridge_waterfall(slice_main, slice_real)
+    return {
+        "period_type": period_type,
+        "period_label": period_label,
+        "period_label_real": period_label_real,
+        "region": region,
+        "records": int(len(slice_main)),
+        "steps": [{k: _clean(v) for k, v in row.items()} for row in wdf.to_dict(orient="records")],
+        "totals": {k: _clean(v) for k, v in debug.items()},
+    }
+
+
+ENDPOINTS = {
+    "/meta": meta_payload,
+    "/summary": summary_payload,
+    "/bridge": bridge_payload,
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    dataset: str = DEFAULT_WORKSPACE   # se asigna en make_server
+    stores: dict = None                # dataset -> ArtifactStore (uno por workspace)
+    stores_lock: threading.Lock = None
+    server_version = "TLOGQuery/1.0"
+
+    def _store(self, name: str) -> ArtifactStore:
+        if name not in list_workspaces():
+            raise SliceNotFound(f"Dataset no existe: {name!r}")
+        with self.stores_lock:
+            if name not in self.stores:
+                self.stores[name] = ArtifactStore(get_workspace(name))
+            return self.stores[name]
+
+    def _send(self, status: HTTPStatus, body: bytes = b"", etag: str | None = None) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_error_json(self, status: HTTPStatus, message: str) -> None:
+        self._send(status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            store = self._store(params.pop("dataset", self.dataset))
+        except SliceNotFound as e:
+            self._send_error_json(HTTPStatus.NOT_FOUND, str(e))
+            return
+
+        if url.path == "/health":
+            body = json.dumps({
+                "status": "ok",
+                "dataset": store.ws.name,
+                "artifact": store.ws.arrow.as_posix() if store.ws.arrow.exists() else store.path.as_posix(),
+                "artifact_version": store.current_version(),
+                "cache": store.stats(),
+            }, ensure_ascii=False).encode("utf-8")
+            self._send(HTTPStatus.OK, body)
+            return
+
+        compute = ENDPOINTS.get(url.path)
+        if compute is None:
+            self._send_error_json(HTTPStatus.NOT_FOUND, f"Endpoint no existe: {url.path}")
+            return
+
+        key = (url.path, tuple(sorted(params.items())))
+        try:
+            etag, body = store.get(key, lambda df: compute(df, params))
+        except QueryError as e:
+            self._send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except SliceNotFound as e:
+            self._send_error_json(HTTPStatus.NOT_FOUND, str(e))
+            return
+        except FileNotFoundError as e:
+            self._send_error_json(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+            return
+
+        if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+            return
+        self._send(HTTPStatus.OK, body, etag=etag)
+
+    do_HEAD = do_GET
+
+
+def make_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, dataset: str = DEFAULT_WORKSPACE) -> ThreadingHTTPServer:
+    handler = type("BoundQueryHandler", (QueryHandler,), {
+        "dataset": dataset, "stores": {}, "stores_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON local para Summary y Bridge.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--dataset", default=DEFAULT_WORKSPACE, help="Workspace por default (selector 🗂️ Dataset de las páginas)")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.dataset)
+    print(f"✅ Sirviendo el dataset {args.dataset!r} en http://{args.host}:{args.port} (Ctrl+C para salir)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
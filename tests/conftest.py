@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO))
+
+SAMPLE_XLSX = REPO / "samples" / "Base_xepelin_sintetico_vf.xlsx"
+
+
+@pytest.fixture(scope="session")
+def sample_ws(tmp_path_factory):
+    """Base de ejemplo procesada (ingest + build.py) en un workspace temporal."""
+    import build
+    import ingest
+    from instrumentation import StageRecorder
+    from workspace import Workspace
+
+    ws = Workspace("tests", tmp_path_factory.mktemp("ws"))
+    cwd = os.getcwd()
+    os.chdir(REPO)  # build.py lee Base_xepelin.xlsx relativo al repo
+    try:
+        ingest.normalize_to_raw_dummy(SAMPLE_XLSX, StageRecorder(sample_interval=None), workspace=ws)
+        build.main(StageRecorder(sample_interval=None), workspace=ws)
+    finally:
+        os.chdir(cwd)
+    return ws
+
+
+@pytest.fixture(scope="session")
+def summary_df(sample_ws):
+    import pandas as pd
+
+    return pd.read_parquet(sample_ws.summary)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import ArrowSummary, rate_volume_effects
+from cube import Cube
+
+KEYS = ["period_type", "period_label", "scenario", "region", "metric"]
+
+
+def test_frame_matches_summary(summary_df):
+    cube = Cube.from_frame(summary_df)
+    expected = summary_df.groupby(KEYS, as_index=False)["value"].sum()
+    got = cube.frame().sort_values(KEYS).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got[KEYS + ["value"]], expected.sort_values(KEYS).reset_index(drop=True), check_dtype=False)
+
+
+def test_from_arrow_matches_from_frame(sample_ws, summary_df):
+    a, b = Cube.from_arrow(ArrowSummary(sample_ws.arrow)), Cube.from_frame(summary_df)
+    assert (a.scenarios, a.periods, a.regions, a.metrics) == (b.scenarios, b.periods, b.regions, b.metrics)
+    np.testing.assert_array_equal(a.values, b.values)
+
+
+@pytest.mark.parametrize("period_type, period_label", [("M", "2026-03"), ("Q", "2026-Q2"), ("FY", "2026")])
+def test_whole_cube_effects_match_slice(summary_df, period_type, period_label):
+    cube = Cube.from_frame(summary_df)
+    region = cube.regions[0]
+    effects = rate_volume_effects(cube.frame(scenarios=["BP", "FCST"]))
+    effects = effects[
+        (effects["period_type"] == period_type)
+        & (effects["period_label"] == period_label)
+        & (effects["region"] == region)
+    ].reset_index(drop=True)
+    expected = rate_volume_effects(cube.period_slice(period_type, period_label, region))
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(effects, expected)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from datacache import MemoryCache
+from workspace import get_workspace
+
+KB = np.zeros(128)          # 1024 bytes exactos (estimate_nbytes = ndarray.nbytes)
+
+
+def load(cache, artifact, version, key, calls):
+    def loader():
+        calls.append((artifact, version, key))
+        return KB.copy()
+    return cache.get_or_load(artifact, version, (key,), loader)
+
+
+def test_lru_evicts_least_recently_used_within_byte_budget():
+    cache, calls = MemoryCache(max_bytes=2 * KB.nbytes), []
+    load(cache, "data/a.parquet", 1, "a", calls)
+    load(cache, "data/b.parquet", 1, "b", calls)
+    load(cache, "data/a.parquet", 1, "a", calls)        # hit: "a" pasa a ser el más reciente
+    load(cache, "data/c.parquet", 1, "c", calls)        # no cabe: sale "b", no "a"
+
+    assert [k for _, _, k in calls] == ["a", "b", "c"]
+    assert {e["artifact"] for e in cache.entries()} == {"data/a.parquet", "data/c.parquet"}
+    assert cache.stats()["mb"] * 1024 * 1024 <= cache.max_bytes
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 3, 1)
+
+    load(cache, "data/b.parquet", 1, "b", calls)        # se recarga
+    assert len(calls) == 4
+
+
+def test_new_version_drops_stale_entries_of_that_artifact_only():
+    cache, calls = MemoryCache(max_bytes=10 * KB.nbytes), []
+    load(cache, "data/summary.parquet", 1, "summary", calls)
+    load(cache, "data/summary.parquet", 1, "cube", calls)
+    load(cache, "data/prefix.parquet", 1, "prefix", calls)
+
+    load(cache, "data/summary.parquet", 2, "summary", calls)
+    entries = {(e["artifact"], e["version"]) for e in cache.entries()}
+    assert entries == {("data/summary.parquet", 2), ("data/prefix.parquet", 1)}
+    assert cache.invalidations == 2
+
+    load(cache, "data/summary.parquet", 2, "summary", calls)   # la versión nueva sí queda
+    assert cache.hits == 1
+
+
+def test_invalidate_workspace_leaves_other_workspaces():
+    cache, calls = MemoryCache(max_bytes=10 * KB.nbytes), []
+    default, other = get_workspace(), get_workspace("datos")
+    for ws in (default, other):
+        load(cache, ws.summary.as_posix(), 1, "summary", calls)
+        load(cache, ws.versions_dir.as_posix(), 1, "version", calls)
+    load(cache, "data_backup/summary.parquet", 1, "summary", calls)   # mismo prefijo de texto, otro dir
+
+    assert cache.invalidate(default.data_dir.as_posix()) == 2
+    assert {e["artifact"] for e in cache.entries()} == {
+        other.summary.as_posix(), other.versions_dir.as_posix(), "data_backup/summary.parquet",
+    }
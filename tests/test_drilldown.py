@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from core import (
+    BRIDGE_ABSORB_DRIVER,
+    BRIDGE_DRIVERS,
+    TOTAL_REGION,
+    bridge_waterfall,
+    drilldown_delta,
+    drilldown_rows,
+    load_raw_layout,
+    normalize_df,
+    period_month_range,
+    period_slice,
+    real_period_label,
+)
+
+
+@pytest.mark.parametrize("period_type, period_label, year, extra", [
+    ("M", "2026-03", 2026, "Marzo"),
+    ("Q", "2026-Q2", 2026, 2),
+    ("FY", "2026", 2026, None),
+])
+@pytest.mark.parametrize("region", [TOTAL_REGION, "Norte"])
+def test_drilldown_reconciles_with_waterfall(sample_ws, summary_df, period_type, period_label, year, extra, region):
+    # sin versión ni palancas: las filas fuente suman lo mismo que cada driver de la cascada
+    df = normalize_df(summary_df.copy())
+    slice_main = period_slice(df, period_type, period_label, region)
+    slice_real = period_slice(df, period_type, real_period_label(period_label), region, scenarios=["REAL2025"])
+    steps = bridge_waterfall(slice_main, slice_real)[0].set_index("step")["delta"]
+
+    layout = load_raw_layout(sample_ws.raw_layout)
+    start, end = period_month_range(period_type, year, extra)
+    for driver, _ in BRIDGE_DRIVERS:
+        if driver == BRIDGE_ABSORB_DRIVER:  # absorbe el epsilon de cierre
+            continue
+        _, totals = drilldown_rows(driver, start, end, region, layout, path=sample_ws.raw_rows)
+        assert np.isclose(drilldown_delta(totals), steps[driver], rtol=1e-9, atol=1e-6), driver
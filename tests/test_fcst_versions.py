@@ -0,0 +1,32 @@
+import pandas as pd
+
+from fcst_versions import load_version, read_manifest, save_version, version_names, version_note
+
+
+def _fcst(value: float) -> pd.DataFrame:
+    return pd.DataFrame({
+        "period_type": ["M", "M"], "period_label": ["2026-01", "2026-02"], "scenario": "FCST",
+        "region": "Norte", "metric": "Venta", "value": [value, 2.0],
+    })
+
+
+def test_unchanged_named_run_is_kept_as_alias(tmp_path):
+    first = save_version(_fcst(1.0), "Forecast Enero", tmp_path)
+    again = save_version(_fcst(1.0), "Forecast Febrero", tmp_path)
+    assert again["unchanged"] and again["name"] == first["name"] and again["alias"] == "Forecast Febrero"
+    assert version_names(tmp_path / "manifest.json") == ["Forecast Enero", "Forecast Febrero"]
+    pd.testing.assert_frame_equal(load_version("Forecast Febrero", tmp_path), load_version("Forecast Enero", tmp_path))
+
+    # nombre repetido o sin nombre: no se registra nada
+    assert save_version(_fcst(1.0), "Forecast Enero", tmp_path)["alias"] is None
+    assert save_version(_fcst(1.0), None, tmp_path)["alias"] is None
+    assert len(read_manifest(tmp_path / "manifest.json")) == 1
+
+
+def test_unchanged_run_is_noted_as_unchanged(tmp_path):
+    first = save_version(_fcst(1.0), "Forecast Enero", tmp_path)
+    assert version_note(first) == {"kind": "snapshot", "changed_cells": 2}
+    again = save_version(_fcst(1.0), "Forecast Febrero", tmp_path)
+    assert version_note(again) == {
+        "kind": "unchanged", "changed_cells": 0, "same_as": "Forecast Enero", "alias": "Forecast Febrero",
+    }
@@ -0,0 +1,31 @@
+import threading
+
+import pandas as pd
+
+import ingest
+from instrumentation import StageRecorder, _PeakSampler
+from workspace import Workspace
+
+
+def test_many_files_pool_uses_spawn_without_sampler(sample_ws, tmp_path, monkeypatch):
+    base = pd.read_csv(sample_ws.raw_csv, dtype=str)
+    half = len(base) // 2
+    paths = [tmp_path / "norte.csv", tmp_path / "sur.csv"]
+    base.iloc[:half].to_csv(paths[0], index=False)
+    base.iloc[half:].to_csv(paths[1], index=False)
+
+    seen = {}
+    real_pool = ingest.ProcessPoolExecutor
+
+    def pool(*args, **kwargs):
+        seen["start_method"] = kwargs["mp_context"].get_start_method()
+        seen["samplers"] = [t for t in threading.enumerate() if isinstance(t, _PeakSampler)]
+        return real_pool(*args, **kwargs)
+
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", pool)
+    ws = Workspace("tests", tmp_path / "ws")
+    rows, cols, report = ingest.normalize_many_to_raw_dummy(paths, StageRecorder(), workspace=ws)
+
+    assert seen == {"start_method": "spawn", "samplers": []}
+    assert (rows, cols) == base.shape
+    assert [r["archivo"] for r in report] == ["norte.csv", "sur.csv"]
@@ -0,0 +1,65 @@
+import duckdb
+import numpy as np
+import pandas as pd
+
+from build import RATIOS
+
+# Las vistas por periodo que tenía build.py antes del GROUPING SETS (una consulta por tipo),
+# con el bucket de quarter en división entera: la referencia contra la que se compara
+# (solo métricas aditivas; los ratios se revisan como suma(num) / suma(den)).
+BASELINE_SQL = """
+SELECT 'Q' AS period_type, printf('%04d-Q%d', year, (month_num-1) // 3 + 1) AS period_label,
+       scenario, year, NULL::INT AS month_num, region, metric, SUM(value) AS value
+FROM monthly GROUP BY scenario, year, (month_num-1) // 3 + 1, region, metric
+UNION ALL
+SELECT 'H', printf('%04d-H%d', year, CASE WHEN month_num <= 6 THEN 1 ELSE 2 END),
+       scenario, year, NULL::INT, region, metric, SUM(value)
+FROM monthly GROUP BY scenario, year, CASE WHEN month_num <= 6 THEN 1 ELSE 2 END, region, metric
+UNION ALL
+SELECT 'FY', printf('%04d', year), scenario, year, NULL::INT, region, metric, SUM(value)
+FROM monthly GROUP BY scenario, year, region, metric
+UNION ALL
+SELECT 'YTD', printf('%04d-%02d', year, month_num), scenario, year, month_num, region, metric,
+       SUM(value) OVER (PARTITION BY scenario, year, region, metric ORDER BY month_num
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+FROM monthly
+"""
+KEYS = ["period_type", "period_label", "scenario", "region", "metric"]
+
+
+def test_rollups_match_per_period_queries(summary_df):
+    con = duckdb.connect()
+    con.register("summary", summary_df)
+    con.execute(
+        "CREATE TEMP VIEW monthly AS SELECT * FROM summary WHERE period_type = 'M' AND metric NOT IN "
+        f"({', '.join(repr(m) for m in RATIOS)})"
+    )
+    expected = con.execute(BASELINE_SQL).fetchdf().sort_values(KEYS).reset_index(drop=True)
+
+    got = summary_df[summary_df["period_type"].isin(["Q", "H", "FY", "YTD"]) & ~summary_df["metric"].isin(RATIOS)]
+    got = got.sort_values(KEYS).reset_index(drop=True)[expected.columns]
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_quarters_are_calendar_quarters(summary_df):
+    q = summary_df[summary_df["period_type"] == "Q"]
+    assert set(q["period_label"].str[5:]) == {"Q1", "Q2", "Q3", "Q4"}
+
+    m = summary_df[(summary_df["period_type"] == "M") & (summary_df["metric"] == "Venta")]
+    q1 = m[m["period_label"].isin(["2026-01", "2026-02", "2026-03"])].groupby(["scenario", "region"])["value"].sum()
+    got = q[(q["period_label"] == "2026-Q1") & (q["metric"] == "Venta")].set_index(["scenario", "region"])["value"]
+    pd.testing.assert_series_equal(got.sort_index(), q1.sort_index(), check_names=False)
+
+
+def test_rollup_ratios_are_num_over_den(summary_df):
+    agg = summary_df[summary_df["period_type"].isin(["Q", "H", "FY", "YTD"])]
+    wide = agg.pivot_table(index=["period_type", "period_label", "scenario", "region"], columns="metric", values="value")
+    for metric, (num, den) in RATIOS.items():
+        expected = wide[num] / wide[den].where(wide[den] != 0)
+        np.testing.assert_allclose(wide[metric], expected, rtol=1e-12)
+
+    # Norte FCST 2026-Q1: ratio del trimestre, no suma de los tres ratios mensuales
+    m = summary_df[(summary_df["period_type"] == "M") & (summary_df["scenario"] == "FCST") & (summary_df["region"] == "Norte")]
+    m = m[m["period_label"].isin(["2026-01", "2026-02", "2026-03"])].groupby("metric")["value"].sum()
+    num, den = RATIOS["%venta"]
+    assert np.isclose(wide.loc[("Q", "2026-Q1", "FCST", "Norte"), "%venta"], m[num] / m[den], rtol=1e-12)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build import RATIOS
+from core import PREFERRED_REGION_ORDER, load_prefix_index, month_index, range_summary_slice
+
+
+def test_ratio_over_range_is_ratio_of_sums(sample_ws, summary_df):
+    index = load_prefix_index(sample_ws.prefix)
+    region = PREFERRED_REGION_ORDER[1]
+    start, end = month_index(2026, 1), month_index(2026, 3)
+    got = index.range_slice(start, end, region, ["FCST"]).set_index("metric")["value"]
+
+    months = summary_df[
+        (summary_df["period_type"] == "M")
+        & summary_df["period_label"].isin(["2026-01", "2026-02", "2026-03"])
+        & (summary_df["scenario"] == "FCST")
+        & (summary_df["region"] == region)
+    ].set_index(["period_label", "metric"])["value"].unstack("metric")
+
+    num, den = RATIOS["%venta"]
+    expected = months[num].sum() / months[den].sum()
+    assert np.isclose(got["%venta"], expected)
+    assert not np.isclose(got["%venta"], months["%venta"].sum())   # no es la suma de ratios mensuales
+    assert np.isclose(got[num], months[num].sum())
+
+
+@pytest.mark.parametrize("period_type, extra_value", [("RANGO", ("Enero", "Marzo")), ("MOVIL", ("Marzo", 3))])
+def test_range_over_a_quarter_equals_q_row(sample_ws, summary_df, period_type, extra_value):
+    index = load_prefix_index(sample_ws.prefix)
+    q = summary_df[summary_df["period_type"] == "Q"]
+    for region in sorted(q["region"].unique()):
+        got, _, _ = range_summary_slice(index, period_type, 2026, extra_value, region)
+        got = got.set_index(["scenario", "metric"])["value"]
+        expected = q[
+            (q["region"] == region)
+            & (((q["scenario"] == "REAL2025") & (q["period_label"] == "2025-Q1"))
+               | (q["scenario"].isin(["BP", "FCST"]) & (q["period_label"] == "2026-Q1")))
+        ].set_index(["scenario", "metric"])["value"]
+        assert set(RATIOS) <= set(expected.index.get_level_values("metric"))
+        pd.testing.assert_series_equal(
+            got.reindex(expected.index), expected, check_names=False, rtol=1e-9, obj=f"{period_type} {region}"
+        )
@@ -0,0 +1,66 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import workspace
+from query_service import make_server
+
+
+@pytest.fixture
+def service(sample_ws, monkeypatch):
+    """Servidor en un puerto libre sobre el workspace de ejemplo (como un dataset más)."""
+    monkeypatch.setattr(workspace, "WORKSPACES_DIR", sample_ws.root.parent)
+    server = make_server(port=0, dataset=sample_ws.root.name)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def get(port: int, path: str, headers: dict | None = None):
+    con = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        con.request("GET", path, headers=headers or {})
+        resp = con.getresponse()
+        body = resp.read()
+        return resp.status, resp.getheader("ETag"), json.loads(body) if body else None
+    finally:
+        con.close()
+
+
+def test_etag_then_304(service):
+    path = "/summary?period_type=M&period_label=2026-01&region=Norte"
+    status, etag, body = get(service, path)
+    assert status == 200 and etag
+    assert body["period_label"] == "2026-01" and body["rows"]
+
+    status, etag_again, body = get(service, path, {"If-None-Match": etag})
+    assert (status, etag_again, body) == (304, etag, None)
+
+
+@pytest.mark.parametrize("path", [
+    "/summary?period_type=M&period_label=2030-01&region=Norte",
+    "/bridge?period_type=Q&period_label=2026-Q1&region=Atl%C3%A1ntida",
+])
+def test_unknown_slice_is_404_and_not_cached(service, path):
+    for _ in range(2):
+        status, etag, body = get(service, path)
+        assert status == 404 and etag is None
+        assert "Sin datos" in body["error"]
+    _, _, health = get(service, "/health")
+    assert health["cache"]["entries"] == 0
+
+
+def test_invalid_period_type_is_400(service):
+    status, _, body = get(service, "/summary?period_type=ZZ&period_label=2026-01&region=Norte")
+    assert status == 400
+    assert "period_type inválido" in body["error"]
+
+
+def test_unknown_dataset_is_404(service):
+    status, _, body = get(service, "/meta?dataset=no_existe")
+    assert status == 404
+    assert "Dataset no existe" in body["error"]
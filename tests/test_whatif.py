@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+from build import COMPOSITES, RATIOS
+from whatif import WHATIF_LEVERS, WhatIf
+
+SLICES = [("M", "2026-03", "Norte"), ("Q", "2026-Q1", "Total logística"), ("FY", "2026", "Sur")]
+
+
+def recompute(base: dict, scale: dict) -> dict:
+    """Las fórmulas de build.py desde cero con las hojas escaladas (la referencia)."""
+    v = dict(base)
+    for m, factor in scale.items():
+        v[m] = base[m] * factor
+    for m, parts in COMPOSITES.items():
+        v[m] = sum(v[p] for p in parts)
+    for m, (num, den) in RATIOS.items():
+        v[m] = v[num] / v[den] if v[den] else math.nan
+    return v
+
+
+def fcst_slice(summary_df, period_type, period_label, region):
+    return summary_df[
+        (summary_df["period_type"] == period_type)
+        & (summary_df["period_label"] == period_label)
+        & (summary_df["region"] == region)
+    ]
+
+
+@pytest.mark.parametrize("period_type, period_label, region", SLICES)
+def test_diesel_lever_matches_recomputed_formulas(summary_df, period_type, period_label, region):
+    sim = WhatIf.from_slice(fcst_slice(summary_df, period_type, period_label, region))
+    changed = sim.set("diesel", 10)
+
+    expected = recompute(sim.base, {m: 1.10 for m in WHATIF_LEVERS["diesel"]["metrics"]})
+    assert {"Gasto dedicado", "Gasto total + BKHL + FP + PA", "%venta", "$/caja transportada"} <= set(changed)
+    for m in [*COMPOSITES, *RATIOS]:
+        assert sim.values[m] == pytest.approx(expected[m], rel=1e-9), m
+    assert sim.values["Venta"] == sim.base["Venta"]
+
+
+def test_reapplying_a_lever_applies_only_the_difference(summary_df):
+    sim = WhatIf.from_slice(fcst_slice(summary_df, *SLICES[0]))
+    sim.set("diesel", 10)
+    assert sim.set("diesel", 10) == {}          # mismo valor: nada que propagar
+    sim.set("diesel", 25)
+    expected = recompute(sim.base, {m: 1.25 for m in WHATIF_LEVERS["diesel"]["metrics"]})
+    assert sim.values["Gasto dedicado"] == pytest.approx(expected["Gasto dedicado"], rel=1e-9)
+    assert sim.values["%venta"] == pytest.approx(expected["%venta"], rel=1e-9)
+
+
+@pytest.mark.parametrize("period_type, period_label, region", SLICES)
+def test_levers_back_to_zero_restore_base_exactly(summary_df, period_type, period_label, region):
+    sim = WhatIf.from_slice(fcst_slice(summary_df, period_type, period_label, region))
+    sim.set("diesel", 10)
+    sim.set("km_tercero", 5)
+    sim.set("diesel", -7)
+    sim.set("diesel", 0)
+    assert sim.values["Gasto dedicado"] == sim.base["Gasto dedicado"]   # ya solo la mueve diesel
+    sim.set("km_tercero", 0)
+
+    assert sim.values.keys() == sim.base.keys()
+    for m, v in sim.base.items():
+        assert sim.values[m] == v or (math.isnan(v) and math.isnan(sim.values[m])), m
+    assert sim.changed_metrics().empty
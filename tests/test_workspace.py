@@ -0,0 +1,34 @@
+import threading
+
+from workspace import Workspace, promote_staging, session_staging, workspace_lock
+
+
+def test_promote_staging_replaces_staged_input(tmp_path):
+    ws = Workspace("tests", tmp_path / "ws")
+    ws.ensure_dirs()
+    ws.raw_parquet.write_bytes(b"parquet viejo")   # corrida anterior con parquet
+
+    staging = session_staging(ws, "sesion-1")
+    staging.ensure_dirs()
+    staging.raw_csv.write_text("a,b\n1,2\n", encoding="utf-8")
+
+    assert promote_staging(ws, staging) == ws.raw_csv
+    assert ws.raw_csv.read_text(encoding="utf-8") == "a,b\n1,2\n"
+    assert not ws.raw_parquet.exists()      # build.py no debe tomar el parquet viejo
+    assert ws.staged_input() == ws.raw_csv
+    assert not staging.root.exists()
+
+
+def test_workspace_lock_is_shared_and_reentrant(tmp_path):
+    ws = Workspace("tests", tmp_path / "ws")
+    lock = workspace_lock(ws)
+    assert workspace_lock(Workspace("otro nombre", tmp_path / "ws")) is lock
+
+    with lock:
+        with workspace_lock(ws):             # publish dentro del lock de la página
+            pass
+        other = threading.Thread(target=lambda: result.append(lock.acquire(blocking=False)))
+        result = []
+        other.start()
+        other.join()
+    assert result == [False]                 # otra sesión (thread) espera
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+import pandas as pd
+
+from build import COMPOSITES, LEAF_LETTERS, RATIOS
+
+# Simulación what-if sobre el Forecast ya agregado (nunca relee la base ni corre build.py).
+# Las fórmulas de build.py (hojas -> compuestas -> derivadas) quedan como grafo en memoria;
+# mover una palanca solo propaga el delta de las hojas tocadas hacia sus dependientes.
+
+SIM_SCENARIO = "FCST"
+
+# palanca -> % sobre el valor base de sus métricas hoja
+WHATIF_LEVERS = {
+    "diesel": {"label": "Precio diesel (%)", "metrics": ["Diesel dedicado", "Diesel tercero"]},
+    "km_tercero": {"label": "Tarifa $ km tercero (%)", "metrics": ["$ de km tercero"]},
+    "bkhl_ingreso": {"label": "Ingreso BKHL (%)", "metrics": ["Ingreso BKHL"]},
+}
+LEVER_RANGE = (-30, 30)
+
+
+class FormulaGraph:
+    """Dependencias de métricas: hoja -> compuestas que la suman -> derivadas (num / den)."""
+
+    def __init__(self, leaves=LEAF_LETTERS, composites=COMPOSITES, ratios=RATIOS):
+        self.composites = composites
+        self.ratios = ratios
+        # COMPOSITES ya viene en orden (cada una solo usa métricas previas) = orden topológico
+        self.order = {m: i for i, m in enumerate([*leaves, *composites, *ratios])}
+        self.dependents = defaultdict(list)
+        for m, parts in composites.items():
+            for p in parts:
+                self.dependents[p].append(m)
+        for m, (num, den) in ratios.items():
+            self.dependents[num].append(m)
+            self.dependents[den].append(m)
+
+    def affected(self, changed) -> list[str]:
+        """Nodos alcanzables desde `changed` (sin incluirlos), en orden de cálculo."""
+        seen, stack = set(), list(changed)
+        while stack:
+            for dep in self.dependents.get(stack.pop(), []):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return sorted(seen, key=self.order.__getitem__)
+
+    def propagate(self, values: dict, leaf_deltas: dict) -> dict:
+        """
+        Nuevos valores solo de las métricas afectadas por leaf_deltas. Compuestas: suma
+        de los deltas de sus partes; derivadas: se mueven lo que cambia num / den.
+        """
+        deltas = {m: d for m, d in leaf_deltas.items() if d}
+        affected = self.affected(deltas)
+        for m in affected:
+            if m in self.composites:
+                deltas[m] = sum(deltas.get(p, 0.0) for p in self.composites[m])
+        new = {m: values.get(m, 0.0) + d for m, d in deltas.items()}
+        for m in affected:
+            if m in self.ratios:
+                num, den = self.ratios[m]
+                old = _ratio(values.get(num, 0.0), values.get(den, 0.0))
+                cur = _ratio(new.get(num, values.get(num, 0.0)), new.get(den, values.get(den, 0.0)))
+                new[m] = values.get(m, 0.0) + (cur - old)
+        return new
+
+
+def _ratio(num: float, den: float) -> float:
+    return num / den if den else 0.0
+
+
+GRAPH = FormulaGraph()
+
+
+class WhatIf:
+    """
+    Estado de la simulación para un slice: valores base + palancas aplicadas. set()
+    propaga solo la diferencia contra el valor anterior de la palanca.
+    """
+
+    def __init__(self, base_values: dict, graph: FormulaGraph = GRAPH, levers: dict = WHATIF_LEVERS):
+        self.graph = graph
+        self.levers = levers
+        self.base = dict(base_values)
+        self.values = dict(base_values)
+        self.pcts = {k: 0.0 for k in levers}
+
+    @classmethod
+    def from_slice(cls, slice_df: pd.DataFrame, scenario: str = SIM_SCENARIO, **kw) -> "WhatIf":
+        s = slice_df[slice_df["scenario"] == scenario].groupby("metric")["value"].sum()
+        return cls(s.to_dict(), **kw)
+
+    def set(self, lever: str, pct: float) -> dict:
+        """Aplica la palanca (en % sobre la base). Regresa las métricas que cambiaron."""
+        step = float(pct) - self.pcts[lever]
+        if not step:
+            return {}
+        leaf_deltas = {m: self.base.get(m, 0.0) * step / 100.0 for m in self.levers[lever]["metrics"]}
+        changed = self.graph.propagate(self.values, leaf_deltas)
+        self.pcts[lever] = float(pct)
+        # lo que ya no mueve ninguna palanca activa vuelve exacto a la base (sin residuo de
+        # sumar y restar los mismos deltas en float)
+        active = self.active_metrics()
+        for m in changed:
+            if m not in active:
+                changed[m] = self.base.get(m, 0.0)
+        self.values.update(changed)
+        return changed
+
+    def active_metrics(self) -> "set[str]":
+        """Hojas de las palancas distintas de 0 y todo lo que depende de ellas."""
+        leaves = {m for k, pct in self.pcts.items() if pct for m in self.levers[k]["metrics"]}
+        return leaves | set(self.graph.affected(leaves))
+
+    def changed_metrics(self) -> pd.DataFrame:
+        rows = [
+            {"metric": m, "base": self.base.get(m, 0.0), "simulado": v, "Δ": v - self.base.get(m, 0.0)}
+            for m, v in self.values.items()
+            if abs(v - self.base.get(m, 0.0)) > 1e-12
+        ]
+        return pd.DataFrame(rows, columns=["metric", "base", "simulado", "Δ"]).set_index("metric")
+
+    def apply_to_slice(self, slice_df: pd.DataFrame, scenario: str = SIM_SCENARIO) -> pd.DataFrame:
+        """El slice con el escenario simulado: las métricas movidas quedan en una fila cada una."""
+        moved = self.changed_metrics().index
+        if moved.empty:
+            return slice_df
+        keep = ~((slice_df["scenario"] == scenario) & slice_df["metric"].isin(moved))
+        sim = pd.DataFrame({"metric": moved, "value": [self.values[m] for m in moved]})
+        for c in slice_df.columns.difference(["metric", "value"]):  # periodo / región del slice
+            sim[c] = slice_df[c].iloc[0]
+        sim["scenario"] = scenario
+        return pd.concat([slice_df[keep], sim[slice_df.columns]], ignore_index=True)
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from core import ARROW_PATH, DATA_PATH, PREFIX_PATH, RAW_LAYOUT_PATH, RAW_ROWS_PATH
+
+# Workspaces: cada dataset tiene su propio staging (input/) y artefactos (data/), así dos
+# sesiones que cargan bases distintas no se pisan raw_dummy.csv ni el parquet. El workspace
+# "default" es la raíz del repo (input/ y data/ de siempre, lo que usan los scripts CLI).
+#
+# Los artefactos del build se guardan además en un cache por contenido (hash del staging +
+# template + código del pipeline): si otra sesión / workspace procesa la misma base, se
+# enlazan (hardlink) los archivos del cache en vez de volver a correr build.py. El cache
+# tiene tope de tamaño y saca primero las entradas menos usadas (LRU).
+
+WORKSPACES_DIR = Path("workspaces")
+DEFAULT_WORKSPACE = "default"
+ARTIFACTS_DIR = WORKSPACES_DIR / "_artifacts"
+ARTIFACTS_INDEX = ARTIFACTS_DIR / "index.json"
+ARTIFACTS_MAX_BYTES = 1024 * 1024 * 1024   # 1 GB entre todas las entradas
+PIPELINE_FILES = ["build.py", "core.py", "Base_xepelin.xlsx"]   # si cambian, cambia la llave
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+_NAME_RE = re.compile(r"[^0-9A-Za-z_-]+")
+
+
+class Workspace:
+    """Paths de un dataset (mismos nombres de archivo que el workspace default)."""
+
+    def __init__(self, name: str, root: Path):
+        self.name = name
+        self.root = Path(root)
+        self.input_dir = self.root / "input"
+        self.data_dir = self.root / "data"
+        self.raw_csv = self.input_dir / "raw_dummy.csv"
+        self.raw_parquet = self.input_dir / "raw_dummy.parquet"
+        self.summary = self.data_dir / DATA_PATH.name
+        self.arrow = self.data_dir / ARROW_PATH.name
+        self.prefix = self.data_dir / PREFIX_PATH.name
+        self.raw_rows = self.data_dir / RAW_ROWS_PATH.name
+        self.raw_layout = self.data_dir / RAW_LAYOUT_PATH.name
+        self.versions_dir = self.data_dir / "fcst_versions"
+        self.sql_cache_dir = self.data_dir / "sql_cache"
+        self.last_run = self.data_dir / "last_run.json"
+        self.run_history = self.data_dir / "run_history.jsonl"
+
+    def __repr__(self) -> str:
+        return f"Workspace({self.name!r}, {self.root.as_posix()!r})"
+
+    def artifacts(self) -> dict[str, Path]:
+        """Salidas de build.py que se comparten por contenido (las versiones de FCST no)."""
+        return {
+            "summary": self.summary,
+            "arrow": self.arrow,
+            "prefix": self.prefix,
+            "raw_rows": self.raw_rows,
+            "raw_layout": self.raw_layout,
+        }
+
+    def staged_input(self) -> Path | None:
+        """Lo que dejó el ingest (mismo criterio que build.raw_source)."""
+        for path in (self.raw_parquet, self.raw_csv):
+            if path.exists():
+                return path
+        return None
+
+    def ensure_dirs(self) -> None:
+        self.input_dir.mkdir(parents=True, exist_ok=True)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+
+
+def workspace_slug(name: str) -> str:
+    slug = _NAME_RE.sub("_", name.strip()).strip("_").lower()
+    if not slug or slug.startswith("_"):
+        raise ValueError(f"Nombre de dataset inválido: {name!r}")
+    return slug
+
+
+def get_workspace(name: str = DEFAULT_WORKSPACE) -> Workspace:
+    if name == DEFAULT_WORKSPACE:
+        return Workspace(DEFAULT_WORKSPACE, Path("."))
+    return Workspace(name, WORKSPACES_DIR / workspace_slug(name))
+
+
+def list_workspaces() -> list[str]:
+    names = [DEFAULT_WORKSPACE]
+    if WORKSPACES_DIR.exists():
+        names += sorted(p.name for p in WORKSPACES_DIR.iterdir() if p.is_dir() and not p.name.startswith("_"))
+    return names
+
+
+def create_workspace(name: str) -> Workspace:
+    ws = get_workspace(workspace_slug(name))
+    ws.ensure_dirs()
+    return ws
+
+
+# Un ingest + build a la vez por workspace (las sesiones de streamlit son threads del mismo
+# proceso). Reentrante: la página toma el lock para ingest + publish y publish lo vuelve a tomar.
+_LOCKS: dict[str, threading.RLock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def workspace_lock(ws: Workspace) -> threading.RLock:
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(ws.root.resolve().as_posix(), threading.RLock())
+
+
+def session_staging(ws: Workspace, session_id: str) -> Workspace:
+    """Staging privado de una sesión (dentro de ws.input_dir, mismo filesystem para el rename)."""
+    return Workspace(ws.name, ws.input_dir / f".staging_{workspace_slug(session_id)}")
+
+
+def promote_staging(ws: Workspace, staging: Workspace) -> Path:
+    """
+    Mueve lo que dejó el ingest en staging a input/raw_dummy.* de ws (os.replace, atómico) y
+    borra el otro formato para que build.py no tome uno viejo. Llamar con workspace_lock(ws).
+    """
+    src = staging.staged_input()
+    if src is None:
+        raise FileNotFoundError(f"El ingest no dejó staging en {staging.input_dir.as_posix()}")
+    dst, other = (ws.raw_parquet, ws.raw_csv) if src.suffix == ".parquet" else (ws.raw_csv, ws.raw_parquet)
+    ws.ensure_dirs()
+    os.replace(src, dst)
+    other.unlink(missing_ok=True)
+    shutil.rmtree(staging.root, ignore_errors=True)
+    return dst
+
+
+# ---------- cache de artefactos por contenido ----------
+def file_digest(path: Path, h=None):
+    h = h if h is not None else hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            h.update(chunk)
+    return h
+
+
+def artifact_key(ws: Workspace) -> str | None:
+    """sha256 del staging + archivos del pipeline. None si el workspace no tiene staging."""
+    staged = ws.staged_input()
+    if staged is None:
+        return None
+    h = hashlib.sha256(staged.suffix.encode())
+    file_digest(staged, h)
+    for name in PIPELINE_FILES:
+        if Path(name).exists():
+            file_digest(Path(name), h)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Hardlink atómico (tmp + replace); copia si el filesystem no soporta links."""
+    tmp = dst.with_name(dst.name + ".link.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    tmp.replace(dst)
+
+
+class ArtifactCache:
+    """
+    Entradas en ARTIFACTS_DIR/<sha256>/ con los archivos de Workspace.artifacts() + info.json.
+    index.json guarda bytes y último uso por llave; al pasar max_bytes se borran las
+    entradas con último uso más viejo. Los workspaces tienen hardlinks, así que borrar
+    una entrada no les quita sus archivos (solo el disco deja de compartirse).
+    """
+
+    def __init__(self, root: Path = ARTIFACTS_DIR, max_bytes: int = ARTIFACTS_MAX_BYTES):
+        self.root = Path(root)
+        self.index_path = self.root / ARTIFACTS_INDEX.name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _read_index(self) -> dict:
+        if not self.index_path.exists():
+            return {}
+        return json.loads(self.index_path.read_text(encoding="utf-8"))
+
+    def _write_index(self, index: dict) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(index, indent=2), encoding="utf-8")
+        tmp.replace(self.index_path)
+
+    def get(self, key: str, ws: Workspace) -> dict | None:
+        """Si la llave está en cache, enlaza sus archivos en ws y regresa el info guardado."""
+        with self._lock:
+            index = self._read_index()
+            entry_dir = self.root / key
+            if key not in index or not entry_dir.exists():
+                return None
+            ws.ensure_dirs()
+            for name, dst in ws.artifacts().items():
+                _link_or_copy(entry_dir / dst.name, dst)
+            index[key]["last_used"] = time.time()
+            index[key]["hits"] = index[key].get("hits", 0) + 1
+            self._write_index(index)
+            return json.loads((entry_dir / "info.json").read_text(encoding="utf-8"))
+
+    def put(self, key: str, ws: Workspace, info: dict) -> list[str]:
+        """Guarda los artefactos de ws bajo key. Regresa las llaves que se sacaron por tamaño."""
+        with self._lock:
+            entry_dir = self.root / key
+            tmp_dir = self.root / f"{key}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir(parents=True)
+            for path in ws.artifacts().values():
+                _link_or_copy(path, tmp_dir / path.name)
+            (tmp_dir / "info.json").write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.replace(entry_dir)
+
+            index = self._read_index()
+            index[key] = {
+                "bytes": sum(p.stat().st_size for p in entry_dir.iterdir()),
+                "last_used": time.time(),
+                "hits": 0,
+                "workspace": ws.name,
+            }
+            evicted = self._evict(index, keep=key)
+            self._write_index(index)
+            return evicted
+
+    def _evict(self, index: dict, keep: str) -> list[str]:
+        evicted = []
+        total = sum(e["bytes"] for e in index.values())
+        for key in sorted(index, key=lambda k: index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.root / key, ignore_errors=True)
+            total -= index.pop(key)["bytes"]
+            evicted.append(key)
+        return evicted
+
+    def stats(self) -> dict:
+        index = self._read_index()
+        return {
+            "entries": len(index),
+            "mb": round(sum(e["bytes"] for e in index.values()) / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": sum(e.get("hits", 0) for e in index.values()),
+        }
+
+
+ARTIFACTS = ArtifactCache()
+
+
+def publish(ws: Workspace, recorder, fcst_version: str | None = None, build_main=None) -> dict:
+    """
+    Deja los artefactos del staging actual de ws: los enlaza del cache si alguien ya
+    procesó la misma base, si no corre build_main (default build.main) y los guarda.
+    La versión de Forecast se registra siempre en el workspace (aunque haya hit).
+    Al terminar descarta de DATA_CACHE todo lo cargado de este workspace (las páginas
+    vuelven a leer el artefacto nuevo). Regresa el dict de build.main + artifact_key / artifact_cache.
+    """
+    import pandas as pd
+    from datacache import DATA_CACHE
+    from fcst_versions import save_version, version_note
+
+    if build_main is None:
+        from build import main as build_main
+
+    with workspace_lock(ws):
+        recorder.start("artifacts.lookup")
+        key = artifact_key(ws)
+        info = ARTIFACTS.get(key, ws) if key else None
+        recorder.note(cache="hit" if info is not None else "miss")
+
+        if info is not None:
+            recorder.start("build.fcst_version")
+            version = save_version(pd.read_parquet(ws.summary), fcst_version, ws.versions_dir)
+            recorder.note(**version_note(version))
+            recorder.stop()
+            DATA_CACHE.invalidate(ws.data_dir.as_posix())
+            return {**info, "fcst_version": version, "artifact_key": key, "artifact_cache": "hit", **recorder.as_dict()}
+
+        build_info = build_main(recorder, fcst_version=fcst_version, workspace=ws)
+        if key:
+            recorder.start("artifacts.store")
+            evicted = ARTIFACTS.put(key, ws, {k: build_info[k] for k in ("rows", "view_rows", "quality")})
+            recorder.stop(evicted=len(evicted))
+        DATA_CACHE.invalidate(ws.data_dir.as_posix())
+        return {**build_info, "artifact_key": key, "artifact_cache": "miss"}